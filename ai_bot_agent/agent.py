@@ -0,0 +1,655 @@
+"""
+AI Bot Agent engine.
+The synchronous agent used by the CLI; it reports progress as events and never prints.
+"""
+
+import json
+import time
+import itertools
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional, List, Dict, Any, Iterator, Tuple, Callable
+
+from ai_bot_agent.cache import ResponseCache, request_key
+from ai_bot_agent.semantic_cache import SemanticCache
+from ai_bot_agent.singleflight import SingleFlight, shared_singleflight
+from ai_bot_agent.hedging import HedgePolicy, Cancellation, race
+from ai_bot_agent.sessions import Session, DEFAULT_TAIL
+from ai_bot_agent.context import ContextWindow
+from ai_bot_agent.analysis import FileAnalyzer, DEFAULT_CHUNK_BYTES
+from ai_bot_agent.prompts import (
+    SYSTEM_PROMPT, build_analysis_prompt, build_code_prompt, build_summary_prompt, build_search_prompt,
+    build_repo_prompt
+)
+from ai_bot_agent.context import count_tokens
+from ai_bot_agent.metrics import request_stats, completion_stats
+from ai_bot_agent.events import EventEmitter, EventSink
+from ai_bot_agent.scheduler import RequestScheduler, shared_scheduler
+from ai_bot_agent.router import ModelRouter, shared_router, AUTO_MODEL
+from ai_bot_agent.providers import Provider, resolve_provider
+from ai_bot_agent.telemetry import TelemetryLog, AttemptCounter, shared_telemetry
+from ai_bot_agent.tracing import traced, shared_tracer
+
+NO_CLIENT = "OpenAI client not initialized. Please check your API key."
+
+class AIBotAgent:
+    def __init__(self, cache: Optional[ResponseCache] = None, session: Optional[Session] = None,
+                 context_tokens: Optional[int] = None, summarize: bool = False, client: Optional[Any] = None,
+                 sinks: Optional[List[EventSink]] = None, scheduler: Optional[RequestScheduler] = None,
+                 model: Optional[str] = None, router: Optional[ModelRouter] = None,
+                 provider: Optional[Provider] = None, telemetry: Optional[TelemetryLog] = None,
+                 semantic_cache: Optional[SemanticCache] = None, inflight: Optional[SingleFlight] = None,
+                 hedge: Optional[HedgePolicy] = None):
+        """Create an agent.
+        
+        Pass `client` to share one OpenAI client (and its connection pool) between
+        agents; by default every agent in the process uses the same pooled client,
+        pointed at `provider` (from AI_BOT_PROVIDER and AI_BOT_BASE_URL by default).
+        Requests go through `scheduler` (the process-wide one by default) for rate
+        limiting and retries. `model` is used for every request unless a method is
+        given one; "auto" (the default) lets `router` pick a model per request. The
+        agent never prints: progress is reported as events to `sinks`, and every
+        request is recorded in `telemetry` (the process-wide log by default).
+        Chat messages missing from `cache` may still be answered by `semantic_cache`
+        when a similar question was asked in the same context. Identical requests
+        made at the same time by several threads share one API call through
+        `inflight` (the process-wide coalescing layer by default). With a `hedge`
+        policy, chat requests that are slow to start are sent a second time and the
+        first to answer is used.
+        """
+        self.events = EventEmitter(sinks)
+        self.provider = provider or resolve_provider()
+        self.scheduler = scheduler or shared_scheduler()
+        self.router = router or shared_router(self.provider)
+        self.model = model or AUTO_MODEL
+        self.telemetry = telemetry or shared_telemetry()
+        self.inflight = inflight or shared_singleflight()
+        self.hedge = hedge
+        self._client = client
+        self._client_initialized = client is not None
+        self._client_lock = threading.Lock()
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.session = session
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        self.context = ContextWindow(context_tokens)
+        if session is not None:
+            # Turns that do not fit are simply dropped here; they remain in the session log
+            self.context.extend(session.tail(DEFAULT_TAIL))
+        if summarize:
+            self.context.summarizer = self.summarize_history
+        self.last_request_stats: Dict[str, Any] = {}
+        self.system_prompt = SYSTEM_PROMPT
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Messages currently kept in the context window."""
+        return self.context.messages
+    
+    @property
+    def client(self):
+        """OpenAI client, created on first use."""
+        if not self._client_initialized:
+            # Chunk analyses ask for the client from several threads at once
+            with self._client_lock:
+                if not self._client_initialized:
+                    self.initialize_openai()
+                    self._client_initialized = True
+        return self._client
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+        self._client_initialized = True
+    
+    def initialize_openai(self):
+        """Initialize OpenAI client with API key."""
+        api_key = self.provider.api_key
+        if not api_key:
+            self.events.emit(
+                "warning",
+                message="OPENAI_API_KEY not found in environment variables. "
+                        "Please set your OpenAI API key in a .env file or environment variable."
+            )
+            return
+        
+        try:
+            with shared_tracer().span("client.init", {"provider": self.provider.name}):
+                from ai_bot_agent.transport import shared_openai_client
+                self.client = shared_openai_client(api_key=api_key, base_url=self.provider.base_url)
+            self.events.emit("client_ready")
+        except Exception as e:
+            self.events.emit("warning", message=f"Error initializing OpenAI client: {e}")
+    
+    @traced("agent.chat")
+    def chat(self, message: str, model: Optional[str] = None) -> str:
+        """Send a message to the AI and get a response; raises if the request fails."""
+        model = model or self.model
+        messages = self._prepare_messages(message)
+        cached = self._cache_lookup(model, messages)
+        if cached is not None:
+            return cached
+        
+        if not self.client:
+            self._error(NO_CLIENT)
+            raise RuntimeError(NO_CLIENT)
+        
+        self.events.emit("started", model=model, stream=False)
+        request = AttemptCounter(
+            # Hedged requests ask for a stream (see `_route`)
+            lambda candidate, **options: self.client.chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                **options
+            )
+        )
+        start = time.perf_counter()
+        try:
+            (used_model, response, hedged), shared = self.inflight.do(
+                self._flight_key(model, messages), lambda: self._route(model, messages, request)
+            )
+            total_time = time.perf_counter() - start
+            
+            ai_response = response.choices[0].message.content
+            if shared:
+                # The tokens were spent, and counted, by the caller that made the request
+                self._record_stats(used_model, total_time, total_time, 0, coalesced=True)
+            else:
+                if response.usage:
+                    self._emit_usage(response.usage)
+                self.last_request_stats = completion_stats(used_model, total_time, response,
+                                                           request.retries, hedged)
+                self.telemetry.record(self.last_request_stats)
+                self._cache_store(model, messages, ai_response)
+            
+            # Add the exchange to conversation history
+            self._remember(message, ai_response)
+            
+            self.events.emit("finished", response=ai_response, stats=self.last_request_stats)
+            return ai_response
+            
+        except Exception as e:
+            self._record_failure(model, time.perf_counter() - start, request.retries)
+            self._error(str(e))
+            raise
+    
+    @traced("agent.chat_stream")
+    def chat_stream(self, message: str, model: Optional[str] = None) -> Iterator[str]:
+        """Send a message to the AI and yield the response as it is generated; raises if it fails."""
+        model = model or self.model
+        messages = self._prepare_messages(message)
+        cached = self._cache_lookup(model, messages)
+        if cached is not None:
+            yield cached
+            return
+        
+        if not self.client:
+            self._error(NO_CLIENT)
+            raise RuntimeError(NO_CLIENT)
+        
+        self.events.emit("started", model=model, stream=True)
+        parts: List[str] = []
+        first_token_time = None
+        chunk_count = 0
+        used_model = model
+        hedged = False
+        failed = False
+        request = AttemptCounter(
+            lambda candidate: self.client.chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True
+            )
+        )
+        
+        def open_stream() -> Iterator[Any]:
+            # Only opening the stream is retried; a failure mid-response is reported as is
+            chosen, stream, hedged = self._route(model, messages, request, stream=True)
+            yield chosen, hedged
+            yield from stream
+        
+        shared = False
+        start = time.perf_counter()
+        try:
+            items, shared = self.inflight.stream(self._flight_key(model, messages, stream=True), open_stream)
+            used_model, hedged = next(items)
+            for chunk in items:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - start
+                chunk_count += 1
+                parts.append(delta)
+                if self.events:
+                    self.events.emit("token", text=delta)
+                yield delta
+        except Exception as e:
+            failed = True
+            self._error(str(e))
+            raise
+        finally:
+            total_time = time.perf_counter() - start
+            if failed:
+                self._record_failure(used_model, total_time, request.retries)
+            elif shared:
+                self._record_stats(used_model, first_token_time or total_time, total_time, 0, coalesced=True,
+                                   streamed=True)
+            else:
+                # Streams report no usage: each content delta carries roughly one token,
+                # and the prompt is counted locally
+                self._record_stats(
+                    used_model, first_token_time or total_time, total_time, chunk_count,
+                    prompt_tokens=sum(count_tokens(m["content"]) for m in messages), retries=request.retries,
+                    streamed=True, hedged=hedged
+                )
+        
+        ai_response = "".join(parts)
+        if not shared:
+            self._cache_store(model, messages, ai_response)
+        self._remember(message, ai_response)
+        self.events.emit("finished", response=ai_response, stats=self.last_request_stats)
+    
+    def _route(self, model: str, messages: List[Dict[str, str]], request: AttemptCounter,
+               stream: bool = False) -> Tuple[str, Any, bool]:
+        """Send a chat request through the router, hedging it if it is slow to start.
+        
+        Returns the model that answered, its response (for streams, an iterator over
+        the chunks) and whether a second request was sent. The hedge goes to the next
+        candidate model, or the same one for an explicit model. The loser's stream is
+        closed as soon as the winner starts answering, so it stops generating; a
+        blocking request could not be abandoned, so with a hedge policy non-streamed
+        requests are streamed too (`request` must accept `stream=True`) and their
+        chunks collected.
+        """
+        policy = self.hedge
+        if policy is None:
+            chosen, response = self.router.call(self.scheduler, messages, request, self.max_tokens, model)
+            return chosen, response, False
+        
+        def attempt(target: str, counter: Callable[[str], Any],
+                    cancellation: Cancellation) -> Tuple[str, Any, Iterator[Any]]:
+            def send(candidate: str) -> Any:
+                if cancellation.cancelled:
+                    raise RuntimeError("The other hedged request answered first")  # Skip retries
+                return cancellation.register(counter(candidate))
+            
+            chosen, response = self.router.call(self.scheduler, messages, send, self.max_tokens, target)
+            chunks = iter(response)
+            head = []
+            for chunk in chunks:
+                head.append(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    break
+            return chosen, response, itertools.chain(head, chunks)
+        
+        def primary(candidate: str) -> Any:
+            return request(candidate) if stream else request(candidate, stream=True)
+        
+        hedge = AttemptCounter(
+            request.request if stream else lambda candidate: request.request(candidate, stream=True)
+        )
+        candidates = self.router.candidates(messages, model)
+        delay = policy.delay(candidates[0])
+        start = time.perf_counter()
+        if delay is None:
+            outcome, hedged, hedge_won = attempt(model, primary, Cancellation()), False, False
+        else:
+            hedge_model = candidates[1] if len(candidates) > 1 else candidates[0]
+            allowed: List[bool] = []
+            
+            def allow() -> bool:
+                allowed.append(policy.allow())
+                return allowed[-1]
+            
+            try:
+                outcome, hedged, hedge_won = race(
+                    lambda cancellation: attempt(model, primary, cancellation),
+                    lambda cancellation: attempt(hedge_model, hedge, cancellation),
+                    delay, allow
+                )
+            except BaseException:
+                policy.abandon(any(allowed))
+                raise
+        chosen, response, chunks = outcome
+        policy.observe(chosen, time.perf_counter() - start, hedged, hedge_won)
+        if hedged:
+            self.events.emit("hedged", model=chosen, hedge_won=hedge_won)
+        return chosen, chunks if stream else self._collect(chunks, messages), hedged
+    
+    @staticmethod
+    def _collect(chunks: Iterator[Any], messages: List[Dict[str, str]]) -> Any:
+        """Assemble a streamed response into the shape of a non-streamed one."""
+        parts = [chunk.choices[0].delta.content for chunk in chunks
+                 if chunk.choices and chunk.choices[0].delta.content]
+        # As in `chat_stream`, each content delta counts as about one token
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(parts),
+                                total_tokens=prompt_tokens + len(parts))
+        message = SimpleNamespace(content="".join(parts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+    
+    def _error(self, message: str):
+        """Report a failed request as an error event; the caller raises."""
+        self.events.emit("error", message=message)
+    
+    def _emit_usage(self, usage: Any):
+        self.events.emit(
+            "usage",
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens
+        )
+    
+    @traced("agent.complete")
+    def complete(self, prompt: str, model: Optional[str] = None, retries: Optional[int] = None) -> str:
+        """Answer a standalone prompt without touching the conversation history.
+        
+        Safe to call from several threads at once; raises on failure.
+        """
+        model = model or self.model
+        messages = [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": prompt}]
+        key = self._request_key(model, messages)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.telemetry.record(request_stats(model, 0.0, 0.0, 0, cache_hit=True))
+                return cached
+        
+        if not self.client:
+            raise RuntimeError(NO_CLIENT)
+        
+        request = AttemptCounter(
+            lambda candidate: self.client.chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            )
+        )
+        start = time.perf_counter()
+        try:
+            (used_model, response), shared = self.inflight.do(
+                self._flight_key(model, messages),
+                lambda: self.router.call(self.scheduler, messages, request, self.max_tokens, model, retries)
+            )
+        except Exception:
+            self._record_failure(model, time.perf_counter() - start, request.retries)
+            raise
+        total_time = time.perf_counter() - start
+        if shared:
+            self.telemetry.record(request_stats(used_model, total_time, total_time, 0, coalesced=True))
+        else:
+            self.telemetry.record(completion_stats(used_model, total_time, response, request.retries))
+        
+        content = response.choices[0].message.content
+        if self.cache and not shared:
+            self.cache.put(key, content)
+        return content
+    
+    def _prepare_messages(self, message: str) -> List[Dict[str, str]]:
+        """Build the message list sent to the API for a new user message."""
+        with shared_tracer().span("prompt.build") as span:
+            messages = self.context.render(self.system_prompt, message)
+            span.set_attribute("messages", len(messages))
+            return messages
+    
+    def _remember(self, message: str, response: str):
+        """Add a completed exchange to the history and the session log."""
+        for entry in ({"role": "user", "content": message}, {"role": "assistant", "content": response}):
+            self.context.append(entry)
+            if self.session is not None:
+                self.session.append(entry)
+    
+    def _cache_lookup(self, model: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Return a cached response and record it in the history, if available.
+        
+        An exact match in the response cache is tried first, then a similar question
+        in the semantic cache.
+        """
+        cached = None
+        if self.cache:
+            cached = self.cache.get(self._request_key(model, messages))
+        if cached is None and self.semantic_cache is not None:
+            try:
+                scope = self._semantic_scope(model, messages)
+                cached = self.semantic_cache.get(scope, messages[-1]["content"])
+            except Exception as e:
+                self.events.emit("warning", message=f"Semantic cache unavailable: {e}")
+        if cached is None:
+            return None
+        self._remember(messages[-1]["content"], cached)
+        self._record_stats(model, 0.0, 0.0, 0, cache_hit=True)
+        self.events.emit("finished", response=cached, stats=self.last_request_stats)
+        return cached
+    
+    def _cache_store(self, model: str, messages: List[Dict[str, str]], response: str):
+        """Store a successful response in the caches."""
+        if self.cache:
+            self.cache.put(self._request_key(model, messages), response)
+        if self.semantic_cache is not None:
+            try:
+                scope = self._semantic_scope(model, messages)
+                self.semantic_cache.put(scope, messages[-1]["content"], response)
+            except Exception as e:
+                self.events.emit("warning", message=f"Semantic cache unavailable: {e}")
+    
+    def _request_key(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """Identify a request by everything that shapes its response (used for caching and coalescing)."""
+        return request_key(self.provider.cache_namespace + model, self.system_prompt, messages[1:],
+                           self.temperature, self.max_tokens)
+    
+    def _flight_key(self, model: str, messages: List[Dict[str, str]], stream: bool = False) -> Any:
+        """Identify a request in flight; cheaper than `_request_key` since it is only compared in memory."""
+        return (self.provider.cache_namespace, model, self.temperature, self.max_tokens, stream,
+                tuple((m["role"], m["content"]) for m in messages))
+    
+    def _semantic_scope(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """Key everything about a request except the new question, which is matched by similarity."""
+        return request_key(self.provider.cache_namespace + model, self.system_prompt, messages[1:-1],
+                           self.temperature, self.max_tokens)
+    
+    def _record_stats(self, model: str, time_to_first_token: float, total_time: float,
+                      completion_tokens: int, cache_hit: bool = False, prompt_tokens: int = 0,
+                      retries: int = 0, coalesced: bool = False, streamed: bool = False,
+                      hedged: bool = False):
+        """Store timing information for the most recent request and add it to the telemetry log."""
+        self.last_request_stats = request_stats(model, time_to_first_token, total_time,
+                                                completion_tokens, cache_hit, prompt_tokens, retries,
+                                                coalesced, streamed, hedged)
+        self.telemetry.record(self.last_request_stats)
+    
+    def _record_failure(self, model: str, total_time: float, retries: int):
+        """Add a failed request to the telemetry log."""
+        self.telemetry.record(request_stats(model, total_time, total_time, 0, retries=retries), error=True)
+    
+    def search(self, query: str, limit: int = 10, index: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """Rank documents in the local search index (see `ai-bot index`) against a query."""
+        from ai_bot_agent.search import SearchIndex
+        
+        index = index or SearchIndex()
+        return index.search(query, limit)
+    
+    def summarize_search(self, query: str, hits: List[Dict[str, Any]]) -> str:
+        """Summarize the top search hits for a query."""
+        return self.chat(build_search_prompt(query, hits))
+    
+    def summarize_search_stream(self, query: str, hits: List[Dict[str, Any]]) -> Iterator[str]:
+        """Summarize the top search hits for a query, yielding the summary as it is generated."""
+        yield from self.chat_stream(build_search_prompt(query, hits))
+    
+    @traced("agent.analyze_file")
+    def analyze_file(self, file_path: str) -> str:
+        """Analyze a file and provide insights; raises if it cannot be read or analyzed."""
+        if Path(file_path).is_file() and Path(file_path).stat().st_size > DEFAULT_CHUNK_BYTES:
+            return self.analyze_paths([file_path])["report"]
+        return self.chat(self.build_analysis_prompt(file_path))
+    
+    @traced("agent.analyze_file")
+    def analyze_file_stream(self, file_path: str) -> Iterator[str]:
+        """Analyze a small file and yield the insights as they are generated; raises on failure."""
+        yield from self.chat_stream(self.build_analysis_prompt(file_path))
+    
+    def analyze_paths(self, targets: List[str], concurrency: int = 4,
+                      progress: Optional[Any] = None, incremental: bool = False) -> Dict[str, Any]:
+        """Analyze large files, directories or globs in parallel chunks and merge the results.
+        
+        With `incremental`, reports for unchanged files are taken from the analysis index.
+        """
+        from ai_bot_agent.index import AnalysisIndex
+        
+        analyzer = FileAnalyzer(
+            self.complete,
+            concurrency=concurrency,
+            progress=progress,
+            note_cache=self.cache,
+            index=AnalysisIndex() if incremental else None
+        )
+        return analyzer.analyze(targets)
+    
+    def build_analysis_prompt(self, file_path: str) -> str:
+        """Build the prompt used to analyze a file."""
+        return build_analysis_prompt(file_path)
+    
+    def generate_code(self, description: str, language: str = "python") -> str:
+        """Generate code based on description."""
+        return self.chat(self.build_code_prompt(description, language))
+    
+    def generate_code_stream(self, description: str, language: str = "python") -> Iterator[str]:
+        """Generate code based on description, yielding it as it is generated."""
+        yield from self.chat_stream(self.build_code_prompt(description, language))
+    
+    @traced("agent.generate_code_candidates")
+    def generate_code_candidates(self, description: str, language: str = "python", n: int = 3,
+                                 test_command: Optional[str] = None, timeout: Optional[float] = None,
+                                 model: Optional[str] = None) -> Dict[str, Any]:
+        """Generate `n` solutions in one request, validate them in parallel and keep the best.
+        
+        The completions come from a single API call (its `n` parameter) and are
+        checked by `validate_candidates`, with `test_command` if given. Returns the
+        best candidate's full `response` and `code`, and every candidate's results,
+        best first, under `candidates`; only the best response joins the history.
+        With a response cache the raw completions are cached, keyed by `n`, and
+        validated again on every run, since the tests may have changed. Raises on
+        failure.
+        """
+        from ai_bot_agent.candidates import validate_candidates, DEFAULT_TIMEOUT
+        
+        model = model or self.model
+        prompt = self.build_code_prompt(description, language)
+        messages = self._prepare_messages(prompt)
+        if not self.client:
+            raise RuntimeError(NO_CLIENT)
+        
+        self.events.emit("started", model=model, stream=False)
+        key = self._request_key(f"{model}#n={n}", messages) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            texts = json.loads(cached)
+            self._record_stats(model, 0.0, 0.0, 0, cache_hit=True)
+        else:
+            texts = self._request_candidates(model, messages, n)
+            if key:
+                self.cache.put(key, json.dumps(texts))
+        self.events.emit("validating", candidates=len(texts))
+        with shared_tracer().span("candidates.validate", {"candidates": len(texts)}):
+            results = validate_candidates(texts, language, test_command, timeout or DEFAULT_TIMEOUT)
+        best = results[0]
+        best_response = texts[best["index"]]
+        self._remember(prompt, best_response)
+        
+        self.events.emit("finished", response=best_response, stats=self.last_request_stats)
+        return {"response": best_response, "code": best["code"], "passed": best["passed"],
+                "candidates": results}
+    
+    def _request_candidates(self, model: str, messages: List[Dict[str, str]], n: int) -> List[str]:
+        """Ask for `n` completions in one request and return their texts."""
+        request = AttemptCounter(
+            lambda candidate: self.client.chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                n=n
+            )
+        )
+        start = time.perf_counter()
+        try:
+            used_model, response = self.router.call(self.scheduler, messages, request,
+                                                    self.max_tokens * n, model)
+        except Exception as e:
+            self._record_failure(model, time.perf_counter() - start, request.retries)
+            self._error(str(e))
+            raise
+        total_time = time.perf_counter() - start
+        if response.usage:
+            self._emit_usage(response.usage)
+        self.last_request_stats = completion_stats(used_model, total_time, response, request.retries)
+        self.telemetry.record(self.last_request_stats)
+        
+        # Some backends ignore `n` and return a single choice
+        texts = [choice.message.content or "" for choice in response.choices]
+        if not texts:
+            self._error(f"{used_model} returned no choices")
+            raise RuntimeError(f"No code candidates: {used_model} returned no choices")
+        return texts
+    
+    def ask_repo(self, question: str, index: Any, k: int = 8) -> str:
+        """Answer a question about a repository from the `k` chunks of its `RepoIndex` most similar to it."""
+        return self.chat(build_repo_prompt(question, self.retrieve(question, index, k)))
+    
+    def ask_repo_stream(self, question: str, index: Any, k: int = 8) -> Iterator[str]:
+        """Answer a question about a repository, yielding the answer as it is generated."""
+        yield from self.chat_stream(build_repo_prompt(question, self.retrieve(question, index, k)))
+    
+    def retrieve(self, question: str, index: Any, k: int = 8) -> List[Dict[str, Any]]:
+        """Return the chunks of a `RepoIndex` most relevant to a question, reporting them as an event."""
+        chunks = index.search(question, k)
+        self.events.emit("retrieved", chunks=[{"path": c["path"], "line": c["line"], "score": c["score"]}
+                                              for c in chunks])
+        return chunks
+    
+    def build_code_prompt(self, description: str, language: str = "python") -> str:
+        """Build the prompt used to generate code."""
+        return build_code_prompt(description, language)
+    
+    @traced("agent.summarize_history")
+    def summarize_history(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """Fold messages dropped from the context window into a rolling summary."""
+        if not self.client:
+            return summary
+        prompt = build_summary_prompt(summary, messages)
+        messages = [{"role": "user", "content": prompt}]
+        request = AttemptCounter(
+            lambda candidate: self.client.chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=250,
+                temperature=0.3
+            )
+        )
+        start = time.perf_counter()
+        try:
+            used_model, response = self.router.call(self.scheduler, messages, request, 250, self.model)
+        except Exception:
+            self._record_failure(self.model, time.perf_counter() - start, request.retries)
+            return summary
+        stats = completion_stats(used_model, time.perf_counter() - start, response, request.retries)
+        self.telemetry.record(stats)
+        content = response.choices[0].message.content
+        return content.strip() if content else summary
+    
+    def clear_history(self):
+        """Clear conversation history."""
+        self.context.reset()
+        if self.session is not None:
+            self.session.clear()
+        self.events.emit("history_cleared")
@@ -0,0 +1,348 @@
+"""
+Chunked, parallel file analysis for AI Bot Agent.
+Files are memory-mapped and split into chunks, each chunk is analyzed concurrently
+(map), and the chunk analyses are merged into per-file and overall reports (reduce).
+Chunk boundaries depend on content, and notes are stored under a hash of the chunk,
+so re-analyzing a mostly unchanged file only sends the chunks that changed.
+"""
+
+import os
+import glob
+import mmap
+import zlib
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Optional, Iterator, List, Dict, Set, Tuple, Any
+
+from ai_bot_agent.tracing import traced, shared_tracer
+
+DEFAULT_CHUNK_BYTES = 12000
+DEFAULT_MAX_FILE_BYTES = 100 * 1024 * 1024
+SNIFF_BYTES = 8192
+
+# Upper bound on the text merged by a single reduce request
+REDUCE_CHARS = 12000
+
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", ".tox", ".mypy_cache",
+             ".pytest_cache", ".ruff_cache"}
+
+FILE_PROMPT = """Analyze this file and provide insights:
+
+File: {path}
+Size: {size} bytes
+Content:
+{content}
+
+Please provide:
+1. File type and purpose
+2. Key components or functions
+3. Potential issues or improvements
+4. Summary
+"""
+
+CHUNK_PROMPT = """Analyze a part of the file {path}.
+
+Content:
+{content}
+
+Describe what this part contains, its key components or functions, and any issues or
+possible improvements. Be concise; your notes will be merged with notes on the other parts.
+"""
+
+FILE_REDUCE_PROMPT = """Below are notes on consecutive parts of the file {path}.
+Merge them into a single analysis that covers:
+1. File type and purpose
+2. Key components or functions
+3. Potential issues or improvements
+4. Summary
+
+{notes}
+"""
+
+OVERALL_REDUCE_PROMPT = """Below are analyses of {count} files.
+Merge them into a single report: the overall purpose of the code, how the files relate,
+the most important issues or improvements, and a short summary.
+
+{notes}
+"""
+
+
+def expand_targets(targets: List[str]) -> Iterator[Path]:
+    """Yield files named by paths, directories (recursively) or glob patterns."""
+    for target in targets:
+        if any(char in target for char in "*?["):
+            matches = sorted(glob.glob(target, recursive=True))
+        else:
+            matches = [target]
+        for match in matches:
+            path = Path(match)
+            if path.is_dir():
+                for root, dirs, files in os.walk(path):
+                    dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+                    for name in sorted(files):
+                        yield Path(root) / name
+            elif path.exists():
+                yield path
+            else:
+                raise FileNotFoundError(f"File '{match}' not found.")
+
+
+def sniff(path: Path, max_bytes: int = DEFAULT_MAX_FILE_BYTES) -> Optional[str]:
+    """Return why a file should be skipped, or None, looking only at a small prefix."""
+    size = path.stat().st_size
+    if size == 0:
+        return "empty"
+    if size > max_bytes:
+        return f"larger than {max_bytes} bytes"
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm.find(b"\0", 0, SNIFF_BYTES) != -1:
+            return "binary"
+    return None
+
+
+def iter_chunk_spans(data: mmap.mmap, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of chunks of at most `chunk_bytes` bytes.
+
+    Once a chunk is half full it ends after the first line whose checksum has its
+    low four bits clear. Because the cut points depend on the lines themselves, an
+    edit only changes the chunks around it instead of shifting every later chunk.
+    """
+    size = len(data)
+    start = 0
+    min_end = chunk_bytes // 2
+    while start < size:
+        limit = min(start + chunk_bytes, size)
+        if limit == size:
+            yield start, size
+            return
+        end = None
+        line_start = start
+        while True:
+            newline = data.find(b"\n", line_start, limit)
+            if newline == -1:
+                break
+            line_end = newline + 1
+            if line_end - start >= min_end and zlib.crc32(data[line_start:line_end]) & 0xF == 0:
+                end = line_end
+                break
+            line_start = line_end
+        if end is None:
+            # No content-defined cut point: fall back to the last line break, or
+            # to a UTF-8 character boundary for very long lines
+            end = data.rfind(b"\n", start, limit) + 1 or limit
+            while end > start + 1 and data[end] & 0xC0 == 0x80:
+                end -= 1
+        yield start, end
+        start = end
+
+
+def file_digest(path: Path) -> str:
+    """Return the content hash of a file, as computed while chunking it."""
+    digest = hashlib.blake2b(digest_size=16)
+    if path.stat().st_size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest.update(mm)
+    return digest.hexdigest()
+
+
+def iter_chunks(path: Path, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[str]:
+    """Yield the decoded chunks of a file; invalid UTF-8 is replaced rather than fatal."""
+    if path.stat().st_size == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start, end in iter_chunk_spans(mm, chunk_bytes):
+            yield mm[start:end].decode("utf-8", errors="replace")
+
+
+class FileAnalyzer:
+    """Map-reduce analysis of files with a bounded number of requests in flight."""
+
+    def __init__(self, complete: Callable[[str], str], concurrency: int = 4,
+                 chunk_bytes: int = DEFAULT_CHUNK_BYTES, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                 progress: Optional[Callable[[str], None]] = None, note_cache: Optional[Any] = None,
+                 index: Optional[Any] = None):
+        self.complete = complete
+        self.index = index
+        self.reused_files = 0
+        self.concurrency = concurrency
+        self.chunk_bytes = chunk_bytes
+        self.note_cache = note_cache
+        self.analyzed_chunks = 0
+        self.reused_chunks = 0
+        self.max_file_bytes = max_file_bytes
+        self.progress = progress or (lambda message: None)
+
+    @traced("analysis.run")
+    def analyze(self, targets: List[str]) -> Dict[str, Any]:
+        """Analyze files and return the overall report, per-file reports and skipped files."""
+        skipped: List[Tuple[str, str]] = []
+        files: List[Path] = []
+        file_reports: Dict[str, Optional[str]] = {}
+        for path in expand_targets(targets):
+            try:
+                # Unchanged files are answered from the index without being opened
+                stored = self.index.lookup(path) if self.index is not None else None
+                if stored is not None:
+                    file_reports[str(path)] = stored
+                    self.reused_files += 1
+                    continue
+                reason = sniff(path, self.max_file_bytes)
+            except OSError as e:
+                # A broken symlink or unreadable file only skips that file
+                skipped.append((str(path), e.strerror or str(e)))
+                continue
+            if reason:
+                skipped.append((str(path), reason))
+            else:
+                file_reports[str(path)] = None
+                files.append(path)
+
+        digests: Dict[str, str] = {}
+        failed: Set[int] = set()
+        shared_tracer().current_span().set_attributes({"files": len(files), "skipped": len(skipped),
+                                                       "reused_files": self.reused_files})
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            chunk_notes = self._map_chunks(pool, files, digests, failed)
+            file_reports.update(self._reduce_files(pool, files, chunk_notes))
+            if self.index is not None:
+                for file_index, path in enumerate(files):
+                    if file_index not in failed:
+                        self.index.store(path, digests[str(path)], file_reports[str(path)])
+
+            if len(file_reports) == 1:
+                report = next(iter(file_reports.values()))
+            elif file_reports:
+                report = self._overall_report(pool, file_reports)
+            else:
+                report = "No files to analyze."
+
+        return {
+            "report": report,
+            "files": file_reports,
+            "digests": digests,
+            "skipped": skipped,
+            "analyzed_chunks": self.analyzed_chunks,
+            "reused_chunks": self.reused_chunks,
+            "reused_files": self.reused_files,
+        }
+
+    def _overall_report(self, pool: ThreadPoolExecutor, file_reports: Dict[str, str]) -> str:
+        notes = [f"## {path}\n{text}" for path, text in file_reports.items()]
+        key = None
+        if self.index is not None:
+            key = hashlib.blake2b("\0".join(notes).encode("utf-8"), digest_size=20).hexdigest()
+            stored = self.index.get_summary(key)
+            if stored is not None:
+                return stored
+        self.progress(f"Merging {len(file_reports)} file analyses")
+        report = self._reduce(notes, lambda text: OVERALL_REDUCE_PROMPT.format(
+            count=len(file_reports), notes=text), pool=pool)
+        if key is not None:
+            self.index.put_summary(key, report)
+        return report
+
+    def _map_chunks(self, pool: ThreadPoolExecutor, files: List[Path],
+                    digests: Dict[str, str], failed: Set[int]) -> Dict[int, List[str]]:
+        notes: Dict[int, Dict[int, str]] = {index: {} for index in range(len(files))}
+        in_flight: Dict[Future, Tuple[int, int]] = {}
+
+        def collect(done):
+            for future in done:
+                file_index, chunk_index = in_flight.pop(future)
+                try:
+                    notes[file_index][chunk_index] = future.result()
+                    self.analyzed_chunks += 1
+                except Exception as e:
+                    notes[file_index][chunk_index] = f"(Analysis of this part failed: {e})"
+                    failed.add(file_index)
+            self.progress(f"Analyzed {self.analyzed_chunks} chunks, reused {self.reused_chunks}")
+
+        tracer = shared_tracer()
+        # Chunk analyses nest under the analysis span, not under the file being read
+        analyze_chunk = tracer.wrap(self._analyze_chunk)
+        for file_index, path in enumerate(files):
+            with tracer.span("analysis.map_file", {"path": str(path)}) as span:
+                size = path.stat().st_size
+                span.set_attribute("bytes", size)
+                # Files that fit in one chunk get a complete analysis straight away
+                template = FILE_PROMPT if size <= self.chunk_bytes else CHUNK_PROMPT
+                file_hash = hashlib.blake2b(digest_size=16)
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for chunk_index, (start, end) in enumerate(iter_chunk_spans(mm, self.chunk_bytes)):
+                        with memoryview(mm)[start:end] as data:
+                            file_hash.update(data)
+                            key = self._chunk_key(template, path, data)
+                            note = self.note_cache.get(key) if self.note_cache is not None else None
+                            if note is not None:
+                                notes[file_index][chunk_index] = note
+                                self.reused_chunks += 1
+                                continue
+                            # Keep only a bounded number of chunks in memory at once
+                            while len(in_flight) >= self.concurrency * 2:
+                                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                                collect(done)
+                            content = str(data, "utf-8", "replace")
+                        prompt = template.format(path=path, size=size, content=content)
+                        in_flight[pool.submit(analyze_chunk, key, prompt)] = (file_index, chunk_index)
+                digests[str(path)] = file_hash.hexdigest()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+        return {index: [parts[i] for i in sorted(parts)] for index, parts in notes.items()}
+
+    def _analyze_chunk(self, key: str, prompt: str) -> str:
+        note = self.complete(prompt)
+        if self.note_cache is not None:
+            self.note_cache.put(key, note)
+        return note
+
+    @staticmethod
+    def _chunk_key(template: str, path: Path, data: memoryview) -> str:
+        """Hash a chunk together with everything else that goes into its prompt."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(template.encode("utf-8"))
+        digest.update(str(path).encode("utf-8") + b"\0")
+        digest.update(data)
+        return "chunk-" + digest.hexdigest()
+
+    def _reduce_files(self, pool: ThreadPoolExecutor, files: List[Path],
+                      chunk_notes: Dict[int, List[str]]) -> Dict[str, str]:
+        futures = {}
+        for index, path in enumerate(files):
+            parts = chunk_notes[index]
+            if len(parts) == 1:
+                futures[str(path)] = parts[0]
+            else:
+                futures[str(path)] = pool.submit(
+                    shared_tracer().wrap(self._reduce),
+                    [f"Part {i + 1}:\n{note}" for i, note in enumerate(parts)],
+                    lambda text, path=path: FILE_REDUCE_PROMPT.format(path=path, notes=text)
+                )
+        return {path: value.result() if isinstance(value, Future) else value
+                for path, value in futures.items()}
+
+    def _reduce(self, notes: List[str], build_prompt: Callable[[str], str],
+                pool: Optional[ThreadPoolExecutor] = None) -> str:
+        """Merge notes, in several rounds if they do not fit in one request.
+
+        Reductions already running inside the pool must not pass it, since
+        waiting on the pool from one of its own workers can deadlock.
+        """
+        while True:
+            groups: List[List[str]] = [[]]
+            length = 0
+            for note in notes:
+                if length + len(note) > REDUCE_CHARS and groups[-1]:
+                    groups.append([])
+                    length = 0
+                groups[-1].append(note)
+                length += len(note)
+            if len(groups) == 1:
+                return self.complete(build_prompt("\n\n".join(groups[0])))
+            prompts = [build_prompt("\n\n".join(group)) for group in groups]
+            if pool:
+                notes = list(pool.map(shared_tracer().wrap(self.complete), prompts))
+            else:
+                notes = [self.complete(p) for p in prompts]
@@ -0,0 +1,294 @@
+"""
+Asynchronous AI Bot Agent for embedding in services.
+Built on `openai.AsyncOpenAI`; it never prints and raises errors instead of
+returning them as text, so one event loop can serve many conversations.
+"""
+
+import os
+import time
+import asyncio
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from ai_bot_agent.cache import ResponseCache, request_key
+from ai_bot_agent.context import ContextWindow
+from ai_bot_agent.analysis import FileAnalyzer, DEFAULT_CHUNK_BYTES
+from ai_bot_agent.prompts import SYSTEM_PROMPT, build_analysis_prompt, build_code_prompt
+from ai_bot_agent.context import count_tokens
+from ai_bot_agent.metrics import request_stats, completion_stats
+from ai_bot_agent.events import EventEmitter, EventSink
+from ai_bot_agent.scheduler import RequestScheduler, shared_scheduler
+from ai_bot_agent.router import ModelRouter, shared_router, AUTO_MODEL
+from ai_bot_agent.providers import Provider, resolve_provider
+from ai_bot_agent.telemetry import TelemetryLog, AttemptCounter, shared_telemetry
+from ai_bot_agent.tracing import traced, shared_tracer
+
+
+async def _in_thread(function, *args):
+    """Run blocking I/O (cache, telemetry log) in the default executor, under the current span."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, shared_tracer().wrap(function), *args)
+
+
+class AsyncAIBotAgent:
+    """One conversation with the AI; create one agent per conversation.
+
+    Agents created inside the same event loop share one pooled AsyncOpenAI client
+    (pointed at `provider`) unless `client` is given, and every agent shares the process-wide request
+    scheduler (rate limits and retries), model router and telemetry log unless
+    `scheduler`, `router` or `telemetry` is given. Cache and telemetry writes run in
+    worker threads so they never block the event loop.
+    """
+
+    def __init__(self, client: Optional[Any] = None, cache: Optional[ResponseCache] = None,
+                 context_tokens: Optional[int] = None, model: str = AUTO_MODEL,
+                 sinks: Optional[List[EventSink]] = None, scheduler: Optional[RequestScheduler] = None,
+                 router: Optional[ModelRouter] = None, provider: Optional[Provider] = None,
+                 telemetry: Optional[TelemetryLog] = None):
+        self.events = EventEmitter(sinks)
+        self.provider = provider or resolve_provider()
+        self.scheduler = scheduler or shared_scheduler()
+        self.router = router or shared_router(self.provider)
+        self.telemetry = telemetry or shared_telemetry()
+        self._client = client
+        self.cache = cache
+        self.model = model
+        self.temperature = 0.7
+        self.max_tokens = 1000
+        self.system_prompt = SYSTEM_PROMPT
+        self.context = ContextWindow(context_tokens)
+        self.last_request_stats: Dict[str, Any] = {}
+        self._turn_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Messages currently kept in the context window."""
+        return self.context.messages
+
+    @property
+    def client(self):
+        """AsyncOpenAI client, created on first use."""
+        if self._client is None:
+            from ai_bot_agent.transport import shared_async_openai_client
+
+            if not self.provider.api_key:
+                raise RuntimeError("OPENAI_API_KEY not found in environment variables.")
+            self._client = shared_async_openai_client(api_key=self.provider.api_key,
+                                                      base_url=self.provider.base_url)
+        return self._client
+
+    @property
+    def _lock(self) -> asyncio.Lock:
+        # Created lazily so the lock belongs to the loop the agent is used in
+        if self._turn_lock is None:
+            self._turn_lock = asyncio.Lock()
+        return self._turn_lock
+
+    @traced("agent.chat")
+    async def chat(self, message: str, model: Optional[str] = None) -> str:
+        """Send a message and return the complete response."""
+        model = model or self.model
+        async with self._lock:
+            messages = self.context.render(self.system_prompt, message)
+            cached = await self._cache_lookup(model, messages)
+            if cached is not None:
+                self._remember(message, cached)
+                return cached
+
+            self.events.emit("started", model=model, stream=False)
+            request = AttemptCounter(
+                lambda candidate: self.client.chat.completions.create(
+                    model=candidate,
+                    messages=messages,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature
+                )
+            )
+            start = time.perf_counter()
+            try:
+                used_model, response = await self.router.acall(
+                    self.scheduler, messages, request, self.max_tokens, model
+                )
+            except Exception as e:
+                await self._record_failure(model, time.perf_counter() - start, request.retries)
+                self.events.emit("error", message=str(e))
+                raise
+            total_time = time.perf_counter() - start
+
+            content = response.choices[0].message.content
+            if response.usage:
+                self.events.emit(
+                    "usage",
+                    prompt_tokens=response.usage.prompt_tokens,
+                    completion_tokens=response.usage.completion_tokens,
+                    total_tokens=response.usage.total_tokens
+                )
+            self.last_request_stats = completion_stats(used_model, total_time, response, request.retries)
+            await _in_thread(self.telemetry.record, self.last_request_stats)
+            await self._cache_store(model, messages, content)
+            self._remember(message, content)
+            self.events.emit("finished", response=content, stats=self.last_request_stats)
+            return content
+
+    @traced("agent.chat_stream")
+    async def chat_stream(self, message: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Send a message and yield the response as it is generated."""
+        model = model or self.model
+        async with self._lock:
+            messages = self.context.render(self.system_prompt, message)
+            cached = await self._cache_lookup(model, messages)
+            if cached is not None:
+                self._remember(message, cached)
+                yield cached
+                return
+
+            self.events.emit("started", model=model, stream=True)
+            parts: List[str] = []
+            first_token_time = None
+            used_model = model
+            failed = False
+            request = AttemptCounter(
+                lambda candidate: self.client.chat.completions.create(
+                    model=candidate,
+                    messages=messages,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                    stream=True
+                )
+            )
+            start = time.perf_counter()
+            try:
+                used_model, stream = await self.router.acall(
+                    self.scheduler, messages, request, self.max_tokens, model
+                )
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter() - start
+                    parts.append(delta)
+                    if self.events:
+                        self.events.emit("token", text=delta)
+                    yield delta
+            except Exception as e:
+                failed = True
+                self.events.emit("error", message=str(e))
+                raise
+            finally:
+                total_time = time.perf_counter() - start
+                if failed:
+                    await self._record_failure(used_model, total_time, request.retries)
+                else:
+                    self.last_request_stats = request_stats(
+                        used_model, first_token_time or total_time, total_time, len(parts),
+                        prompt_tokens=sum(count_tokens(m["content"]) for m in messages),
+                        retries=request.retries
+                    )
+                    await _in_thread(self.telemetry.record, self.last_request_stats)
+
+            content = "".join(parts)
+            await self._cache_store(model, messages, content)
+            self._remember(message, content)
+            self.events.emit("finished", response=content, stats=self.last_request_stats)
+
+    @traced("agent.complete")
+    async def complete(self, prompt: str, model: Optional[str] = None, retries: Optional[int] = None) -> str:
+        """Answer a standalone prompt without touching the conversation history."""
+        model = model or self.model
+        messages = [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": prompt}]
+        cached = await self._cache_lookup(model, messages)
+        if cached is not None:
+            return cached
+
+        request = AttemptCounter(
+            lambda candidate: self.client.chat.completions.create(
+                model=candidate,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            )
+        )
+        start = time.perf_counter()
+        try:
+            used_model, response = await self.router.acall(
+                self.scheduler, messages, request, self.max_tokens, model, retries
+            )
+        except Exception:
+            await self._record_failure(model, time.perf_counter() - start, request.retries)
+            raise
+        stats = completion_stats(used_model, time.perf_counter() - start, response, request.retries)
+        await _in_thread(self.telemetry.record, stats)
+
+        content = response.choices[0].message.content
+        await self._cache_store(model, messages, content)
+        return content
+
+    async def analyze_file(self, file_path: str) -> str:
+        """Analyze a file; large files are analyzed in parallel chunks."""
+        if os.path.isfile(file_path) and os.path.getsize(file_path) > DEFAULT_CHUNK_BYTES:
+            return (await self.analyze_paths([file_path]))["report"]
+        return await self.chat(build_analysis_prompt(file_path))
+
+    async def analyze_file_stream(self, file_path: str) -> AsyncIterator[str]:
+        """Analyze a small file and yield the insights as they are generated."""
+        async for delta in self.chat_stream(build_analysis_prompt(file_path)):
+            yield delta
+
+    async def analyze_paths(self, targets: List[str], concurrency: int = 4,
+                            incremental: bool = False) -> Dict[str, Any]:
+        """Analyze files, directories or globs in parallel chunks and merge the results.
+
+        File reading and chunking run in a worker thread; the requests themselves
+        run on this event loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        def complete(prompt: str) -> str:
+            return asyncio.run_coroutine_threadsafe(self.complete(prompt), loop).result()
+
+        index = None
+        if incremental:
+            from ai_bot_agent.index import AnalysisIndex
+            index = AnalysisIndex()
+        analyzer = FileAnalyzer(complete, concurrency=concurrency, note_cache=self.cache, index=index)
+        return await loop.run_in_executor(None, shared_tracer().wrap(analyzer.analyze), targets)
+
+    async def generate_code(self, description: str, language: str = "python") -> str:
+        """Generate code based on description."""
+        return await self.chat(build_code_prompt(description, language))
+
+    async def generate_code_stream(self, description: str, language: str = "python") -> AsyncIterator[str]:
+        """Generate code based on description, yielding it as it is generated."""
+        async for delta in self.chat_stream(build_code_prompt(description, language)):
+            yield delta
+
+    def clear_history(self):
+        """Clear conversation history."""
+        self.context.reset()
+
+    def _remember(self, message: str, response: str):
+        self.context.append({"role": "user", "content": message})
+        self.context.append({"role": "assistant", "content": response})
+
+    async def _cache_lookup(self, model: str, messages: List[Dict[str, str]]) -> Optional[str]:
+        if not self.cache:
+            return None
+        key = request_key(self.provider.cache_namespace + model, self.system_prompt, messages[1:],
+                          self.temperature, self.max_tokens)
+        cached = await _in_thread(self.cache.get, key)
+        if cached is not None:
+            self.last_request_stats = request_stats(model, 0.0, 0.0, 0, cache_hit=True)
+            await _in_thread(self.telemetry.record, self.last_request_stats)
+        return cached
+
+    async def _record_failure(self, model: str, total_time: float, retries: int):
+        stats = request_stats(model, total_time, total_time, 0, retries=retries)
+        await _in_thread(self.telemetry.record, stats, True)
+
+    async def _cache_store(self, model: str, messages: List[Dict[str, str]], response: str):
+        if self.cache:
+            key = request_key(self.provider.cache_namespace + model, self.system_prompt, messages[1:],
+                              self.temperature, self.max_tokens)
+            await _in_thread(self.cache.put, key, response)
@@ -0,0 +1,237 @@
+"""
+Batch mode for AI Bot Agent.
+Runs many prompts concurrently with the async OpenAI client and writes JSONL results.
+"""
+
+import csv
+import json
+import time
+import asyncio
+from typing import Optional, Iterator, Dict, Any, TextIO
+
+from ai_bot_agent.cache import ResponseCache, request_key
+from ai_bot_agent.scheduler import RequestScheduler
+from ai_bot_agent.router import ModelRouter, AUTO_MODEL
+from ai_bot_agent.providers import Provider, resolve_provider
+from ai_bot_agent.metrics import request_stats, completion_stats
+from ai_bot_agent.telemetry import TelemetryLog, AttemptCounter, shared_telemetry
+from ai_bot_agent.tracing import traced
+
+
+def read_prompts(source: TextIO, csv_format: bool = False) -> Iterator[Dict[str, Any]]:
+    """Yield prompt records from CSV, JSONL or plain text lines.
+
+    Each record has a `prompt` and may set `id`, `model` and `system`.
+    """
+    if csv_format:
+        for row in csv.DictReader(source):
+            if row.get("prompt"):
+                yield row
+        return
+
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = line
+        if isinstance(record, str):
+            record = {"prompt": record}
+        if not isinstance(record, dict) or not record.get("prompt"):
+            raise ValueError(f"Expected a JSON object with a 'prompt' field, got: {line[:80]}")
+        yield record
+
+
+class BatchRunner:
+    """Run prompts with bounded concurrency and per-request retries.
+
+    Rate limits and backoff come from `scheduler`; by default the runner gets its
+    own one using AI_BOT_RPM and AI_BOT_TPM. Prompts without a model of their own
+    use `model`, and "auto" routes each prompt with `router`. Every prompt is
+    recorded in `telemetry` (the process-wide log by default). In ordered runs,
+    at most `window` prompts (four per concurrent request by default) are started
+    ahead of the oldest unwritten result, so one slow prompt cannot make the
+    buffered results grow without bound.
+    """
+
+    def __init__(self, client, system_prompt: str, model: str = AUTO_MODEL,
+                 concurrency: int = 8, retries: int = 5, temperature: float = 0.7,
+                 max_tokens: int = 1000, cache: Optional[ResponseCache] = None,
+                 scheduler: Optional[RequestScheduler] = None, router: Optional[ModelRouter] = None,
+                 cache_namespace: str = "", telemetry: Optional[TelemetryLog] = None,
+                 window: Optional[int] = None):
+        self.client = client
+        self.system_prompt = system_prompt
+        self.model = model
+        self.concurrency = concurrency
+        self.retries = retries
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.completed = 0
+        self.failed = 0
+        self.scheduler = scheduler or RequestScheduler(retries=retries)
+        self.router = router or ModelRouter()
+        self.cache_namespace = cache_namespace
+        self.telemetry = telemetry or shared_telemetry()
+        self.window = max(window or concurrency * 4, concurrency)
+
+    async def run(self, records: Iterator[Dict[str, Any]], output: TextIO, ordered: bool = True):
+        """Process all records and write one JSON line per result."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        pending: Dict[int, Dict[str, Any]] = {}
+        next_index = 0
+        written = asyncio.Condition()
+        producer = asyncio.current_task()
+
+        def write(result: Dict[str, Any]):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+        async def worker():
+            nonlocal next_index
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, record = item
+                result = await self._process_safely(index, record)
+                if not ordered:
+                    write(result)
+                    continue
+                pending[index] = result
+                while next_index in pending:
+                    write(pending.pop(next_index))
+                    next_index += 1
+                async with written:
+                    written.notify_all()
+
+        def stop_producer(task: asyncio.Task):
+            # A worker that dies (e.g. the output is closed) must not leave the producer blocked
+            if not task.cancelled() and task.exception() is not None:
+                producer.cancel()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        for task in workers:
+            task.add_done_callback(stop_producer)
+        try:
+            # Read input off the event loop so a slow stdin does not stall workers
+            iterator = iter(records)
+            index = 0
+            while True:
+                record = await loop.run_in_executor(None, next, iterator, None)
+                if record is None:
+                    break
+                if ordered:
+                    async with written:
+                        await written.wait_for(lambda: index < next_index + self.window)
+                await queue.put((index, record))
+                index += 1
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except asyncio.CancelledError:
+            for task in workers:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+            raise
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def _process_safely(self, index: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Run `process`, turning any unexpected failure into an error row."""
+        try:
+            return await self.process(index, record)
+        except Exception as e:
+            self.failed += 1
+            record_id = record.get("id", index) if isinstance(record, dict) else index
+            return {"index": index, "id": record_id, "error": f"{type(e).__name__}: {e}"}
+
+    @traced("batch.prompt")
+    async def process(self, index: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a single prompt, retrying transient failures."""
+        model = record.get("model") or self.model
+        system_prompt = record.get("system") or self.system_prompt
+        messages = [{"role": "user", "content": record["prompt"]}]
+        result: Dict[str, Any] = {"index": index, "id": record.get("id", index), "model": model}
+
+        key = request_key(self.cache_namespace + model, system_prompt, messages, self.temperature,
+                          self.max_tokens)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.completed += 1
+                self.telemetry.record(request_stats(model, 0.0, 0.0, 0, cache_hit=True))
+                result.update(response=cached, cached=True)
+                return result
+
+        request_messages = [{"role": "system", "content": system_prompt}] + messages
+        request = AttemptCounter(
+            lambda candidate: self.client.chat.completions.create(
+                model=candidate,
+                messages=request_messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            )
+        )
+
+        start = time.perf_counter()
+        try:
+            result["model"], response = await self.router.acall(
+                self.scheduler, request_messages, request, self.max_tokens, model, self.retries
+            )
+        except Exception as e:
+            self.failed += 1
+            latency = time.perf_counter() - start
+            stats = request_stats(model, latency, latency, 0, retries=request.retries)
+            self.telemetry.record(stats, error=True)
+            result.update(error=str(e), attempts=request.count)
+            return result
+
+        latency = time.perf_counter() - start
+        self.telemetry.record(completion_stats(result["model"], latency, response, request.retries))
+        content = response.choices[0].message.content
+        if self.cache:
+            self.cache.put(key, content)
+        self.completed += 1
+        result.update(
+            response=content,
+            attempts=request.count,
+            latency=round(latency, 3),
+        )
+        if response.usage:
+            result["usage"] = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+            }
+        return result
+
+
+def run_batch(records: Iterator[Dict[str, Any]], output: TextIO, system_prompt: str,
+              model: str = AUTO_MODEL, concurrency: int = 8, retries: int = 5,
+              ordered: bool = True, cache: Optional[ResponseCache] = None,
+              requests_per_minute: Optional[float] = None,
+              tokens_per_minute: Optional[float] = None,
+              provider: Optional[Provider] = None) -> BatchRunner:
+    """Run a batch with a fresh async OpenAI client and return the finished runner."""
+    provider = provider or resolve_provider()
+    import openai
+    from ai_bot_agent.transport import create_async_http_client, sdk_options
+
+    async def main() -> BatchRunner:
+        http_client = create_async_http_client(max_connections=concurrency, max_keepalive=concurrency)
+        async with openai.AsyncOpenAI(api_key=provider.api_key, base_url=provider.base_url, max_retries=0,
+                                      **sdk_options(http_client)) as client:
+            scheduler = RequestScheduler(requests_per_minute, tokens_per_minute, retries=retries)
+            runner = BatchRunner(client, system_prompt, model=model, concurrency=concurrency,
+                                 retries=retries, cache=cache, scheduler=scheduler,
+                                 router=ModelRouter(provider=provider),
+                                 cache_namespace=provider.cache_namespace)
+            await runner.run(records, output, ordered=ordered)
+            return runner
+
+    return asyncio.run(main())
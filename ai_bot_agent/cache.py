@@ -0,0 +1,162 @@
+"""
+Persistent response cache for AI Bot Agent.
+Answers are stored in SQLite under XDG_CACHE_HOME, keyed on a hash of the request.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+
+def cache_dir() -> Path:
+    """Return the directory used for AI Bot Agent caches."""
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "ai-bot"
+
+
+def request_key(model: str, system_prompt: str, messages: List[Dict[str, Any]],
+                temperature: float, max_tokens: int) -> str:
+    """Return a content address for a chat completion request."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "system_prompt": system_prompt,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL and size-based LRU eviction."""
+
+    def __init__(self, path: Optional[Path] = None, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.path = Path(path) if path else cache_dir() / "responses.sqlite"
+        self.ttl = ttl if ttl is not None else float(os.getenv("AI_BOT_CACHE_TTL", DEFAULT_TTL))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("AI_BOT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by worker threads (parallel analysis), so serialize access with a lock
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None if missing or expired."""
+        with self.lock:
+            now = time.time()
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self._count("misses")
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count("hits")
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Store a response and evict old entries if the cache is over its size limit."""
+        with self.lock:
+            now = time.time()
+            size = len(response.encode("utf-8"))
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now),
+                )
+            if self._total_size() > self.max_bytes:
+                self.prune()
+
+    def prune(self) -> int:
+        """Remove expired entries, then least recently used ones until under the size limit."""
+        with self.lock:
+            removed = 0
+            with self.conn:
+                removed += self.conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+                excess = self._total_size() - self.max_bytes
+                if excess > 0:
+                    cursor = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+                    victims = []
+                    for key, size in cursor:
+                        if excess <= 0:
+                            break
+                        victims.append((key,))
+                        excess -= size
+                    self.conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+                    removed += len(victims)
+            return removed
+
+    def clear(self) -> int:
+        """Remove every cached response."""
+        with self.lock:
+            with self.conn:
+                return self.conn.execute("DELETE FROM responses").rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count, size and hit statistics."""
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            counters = dict(self.conn.execute("SELECT name, value FROM counters"))
+            hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+            return {
+                "path": str(self.path),
+                "entries": entries,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+
+    def close(self):
+        """Close the underlying database connection."""
+        self.conn.close()
+
+    def _total_size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _count(self, name: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,),
+            )
@@ -0,0 +1,220 @@
+"""
+Code candidate validation for AI Bot Agent.
+Several completions for one code request are checked locally, in parallel worker
+processes: their code must parse, lint warnings count against them, and an optional
+test command is run on each in a throwaway directory. The best candidate is kept.
+"""
+
+import os
+import re
+import time
+import shlex
+import shutil
+import signal
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Any
+
+DEFAULT_TIMEOUT = 10.0
+# Limits applied to test commands on POSIX, on top of the wall-clock timeout
+DEFAULT_MEMORY_BYTES = 1024 * 1024 * 1024
+OUTPUT_LIMIT = 2000
+
+FENCE = re.compile(r"^```[ \t]*([\w+#.-]*)[^\n]*\n(.*?)^```[ \t]*$", re.MULTILINE | re.DOTALL)
+
+EXTENSIONS = {
+    "python": ".py", "javascript": ".js", "typescript": ".ts", "bash": ".sh", "shell": ".sh", "sh": ".sh",
+    "ruby": ".rb", "go": ".go", "rust": ".rs", "java": ".java", "c": ".c", "cpp": ".cpp", "c++": ".cpp",
+}
+ALIASES = {"py": "python", "python3": "python", "js": "javascript", "ts": "typescript", "zsh": "shell",
+           "rb": "ruby", "golang": "go", "rs": "rust", "cxx": "cpp"}
+# Syntax checkers for languages other than Python, used when installed
+SYNTAX_COMMANDS = {
+    "javascript": ["node", "--check", "{file}"],
+    "bash": ["bash", "-n", "{file}"],
+    "shell": ["sh", "-n", "{file}"],
+    "sh": ["sh", "-n", "{file}"],
+    "ruby": ["ruby", "-c", "{file}"],
+}
+
+
+def normalize_language(language: str) -> str:
+    """Return the canonical name of a language as used in code fences."""
+    language = language.strip().lower()
+    return ALIASES.get(language, language)
+
+
+def extract_code(text: str, language: str = "python") -> str:
+    """Return the code in a response: its largest `language` block, or any block, or the whole text."""
+    language = normalize_language(language)
+    blocks = [(normalize_language(tag), body) for tag, body in FENCE.findall(text)]
+    if not blocks:
+        return text.strip() + "\n"
+    tagged = [body for tag, body in blocks if tag == language]
+    return max(tagged or [body for _, body in blocks], key=len)
+
+
+def _sandbox_limits(cpu_seconds: int, memory_bytes: int):
+    """Cap CPU time and memory in a test command's process (POSIX only)."""
+    import resource
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    except (ValueError, OSError):
+        pass  # Not supported everywhere (e.g. macOS)
+
+
+def run_sandboxed(command: List[str], workdir: str, timeout: float,
+                  env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Run a command in `workdir` with a scrubbed environment, resource limits and a timeout.
+
+    The environment holds only PATH, locale and the candidate variables (so API keys
+    are not passed on), and HOME and TMPDIR point into `workdir`. On timeout the
+    whole process group is killed. This guards against accidents, not hostile code.
+    """
+    base = {"PATH": os.environ.get("PATH", os.defpath), "HOME": workdir, "TMPDIR": workdir,
+            "LANG": os.environ.get("LANG", "C.UTF-8"), "PYTHONDONTWRITEBYTECODE": "1"}
+    base.update(env or {})
+    options: Dict[str, Any] = {}
+    if os.name == "posix":
+        cpu = max(1, int(timeout) + 1)
+        options["start_new_session"] = True
+        options["preexec_fn"] = lambda: _sandbox_limits(cpu, DEFAULT_MEMORY_BYTES)
+    try:
+        process = subprocess.Popen(command, cwd=workdir, env=base, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **options)
+    except OSError as e:
+        return {"returncode": None, "output": str(e), "timed_out": False}
+    try:
+        output, _ = process.communicate(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        if os.name == "posix":
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        process.kill()
+        output, _ = process.communicate()
+        timed_out = True
+    text = output.decode("utf-8", "replace")
+    return {"returncode": process.returncode, "output": text[-OUTPUT_LIMIT:], "timed_out": timed_out}
+
+
+def _check_python(code: str) -> Dict[str, Any]:
+    try:
+        compile(code, "candidate.py", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return {"syntax": "error", "error": f"line {e.lineno}: {e.msg}"}
+    try:
+        from pyflakes.api import check
+        from pyflakes.reporter import Reporter
+    except ImportError:
+        return {"syntax": "ok", "lint": None}  # Linting is optional
+    import io
+    warnings = io.StringIO()
+    count = check(code, "candidate.py", Reporter(warnings, io.StringIO()))
+    return {"syntax": "ok", "lint": count, "lint_output": warnings.getvalue()[-OUTPUT_LIMIT:]}
+
+
+def _check_command(language: str, path: str, workdir: str, timeout: float) -> Dict[str, Any]:
+    command = SYNTAX_COMMANDS.get(language)
+    if command is None or shutil.which(command[0]) is None:
+        return {"syntax": "unchecked", "lint": None}
+    result = run_sandboxed([part.replace("{file}", path) for part in command], workdir, timeout)
+    if result["timed_out"] or result["returncode"] != 0:
+        return {"syntax": "error", "lint": None, "error": result["output"].strip() or "syntax check failed"}
+    return {"syntax": "ok", "lint": None}
+
+
+def validate_candidate(index: int, code: str, language: str = "python", test_command: Optional[str] = None,
+                       timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """Check one candidate: syntax, lint (Python, with pyflakes if installed) and `test_command` if given.
+
+    The code is written to `candidate<ext>` in a temporary directory. `test_command`
+    is split like a shell command line (without running a shell); "{file}" and
+    "{dir}" in it are replaced by the candidate's path and directory, which are also
+    in AI_BOT_CANDIDATE and AI_BOT_CANDIDATE_DIR. The directory is the working
+    directory and on PYTHONPATH, so tests can `import candidate`. It passes if it
+    exits with 0 within `timeout` seconds.
+    """
+    start = time.perf_counter()
+    language = normalize_language(language)
+    result: Dict[str, Any] = {"index": index, "code": code, "syntax": "unchecked", "lint": None,
+                              "test": None, "error": None}
+    with tempfile.TemporaryDirectory(prefix="ai-bot-candidate-") as workdir:
+        path = os.path.join(workdir, "candidate" + EXTENSIONS.get(language, ".txt"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+        if language == "python":
+            result.update(_check_python(code))
+        else:
+            result.update(_check_command(language, path, workdir, timeout))
+        if test_command and result["syntax"] != "error":
+            command = [part.replace("{file}", path).replace("{dir}", workdir)
+                       for part in shlex.split(test_command)]
+            env = {"AI_BOT_CANDIDATE": path, "AI_BOT_CANDIDATE_DIR": workdir, "PYTHONPATH": workdir}
+            run = run_sandboxed(command, workdir, timeout, env)
+            if run["timed_out"]:
+                result["test"] = "timeout"
+            else:
+                result["test"] = "passed" if run["returncode"] == 0 else "failed"
+            result["test_output"] = run["output"]
+            if result["test"] != "passed":
+                output = run["output"].strip()[-200:]
+                result["error"] = "timed out" if run["timed_out"] else output or "test failed"
+    result["passed"] = result["syntax"] != "error" and result["test"] in (None, "passed")
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def resolve_paths(test_command: str, cwd: Optional[str] = None) -> str:
+    """Make relative paths in `test_command` absolute, against `cwd` (the current directory).
+
+    Test commands run in each candidate's temporary directory, so `tests/test_x.py`
+    would not be found there. Arguments naming an existing file or directory under
+    `cwd`, and a program given with a path (`./run_tests.sh`), are made absolute;
+    other arguments and those containing "{file}" or "{dir}" are kept as they are.
+    """
+    cwd = cwd or os.getcwd()
+    parts = shlex.split(test_command)
+    for i, part in enumerate(parts):
+        if "{" in part or os.path.isabs(part) or (i == 0 and os.sep not in part):
+            continue
+        path = os.path.join(cwd, part)
+        if os.path.exists(path):
+            parts[i] = os.path.normpath(path)
+    return " ".join(shlex.quote(part) for part in parts)
+
+
+def rank(result: Dict[str, Any]) -> Any:
+    """Sort key for candidates: passing first, then tested, parsed, fewest lint warnings, earliest."""
+    return (not result["passed"], result["test"] != "passed", result["syntax"] != "ok",
+            result["lint"] or 0, result["index"])
+
+
+def validate_candidates(texts: List[str], language: str = "python", test_command: Optional[str] = None,
+                        timeout: float = DEFAULT_TIMEOUT,
+                        workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Extract and validate the code of each response in parallel; return the results, best first.
+
+    Each result has the candidate's `index`, `code`, `syntax` ("ok", "error" or
+    "unchecked"), `lint` warning count (None if not linted), `test` ("passed",
+    "failed", "timeout" or None if no test command), `error`, `passed` and `seconds`.
+    Relative paths in `test_command` are resolved against the current directory.
+    """
+    codes = [extract_code(text, language) for text in texts]
+    if test_command:
+        test_command = resolve_paths(test_command)
+    workers = workers or min(len(codes), os.cpu_count() or 1)
+    if workers <= 1 or len(codes) <= 1:
+        results = [validate_candidate(i, code, language, test_command, timeout)
+                   for i, code in enumerate(codes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(validate_candidate, i, code, language, test_command, timeout)
+                       for i, code in enumerate(codes)]
+            results = [future.result() for future in futures]
+    return sorted(results, key=rank)
+
@@ -0,0 +1,98 @@
+"""
+Token-budgeted conversation context for AI Bot Agent.
+Keeps the history sent with each request under a token budget by dropping the
+oldest turns, optionally folding them into a rolling summary.
+"""
+
+import os
+from typing import Callable, Optional, List, Dict
+
+DEFAULT_CONTEXT_TOKENS = 3000
+
+# Tokens added by the chat format around every message
+MESSAGE_OVERHEAD = 4
+
+# When the budget is exceeded, trim down to this fraction of it so that
+# truncation (and summarization) happens every few turns rather than every turn
+LOW_WATER_MARK = 0.75
+
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+class ContextWindow:
+    """Conversation history that stays within a token budget."""
+
+    def __init__(self, max_tokens: Optional[int] = None, summarizer: Optional[Summarizer] = None,
+                 counter: Callable[[str], int] = count_tokens):
+        self.max_tokens = max_tokens or int(os.getenv("AI_BOT_CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKENS))
+        self.summarizer = summarizer
+        self.counter = counter
+        self.messages: List[Dict[str, str]] = []
+        self.summary = ""
+        self.total_tokens = 0
+        self._counts: List[int] = []
+        self._summary_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: Dict[str, str]):
+        """Add a message, counting its tokens once, and trim the window if needed."""
+        tokens = self.counter(message["content"]) + MESSAGE_OVERHEAD
+        self.messages.append(message)
+        self._counts.append(tokens)
+        self.total_tokens += tokens
+        self._trim()
+
+    def extend(self, messages: List[Dict[str, str]]):
+        """Add several messages."""
+        for message in messages:
+            self.append(message)
+
+    def reset(self):
+        """Remove all messages and the summary."""
+        self.messages = []
+        self._counts = []
+        self.total_tokens = 0
+        self.summary = ""
+        self._summary_tokens = 0
+
+    def render(self, system_prompt: str, message: str) -> List[Dict[str, str]]:
+        """Return the messages to send for a new user message."""
+        self._trim(reserve=self.counter(message) + MESSAGE_OVERHEAD)
+        messages = [{"role": "system", "content": system_prompt}]
+        if self.summary:
+            summary = f"Summary of the earlier conversation: {self.summary}"
+            messages.append({"role": "system", "content": summary})
+        return messages + self.messages + [{"role": "user", "content": message}]
+
+    def _trim(self, reserve: int = 0):
+        if self.total_tokens + self._summary_tokens + reserve <= self.max_tokens:
+            return
+        target = int(self.max_tokens * LOW_WATER_MARK) - reserve
+        evicted = 0
+        while evicted < len(self.messages) and self.total_tokens + self._summary_tokens > target:
+            self.total_tokens -= self._counts[evicted]
+            evicted += 1
+        dropped = self.messages[:evicted]
+        self.messages = self.messages[evicted:]
+        self._counts = self._counts[evicted:]
+        if dropped and self.summarizer:
+            self.summary = self.summarizer(self.summary, dropped)
+            self._summary_tokens = self.counter(self.summary) + MESSAGE_OVERHEAD if self.summary else 0
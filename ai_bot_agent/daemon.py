@@ -0,0 +1,431 @@
+"""
+Daemon mode for AI Bot Agent.
+`ai-bot daemon` imports everything once, then serves commands over a Unix socket from
+a few long-lived worker processes, each keeping its OpenAI client and connection pool
+warm. The `ai-bot` launcher hands a command to the daemon along with the caller's
+terminal (stdin, stdout and stderr are passed as file descriptors), working directory
+and the environment a command needs, so output, colours and prompts behave exactly as
+in-process. The launcher only talks to a daemon run by the same user.
+
+This module is imported by the launcher on every call: keep its top-level imports light.
+"""
+
+import os
+import sys
+import json
+import time
+import array
+import signal
+import socket
+from typing import Optional, List, Dict, Any
+
+DEFAULT_WORKERS = 4
+# Commands that must run in the calling process
+LOCAL_COMMANDS = {"daemon", "stub-server", "--startup-profile"}
+# Per-request settings; other differences in these prefixes mean the daemon is configured differently
+PER_REQUEST_VARIABLES = {"AI_BOT_TRACE", "AI_BOT_SOCKET", "AI_BOT_DAEMON"}
+CONFIG_PREFIXES = ("AI_BOT_", "OPENAI_", "XDG_")
+# Configuration that is only sent to the daemon as a digest; workers use their own copy
+SECRET_SUFFIX = "_API_KEY"
+# Terminal, locale and path settings that commands read besides their configuration
+FORWARDED_VARIABLES = {"TERM", "COLORTERM", "COLUMNS", "LINES", "NO_COLOR", "FORCE_COLOR", "LANG",
+                       "LANGUAGE", "TZ", "HOME", "PATH", "TMPDIR", "USER", "LOGNAME", "SHELL"}
+FORWARDED_PREFIXES = ("LC_",)
+STD_FDS = (0, 1, 2)
+# Imported before forking, including those the CLI defers to keep cold starts fast
+WARM_MODULES = ("openai", "rich.live", "rich.markdown", "rich.table", "ai_bot_agent.main")
+
+
+def fallback_dir() -> str:
+    """Return the private per-user directory for the socket when there is no runtime directory."""
+    return os.path.join("/tmp", f"ai-bot-{os.getuid()}")
+
+
+def socket_path() -> str:
+    """Return the daemon socket: AI_BOT_SOCKET, else a per-user socket in the runtime directory."""
+    configured = os.getenv("AI_BOT_SOCKET")
+    if configured:
+        return configured
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "ai-bot.sock")
+    return os.path.join(fallback_dir(), "ai-bot.sock")
+
+
+def pid_path(path: Optional[str] = None) -> str:
+    return (path or socket_path()) + ".pid"
+
+
+def _digest(value: str) -> str:
+    import hashlib
+    return "sha256:" + hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def config_fingerprint(environ: Dict[str, str]) -> Dict[str, str]:
+    """Return the environment variables that shape how commands behave, with API keys hashed."""
+    return {
+        key: _digest(value) if key.endswith(SECRET_SUFFIX) else value
+        for key, value in environ.items()
+        if (key.startswith(CONFIG_PREFIXES) or key.endswith(SECRET_SUFFIX))
+        and key not in PER_REQUEST_VARIABLES
+    }
+
+
+def request_environment(environ: Dict[str, str]) -> Dict[str, str]:
+    """Return the part of the caller's environment a daemon worker needs to run its command.
+
+    That is the configuration (API keys only as digests, matched against the
+    daemon's own), the per-request settings and terminal, locale and path
+    variables; nothing else of the caller's environment leaves the process.
+    """
+    forwarded = {
+        key: value for key, value in environ.items()
+        if key in FORWARDED_VARIABLES or key in PER_REQUEST_VARIABLES or key.startswith(FORWARDED_PREFIXES)
+    }
+    forwarded.update(config_fingerprint(environ))
+    return forwarded
+
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    """Return the user id of the process at the other end of a Unix socket, where the platform tells."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    import struct
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)[1]
+
+
+def trusted(sock: socket.socket, path: str) -> bool:
+    """Return True if the daemon at the other end of `sock` runs as the current user."""
+    try:
+        uid = _peer_uid(sock)
+        if uid is not None:
+            return uid == os.getuid()
+        # No peer credentials (e.g. macOS): trust only our own socket in a directory others cannot write to
+        info = os.stat(path)
+        parent = os.stat(os.path.dirname(os.path.abspath(path)))
+    except OSError:
+        return False
+    return info.st_uid == os.getuid() and parent.st_uid == os.getuid() and not parent.st_mode & 0o022
+
+
+def connect(path: Optional[str] = None, timeout: Optional[float] = None) -> Optional[socket.socket]:
+    """Connect to the daemon, or return None if none is listening or it belongs to another user."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = path or socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    if not trusted(sock, path):
+        sock.close()
+        sys.stderr.write(f"ai-bot: ignoring {path}: it is not served by your user\n")
+        return None
+    return sock
+
+
+def _send(sock: socket.socket, message: Dict[str, Any], fds: Optional[List[int]] = None):
+    data = json.dumps(message).encode("utf-8") + b"\n"
+    if fds:
+        # Descriptors travel with the first byte; the rest of the message follows normally
+        sock.sendmsg([data[:1]], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))])
+        data = data[1:]
+    sock.sendall(data)
+
+
+def forward(argv: List[str], path: Optional[str] = None) -> Optional[int]:
+    """Run a command in the daemon and return its exit code.
+
+    Returns None when the command should run in-process instead: no daemon is
+    listening, AI_BOT_DAEMON=off, the command must run locally, or the daemon
+    was started with a different configuration.
+    """
+    if os.getenv("AI_BOT_DAEMON", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    if LOCAL_COMMANDS.intersection(argv) or not hasattr(socket, "SCM_RIGHTS"):
+        return None
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    with sock:
+        request = {"type": "run", "argv": argv, "cwd": os.getcwd(), "env": request_environment(os.environ)}
+        try:
+            _send(sock, request, list(STD_FDS))
+            replies = sock.makefile("rb")
+            reply = json.loads(replies.readline() or b"{}")
+        except (OSError, ValueError):
+            return None
+        if "worker" not in reply:
+            return None  # Declined (e.g. different configuration) before anything ran
+
+        # Ctrl-C reaches this process; pass it on to the worker running the command
+        previous = signal.signal(signal.SIGINT, lambda signum, frame: os.kill(reply["worker"], signal.SIGINT))
+        try:
+            while True:
+                try:
+                    line = replies.readline()
+                    break
+                except InterruptedError:
+                    continue
+        finally:
+            signal.signal(signal.SIGINT, previous)
+        try:
+            return int(json.loads(line)["exit"])
+        except (ValueError, KeyError, TypeError):
+            sys.stderr.write("ai-bot: the daemon worker stopped before the command finished\n")
+            return 1
+
+
+def status(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Return information about the running daemon, or None if none answers."""
+    sock = connect(path, timeout=5)
+    if sock is None:
+        return None
+    with sock:
+        try:
+            _send(sock, {"type": "status"})
+            return json.loads(sock.makefile("rb").readline())
+        except (OSError, ValueError):
+            return None
+
+
+def stop(path: Optional[str] = None) -> bool:
+    """Ask the running daemon to shut down; return False if none was running."""
+    try:
+        with open(pid_path(path)) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+class Daemon:
+    """Pre-forked server: the parent warms up and supervises, workers run commands.
+
+    Each worker handles one command at a time, so `workers` commands run at once
+    and further ones wait in the socket backlog.
+    """
+
+    def __init__(self, path: Optional[str] = None, workers: int = DEFAULT_WORKERS):
+        self.path = path or socket_path()
+        self.workers = workers
+        self.started = time.time()
+        self.served = 0
+        self.fingerprint: Dict[str, str] = {}
+        self.children: Dict[int, bool] = {}
+        self.stopping = False
+        self.sock: Optional[socket.socket] = None
+
+    def serve_forever(self, ready: Optional[Any] = None):
+        """Warm up, start the workers and restart any that exit, until SIGTERM or Ctrl-C."""
+        if connect(self.path) is not None:
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        self.warm_up()
+        self.fingerprint = config_fingerprint(os.environ)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if directory == fallback_dir():
+            import stat
+            info = os.lstat(directory)
+            if info.st_uid != os.getuid() or info.st_mode & 0o077 or not stat.S_ISDIR(info.st_mode):
+                raise RuntimeError(f"{directory} must be a directory only you can access")
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a daemon that did not shut down cleanly
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)  # Only the owner may connect
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        self.sock.listen(64)
+        with open(pid_path(self.path), "w") as f:
+            f.write(str(os.getpid()))
+
+        previous = {sig: signal.signal(sig, self._shutdown) for sig in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+            if ready is not None:
+                ready(self)
+            while not self.stopping:
+                try:
+                    pid, _ = os.wait()
+                except InterruptedError:
+                    continue
+                except ChildProcessError:
+                    pid = None
+                if self.children.pop(pid, None) is not None and not self.stopping:
+                    self._spawn()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            self._cleanup()
+
+    def warm_up(self):
+        """Import and initialize everything a command needs, before the workers are forked."""
+        import importlib
+        from ai_bot_agent.context import count_tokens
+        from ai_bot_agent.providers import resolve_provider
+        from ai_bot_agent.transport import shared_openai_client
+
+        for module in WARM_MODULES:
+            importlib.import_module(module)
+        count_tokens("warm up")  # Loads the tokenizer, if installed
+        provider = resolve_provider()
+        if provider.api_key:
+            # No connection is opened yet, so every worker inherits an unused pool of its own
+            shared_openai_client(api_key=provider.api_key, base_url=provider.base_url)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = True
+            return
+        # Worker: the parent handles shutdown; a busy worker gets Ctrl-C from its client
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        code = 0
+        try:
+            self._work()
+        except KeyboardInterrupt:
+            pass
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _work(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except (InterruptedError, KeyboardInterrupt):
+                continue  # A client's Ctrl-C that arrived after its command finished
+            with conn:
+                try:
+                    self._handle(conn)
+                except (OSError, ValueError):
+                    pass  # The client went away or sent garbage; serve the next one
+
+    def _handle(self, conn: socket.socket):
+        fds: List[int] = []
+        data, ancillary, _, _ = conn.recvmsg(1, socket.CMSG_SPACE(len(STD_FDS) * array.array("i").itemsize))
+        for level, kind, payload in ancillary:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                received = array.array("i")
+                received.frombytes(payload[:len(payload) - len(payload) % received.itemsize])
+                fds.extend(received)
+        try:
+            request = json.loads(data + conn.makefile("rb").readline())
+            if request.get("type") == "status":
+                _send(conn, {"pid": os.getppid(), "worker": os.getpid(), "workers": self.workers,
+                             "served_by_worker": self.served, "uptime": round(time.time() - self.started, 1),
+                             "socket": self.path})
+                return
+            if len(fds) != len(STD_FDS):
+                _send(conn, {"declined": "no terminal was passed"})
+                return
+            code = self._run(conn, request, fds)
+            if code is not None:
+                self.served += 1
+                _send(conn, {"exit": code})
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _run(self, conn: socket.socket, request: Dict[str, Any], fds: List[int]) -> Optional[int]:
+        """Run one command with the client's descriptors, directory and environment.
+
+        Returns its exit code, or None if it was declined for the client to run itself.
+        """
+        from dotenv import load_dotenv
+        from rich.console import Console
+        from ai_bot_agent import main as cli
+
+        saved_env = dict(os.environ)
+        saved_cwd = os.getcwd()
+        saved_argv = sys.argv
+        saved_console = cli.console
+        saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+        saved_fds = [os.dup(fd) for fd in STD_FDS]
+        try:
+            os.environ.clear()
+            os.environ.update(request["env"])
+            for key, value in request["env"].items():
+                # API keys arrive as digests; use the daemon's own where they match
+                if key.endswith(SECRET_SUFFIX) and key in saved_env and _digest(saved_env[key]) == value:
+                    os.environ[key] = saved_env[key]
+            load_dotenv()  # As on an in-process start (found relative to the package, not the cwd)
+            if config_fingerprint(os.environ) != self.fingerprint:
+                _send(conn, {"declined": "configuration differs from the daemon's"})
+                return None
+            os.chdir(request["cwd"])
+            _send(conn, {"worker": os.getpid()})
+
+            for stream in saved_streams:
+                stream.flush()
+            for fd, target in zip(fds, STD_FDS):
+                os.dup2(fd, target)
+            # Fresh streams and console pick up the client's terminal (tty, width, colours)
+            sys.stdin = open(0, "r", closefd=False)
+            sys.stdout = open(1, "w", closefd=False)
+            sys.stderr = open(2, "w", closefd=False, errors="backslashreplace")
+            cli.console = Console()
+            cli._started = time.time()
+            sys.argv = ["ai-bot"] + request["argv"]
+            try:
+                cli.app(args=request["argv"], prog_name="ai-bot")
+                return 0
+            except SystemExit as e:
+                return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except KeyboardInterrupt:
+                return 130
+            except Exception:
+                import traceback
+                traceback.print_exc()
+                return 1
+        finally:
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            for fd, target in zip(saved_fds, STD_FDS):
+                os.dup2(fd, target)
+                os.close(fd)
+            cli.console = saved_console
+            sys.argv = saved_argv
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+    def _shutdown(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _cleanup(self):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        self.children.clear()
+        if self.sock is not None:
+            self.sock.close()
+        for path in (self.path, pid_path(self.path)):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,63 @@
+"""
+Structured events emitted by the agents.
+The agents report progress as events (started, token, usage, finished, error, ...)
+to pluggable sinks instead of printing, so the CLI decides how, or whether, to render.
+"""
+
+import sys
+import json
+import time
+from typing import Callable, Optional, Iterable, List, Dict, Any, TextIO
+
+EventSink = Callable[[Dict[str, Any]], None]
+
+
+class EventEmitter:
+    """Deliver events to a list of sinks."""
+
+    def __init__(self, sinks: Optional[Iterable[EventSink]] = None):
+        self.sinks: List[EventSink] = list(sinks or [])
+
+    def __bool__(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink: EventSink):
+        """Register another sink."""
+        self.sinks.append(sink)
+
+    def emit(self, event_type: str, **data: Any):
+        """Send an event to every sink; does nothing when there are none."""
+        if not self.sinks:
+            return
+        event = {"type": event_type, "time": time.time()}
+        event.update(data)
+        for sink in self.sinks:
+            sink(event)
+
+
+class JsonLinesSink:
+    """Write each event as one JSON line."""
+
+    def __init__(self, stream: TextIO = sys.stdout, include_tokens: bool = False):
+        self.stream = stream
+        self.include_tokens = include_tokens
+
+    def __call__(self, event: Dict[str, Any]):
+        if event["type"] == "token" and not self.include_tokens:
+            return
+        self.stream.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+
+
+class CollectingSink:
+    """Keep events in memory, e.g. for tests or for inspecting a run afterwards."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    def __call__(self, event: Dict[str, Any]):
+        self.events.append(event)
+
+    def of_type(self, event_type: str) -> List[Dict[str, Any]]:
+        """Return the collected events of one type."""
+        return [event for event in self.events if event["type"] == event_type]
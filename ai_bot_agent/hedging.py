@@ -0,0 +1,243 @@
+"""
+Hedged requests for AI Bot Agent.
+When a response is slower than usual to start, a second copy of the request is sent
+(to the next model in the route, or the same one) and whichever starts answering
+first is used; the other is closed. The wait before hedging adapts to the observed
+time to first token, and a budget caps how many requests may be hedged.
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from typing import Callable, Optional, Deque, Dict, Any, List, Tuple, TypeVar
+
+from ai_bot_agent.telemetry import TelemetryLog, percentile
+from ai_bot_agent.tracing import shared_tracer
+
+T = TypeVar("T")
+
+DEFAULT_QUANTILE = 0.9
+DEFAULT_MAX_RATE = 0.1
+DEFAULT_WINDOW = 200
+# Below this many samples for a model, its usual latency is unknown and requests are not hedged
+DEFAULT_MIN_SAMPLES = 10
+
+_lock = threading.Lock()
+_shared_policy: Optional["HedgePolicy"] = None
+
+
+class HedgePolicy:
+    """Decide when to hedge: after the `quantile` of recent times to first token, within a budget.
+
+    Times are kept per model. Hedged requests are always streamed, so every
+    observed time is a real time to first token; the history is seeded from the
+    telemetry log's streamed requests (a non-streamed record only has its total
+    time) so that short-lived CLI processes start with history. At most `max_rate`
+    of recent requests may be hedged, counting hedges still in flight.
+    AI_BOT_HEDGE_DELAY sets a fixed wait instead.
+    """
+
+    def __init__(self, quantile: Optional[float] = None, max_rate: Optional[float] = None,
+                 delay: Optional[float] = None, window: int = DEFAULT_WINDOW,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, telemetry: Optional[TelemetryLog] = None):
+        self.quantile = quantile or float(os.getenv("AI_BOT_HEDGE_QUANTILE", DEFAULT_QUANTILE))
+        if max_rate is None:
+            max_rate = float(os.getenv("AI_BOT_HEDGE_MAX_RATE", DEFAULT_MAX_RATE))
+        self.max_rate = max_rate
+        if delay is None and os.getenv("AI_BOT_HEDGE_DELAY"):
+            delay = float(os.environ["AI_BOT_HEDGE_DELAY"])
+        self.fixed_delay = delay
+        self.window = window
+        self.min_samples = min_samples
+        self.telemetry = telemetry
+        self.lock = threading.Lock()
+        self.first_tokens: Dict[str, Deque[float]] = {}
+        self.hedged: Deque[bool] = deque(maxlen=window)
+        # Hedges allowed whose requests have not finished yet
+        self.reserved = 0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._seeded = telemetry is None
+
+    def delay(self, model: str) -> Optional[float]:
+        """Return how long to wait for a first token before hedging, or None to not hedge."""
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        self._seed()
+        with self.lock:
+            samples = self.first_tokens.get(model)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            return percentile(sorted(samples), self.quantile)
+
+    def allow(self) -> bool:
+        """Return True, and reserve a hedge, if the budget allows one more.
+
+        The reservation counts against the budget until `observe` or `abandon`
+        settles it, so concurrent requests cannot all take the same slot.
+        """
+        self._seed()
+        with self.lock:
+            hedges = sum(self.hedged) + self.reserved + 1
+            if hedges > self.max_rate * (len(self.hedged) + self.reserved + 1):
+                return False
+            self.reserved += 1
+            self.hedges += 1
+            return True
+
+    def observe(self, model: str, first_token: float, hedged: bool, hedge_won: bool = False):
+        """Record a finished request: its time to first token and whether it was hedged."""
+        with self.lock:
+            samples = self.first_tokens.get(model)
+            if samples is None:
+                samples = self.first_tokens[model] = deque(maxlen=self.window)
+            samples.append(first_token)
+            self._settle(hedged)
+            self.requests += 1
+            self.hedge_wins += hedge_won
+
+    def abandon(self, hedged: bool):
+        """Record a failed request, settling its hedge reservation if it was hedged."""
+        with self.lock:
+            self._settle(hedged)
+
+    def _settle(self, hedged: bool):
+        if hedged and self.reserved:
+            self.reserved -= 1
+        self.hedged.append(hedged)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counts of requests, hedges and hedges that answered first."""
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "recent_hedge_rate": sum(self.hedged) / len(self.hedged) if self.hedged else 0.0,
+                "in_flight": self.reserved,
+                "max_rate": self.max_rate,
+            }
+
+    def _seed(self):
+        if self._seeded:
+            return
+        records = self.telemetry.recent(self.window * 4) if self.telemetry is not None else []
+        with self.lock:
+            if self._seeded:
+                return
+            for record in records:
+                if record.get("error") or record.get("cache_hit") or record.get("coalesced"):
+                    continue
+                self.hedged.append(bool(record.get("hedged")))
+                if record.get("streamed") and "time_to_first_token" in record:
+                    samples = self.first_tokens.setdefault(record.get("model") or "unknown",
+                                                           deque(maxlen=self.window))
+                    samples.append(record["time_to_first_token"])
+            self._seeded = True
+
+
+class Cancellation:
+    """Tells a raced attempt that it lost, and closes what it opened (e.g. a response stream)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.resources: List[Any] = []
+
+    def register(self, resource: T) -> T:
+        """Have `resource` closed when the attempt loses (at once, if it already has); return it."""
+        with self.lock:
+            if not self.cancelled:
+                self.resources.append(resource)
+                return resource
+        _close(resource)
+        return resource
+
+    def cancel(self):
+        """Mark the attempt as lost and close its registered resources."""
+        with self.lock:
+            self.cancelled = True
+            resources, self.resources = self.resources, []
+        for resource in resources:
+            _close(resource)
+
+
+def _close(resource: Any):
+    close = getattr(resource, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass  # Closing from another thread may interrupt a read; the attempt is abandoned anyway
+
+
+def race(primary: Callable[[Cancellation], T], hedge: Callable[[Cancellation], T], delay: float,
+         allow: Callable[[], bool]) -> Tuple[T, bool, bool]:
+    """Run `primary`, and `hedge` too if `primary` has not returned within `delay` seconds.
+
+    `hedge` only starts if `allow()` agrees. Returns the first successful result,
+    whether a hedge was sent and whether the hedge won. Each attempt gets a
+    `Cancellation` to register what it opens; as soon as one attempt succeeds, the
+    other's is cancelled, closing its response even while it waits for a first
+    token. If every attempt fails, the primary's error is raised.
+    """
+    results: "queue.Queue[Tuple[int, Any, Optional[BaseException]]]" = queue.Queue()
+    cancellations = (Cancellation(), Cancellation())
+    winner: Dict[str, int] = {}
+    lock = threading.Lock()
+    tracer = shared_tracer()
+
+    def run(index: int, attempt: Callable[[Cancellation], T]):
+        try:
+            value = attempt(cancellations[index])
+        except BaseException as e:
+            results.put((index, None, e))
+            return
+        with lock:
+            won = winner.setdefault("index", index) == index
+        if won:
+            cancellations[1 - index].cancel()
+            results.put((index, value, None))
+        else:
+            cancellations[index].cancel()
+
+    def start(index: int, attempt: Callable[[Cancellation], T]):
+        # Daemon threads, so an abandoned attempt never keeps the process alive
+        threading.Thread(target=tracer.wrap(run), args=(index, attempt), daemon=True).start()
+
+    start(0, primary)
+    try:
+        index, value, error = results.get(timeout=delay)
+    except queue.Empty:
+        pass
+    else:
+        if error is not None:
+            raise error
+        return value, False, False
+
+    if not allow():
+        index, value, error = results.get()
+        if error is not None:
+            raise error
+        return value, False, False
+
+    start(1, hedge)
+    errors: Dict[int, BaseException] = {}
+    while len(errors) < 2:
+        index, value, error = results.get()
+        if error is None:
+            return value, True, index == 1
+        errors[index] = error
+    raise errors[0]
+
+
+def shared_hedge_policy() -> HedgePolicy:
+    """Return the process-wide hedge policy, seeded from the shared telemetry log."""
+    global _shared_policy
+    with _lock:
+        if _shared_policy is None:
+            from ai_bot_agent.telemetry import shared_telemetry
+            _shared_policy = HedgePolicy(telemetry=shared_telemetry())
+        return _shared_policy
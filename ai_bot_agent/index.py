@@ -0,0 +1,93 @@
+"""
+Per-file analysis index for AI Bot Agent.
+Maps each analyzed file to its mtime, size, content hash and report, so that
+`analyze --incremental` only re-queries files that are new or have changed.
+"""
+
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from ai_bot_agent.cache import cache_dir
+from ai_bot_agent.analysis import file_digest
+
+
+class AnalysisIndex:
+    """SQLite index of file analysis results."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else cache_dir() / "analysis.sqlite"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                report TEXT NOT NULL,
+                analyzed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                report TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+
+    def lookup(self, path: Path) -> Optional[str]:
+        """Return the stored report for a file if it has not changed since it was analyzed.
+
+        A matching mtime and size is trusted without reading the file; otherwise the
+        content hash decides, so a file that was only touched is not re-analyzed.
+        """
+        key = str(path.resolve())
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT mtime_ns, size, digest, report FROM files WHERE path = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        stat = path.stat()
+        mtime_ns, size, digest, report = row
+        if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+            return report
+        if stat.st_size != size or file_digest(path) != digest:
+            return None
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, key))
+        return report
+
+    def store(self, path: Path, digest: str, report: str):
+        """Record the report for a file."""
+        stat = path.stat()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, digest, report, analyzed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path.resolve()), stat.st_mtime_ns, stat.st_size, digest, report, time.time()),
+            )
+
+    def get_summary(self, key: str) -> Optional[str]:
+        """Return a stored overall report."""
+        with self.lock:
+            row = self.conn.execute("SELECT report FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, key: str, report: str):
+        """Store an overall report."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, report, created_at) VALUES (?, ?, ?)",
+                (key, report, time.time()),
+            )
+
+    def close(self):
+        """Close the underlying database connection."""
+        self.conn.close()
@@ -0,0 +1,21 @@
+"""
+Entry point of the `ai-bot` command.
+Hands the command to a running `ai-bot daemon` when there is one, so it starts in
+milliseconds, and otherwise runs the CLI in this process.
+"""
+
+import sys
+
+from ai_bot_agent.daemon import forward
+
+
+def main():
+    code = forward(sys.argv[1:])
+    if code is None:
+        from ai_bot_agent.main import app
+        app(prog_name="ai-bot")
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Request timing helpers for AI Bot Agent.
+"""
+
+from typing import Dict, Any
+
+
+def request_stats(model: str, time_to_first_token: float, total_time: float,
+                  completion_tokens: int, cache_hit: bool = False, prompt_tokens: int = 0,
+                  retries: int = 0, coalesced: bool = False, streamed: bool = False,
+                  hedged: bool = False) -> Dict[str, Any]:
+    """Return timing information for a single request.
+
+    `coalesced` marks a request that shared another caller's identical in-flight call,
+    `hedged` one that was sent a second time because it was slow to start.
+    """
+    generation_time = total_time - time_to_first_token
+    return {
+        "model": model,
+        "cache_hit": cache_hit,
+        "time_to_first_token": time_to_first_token,
+        "total_time": total_time,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_per_second": completion_tokens / generation_time if generation_time > 0 else 0.0,
+        "retries": retries,
+        "coalesced": coalesced,
+        "streamed": streamed,
+        "hedged": hedged,
+    }
+
+
+def completion_stats(model: str, total_time: float, response: Any, retries: int = 0,
+                     hedged: bool = False) -> Dict[str, Any]:
+    """Return timing information for a non-streamed completion, using its reported usage."""
+    usage = getattr(response, "usage", None)
+    return request_stats(
+        model,
+        total_time,
+        total_time,
+        usage.completion_tokens if usage else 0,
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        retries=retries,
+        hedged=hedged
+    )
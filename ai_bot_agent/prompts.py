@@ -0,0 +1,105 @@
+"""
+Prompts shared by the synchronous and asynchronous agents.
+"""
+
+from pathlib import Path
+from typing import List, Dict, Any
+
+from ai_bot_agent.analysis import DEFAULT_CHUNK_BYTES
+from ai_bot_agent.tracing import shared_tracer
+
+SYSTEM_PROMPT = """You are an intelligent AI assistant running from the command line.
+You can help with:
+- Answering questions and providing information
+- Writing and analyzing code
+- File operations and system tasks
+- Web searches and research
+- Creative writing and brainstorming
+- Problem solving and analysis
+
+Be helpful, accurate, and concise in your responses."""
+
+
+def build_analysis_prompt(file_path: str) -> str:
+    """Build the prompt used to analyze a file that fits in a single chunk."""
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"File '{file_path}' not found.")
+
+    with shared_tracer().span("file.read", {"path": file_path}) as span:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read(DEFAULT_CHUNK_BYTES)
+        span.set_attribute("chars", len(content))
+
+    return f"""Analyze this file and provide insights:
+
+File: {file_path}
+Size: {path.stat().st_size} bytes
+Content:
+{content}
+
+Please provide:
+1. File type and purpose
+2. Key components or functions
+3. Potential issues or improvements
+4. Summary
+"""
+
+
+def build_code_prompt(description: str, language: str = "python") -> str:
+    """Build the prompt used to generate code."""
+    return f"""Generate {language} code for the following description:
+
+{description}
+
+Please provide:
+1. Complete, working code
+2. Brief explanation of the code
+3. Usage examples if applicable
+"""
+
+
+def build_summary_prompt(summary: str, messages: List[Dict[str, str]]) -> str:
+    """Build the prompt that folds dropped turns into a rolling conversation summary."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    return f"""Update the summary of a conversation with the new turns below.
+Keep names, decisions and open questions. Reply with the summary only, in at most 150 words.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{transcript}
+"""
+
+
+def build_search_prompt(query: str, hits: List[Dict[str, Any]]) -> str:
+    """Build the prompt that summarizes the top search hits for a query."""
+    from ai_bot_agent.search import excerpt
+
+    sections = []
+    for number, hit in enumerate(hits, 1):
+        text = excerpt(Path(hit["path"]), hit["line"]) if hit["line"] else hit["snippet"]
+        sections.append(f"[{number}] {hit['path']} (line {hit['line']}):\n{text}")
+    results = "\n\n".join(sections)
+    return f"""Summarize what these search results say about: {query}
+
+Refer to results by their number, and say so if they do not answer the query.
+
+{results}
+"""
+
+
+def build_repo_prompt(question: str, chunks: List[Dict[str, Any]]) -> str:
+    """Build the prompt that answers a question from the most relevant chunks of a repository."""
+    excerpts = "\n\n".join(
+        f"[{number}] {chunk['path']} (from line {chunk['line']}):\n```\n{chunk['text'].rstrip()}\n```"
+        for number, chunk in enumerate(chunks, 1)
+    )
+    return f"""Answer the question below about a code repository, using these excerpts from it.
+Cite the files you rely on as path:line. If the excerpts are not enough to answer, say so.
+
+{excerpts}
+
+Question: {question}
+"""
@@ -0,0 +1,95 @@
+"""
+Provider backends for AI Bot Agent.
+Any server with an OpenAI-compatible API can be used by pointing the client at its
+base URL: vLLM, llama.cpp server, Ollama, an internal gateway, or the bundled stub.
+"""
+
+import os
+import json
+import threading
+from typing import Optional, List, Dict
+
+DEFAULT_PROVIDER = "openai"
+STUB_PORT = 8089
+MODELS_TIMEOUT = 5.0
+
+# Name -> default base URL, environment variable holding the API key and, where the
+# model names are known in advance, the fast and strong tiers "auto" routes between
+PROVIDERS: Dict[str, Dict[str, Optional[str]]] = {
+    "openai": {"base_url": None, "api_key_env": "OPENAI_API_KEY",
+               "fast_models": "gpt-3.5-turbo,gpt-4o-mini", "strong_models": "gpt-4o,gpt-4-turbo"},
+    "vllm": {"base_url": "http://localhost:8000/v1", "api_key_env": "VLLM_API_KEY"},
+    "llamacpp": {"base_url": "http://localhost:8080/v1", "api_key_env": "LLAMACPP_API_KEY"},
+    "ollama": {"base_url": "http://localhost:11434/v1", "api_key_env": "OLLAMA_API_KEY"},
+    "stub": {"base_url": f"http://127.0.0.1:{STUB_PORT}/v1", "api_key_env": None},
+}
+
+# Local servers usually ignore the key, but the OpenAI SDK insists on one
+PLACEHOLDER_API_KEY = "not-needed"
+
+_lock = threading.Lock()
+# Base URL -> models it serves, asked once per process
+_served_models: Dict[str, List[str]] = {}
+
+
+class Provider:
+    """Where requests are sent and with which credentials."""
+
+    def __init__(self, name: str, base_url: Optional[str], api_key: Optional[str], requires_key: bool):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.requires_key = requires_key
+        preset = PROVIDERS.get(name, {})
+        self.fast_models = preset.get("fast_models")
+        self.strong_models = preset.get("strong_models")
+
+    def served_models(self) -> List[str]:
+        """Return the models the server lists at `<base_url>/models`, or [] if it cannot be asked.
+
+        The answer is cached for the process. Only used for servers whose model
+        names are not known in advance.
+        """
+        if not self.base_url:
+            return []
+        with _lock:
+            if self.base_url in _served_models:
+                return _served_models[self.base_url]
+        import urllib.request
+
+        request = urllib.request.Request(self.base_url.rstrip("/") + "/models",
+                                         headers={"Authorization": f"Bearer {self.api_key}"})
+        try:
+            with urllib.request.urlopen(request, timeout=MODELS_TIMEOUT) as response:
+                models = [entry["id"] for entry in json.load(response).get("data", [])]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return []  # Not cached: the server may just not be up yet
+        with _lock:
+            _served_models[self.base_url] = models
+        return models
+
+    @property
+    def cache_namespace(self) -> str:
+        """Prefix for cache keys, so answers from different servers are never mixed up."""
+        return "" if self.requires_key else f"{self.base_url}#"
+
+    def __repr__(self) -> str:
+        return f"Provider({self.name!r}, base_url={self.base_url!r})"
+
+
+def resolve_provider(name: Optional[str] = None, base_url: Optional[str] = None) -> Provider:
+    """Build a provider from a preset name and an optional base URL override.
+
+    Unset values come from AI_BOT_PROVIDER and AI_BOT_BASE_URL. Only OpenAI itself
+    (no custom base URL) requires an API key; other servers get a placeholder.
+    """
+    name = (name or os.getenv("AI_BOT_PROVIDER") or DEFAULT_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown provider '{name}'. Choose one of: {', '.join(PROVIDERS)}")
+    preset = PROVIDERS[name]
+    base_url = base_url or os.getenv("AI_BOT_BASE_URL") or preset["base_url"]
+    requires_key = name == "openai" and base_url is None
+    api_key = os.getenv(preset["api_key_env"]) if preset["api_key_env"] else None
+    if not api_key and not requires_key:
+        api_key = PLACEHOLDER_API_KEY
+    return Provider(name, base_url, api_key, requires_key)
@@ -0,0 +1,330 @@
+"""
+Repository retrieval for AI Bot Agent.
+The text files of a repository are split into chunks and embedded into a local vector
+index (a memory-mapped NumPy array, with chunk locations in SQLite). A question is
+answered from the few chunks most similar to it, so the prompt stays small however
+large the repository is. Only chunks of files that changed since the last run are
+embedded again. Requires NumPy (pip install 'ai-bot-agent[semantic]').
+"""
+
+import os
+import mmap
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, List, Dict, Set, Any, Tuple
+
+from ai_bot_agent.cache import cache_dir
+from ai_bot_agent.analysis import expand_targets, sniff, iter_chunk_spans
+from ai_bot_agent.providers import Provider
+from ai_bot_agent.semantic_cache import Embedder, embedder_from_spec
+from ai_bot_agent.tracing import shared_tracer
+
+DEFAULT_TOP_K = 8
+CHUNK_BYTES = 2000
+MAX_FILE_BYTES = 1024 * 1024
+# Chunks per embedding request, and requests in flight
+EMBED_BATCH = 128
+EMBED_CONCURRENCY = 4
+# Files whose chunks are stored together; an interrupted run keeps every finished group
+FILE_GROUP = 200
+# Rows scored at a time, bounding memory when searching large indexes
+SEARCH_BLOCK = 65536
+
+# NumPy, imported when the first repository index is opened
+np: Any = None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("Repository search needs NumPy (pip install 'ai-bot-agent[semantic]')")
+        np = numpy
+
+
+def repo_embedder(provider: Provider) -> Embedder:
+    """Return the embedder chosen by AI_BOT_REPO_EMBEDDER, else the semantic cache's embedder."""
+    spec = os.getenv("AI_BOT_REPO_EMBEDDER") or os.getenv("AI_BOT_SEMANTIC_EMBEDDER", "openai")
+    return embedder_from_spec(spec, provider)
+
+
+class RepoIndex:
+    """Embeddings of a repository's text chunks, kept under XDG_CACHE_HOME per repository.
+
+    Vectors are unit length and live one per row in a memory-mapped array that grows
+    as needed; SQLite maps rows to the file, byte range and first line of their chunk.
+    Chunk boundaries depend on content, so an edit only changes the chunks around it,
+    and unchanged chunks of a changed file keep their vectors. Changing the embedder
+    to one with a different vector size re-embeds the repository.
+    """
+
+    def __init__(self, root: Path, embedder: Embedder, path: Optional[Path] = None,
+                 chunk_bytes: int = CHUNK_BYTES):
+        _load_numpy()
+        self.root = Path(root).resolve()
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"Directory '{root}' not found.")
+        self.embedder = embedder
+        self.chunk_bytes = chunk_bytes
+        key = hashlib.blake2b(str(self.root).encode("utf-8"), digest_size=8).hexdigest()
+        self.path = Path(path) if path else cache_dir() / "repos" / key
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.path / "vectors.npy"
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path / "chunks.sqlite"), check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                stop INTEGER NOT NULL,
+                line INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_path ON chunks (path);
+            """
+        )
+        self.vectors: Any = None
+        try:
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+        except (OSError, ValueError):
+            pass
+
+    def update(self, progress: Optional[Callable[[str], None]] = None,
+               concurrency: int = EMBED_CONCURRENCY) -> Dict[str, Any]:
+        """Embed new and changed files and forget removed ones; return what was done."""
+        result: Dict[str, Any] = {"files": 0, "changed": 0, "removed": 0, "embedded": 0, "reused": 0,
+                                  "skipped": []}
+        with self.lock, shared_tracer().span("repo.update", {"root": str(self.root)}) as span:
+            known = {path: (mtime, size) for path, mtime, size in
+                     self.conn.execute("SELECT path, mtime_ns, size FROM files")}
+            seen: Set[str] = set()
+            changed: List[Tuple[str, Path, os.stat_result]] = []
+            for path in expand_targets([str(self.root)]):
+                relative = path.relative_to(self.root).as_posix()
+                try:
+                    stat = path.stat()
+                    if known.get(relative) == (stat.st_mtime_ns, stat.st_size):
+                        seen.add(relative)
+                        continue
+                    reason = sniff(path, MAX_FILE_BYTES)
+                except OSError as e:
+                    result["skipped"].append((relative, e.strerror or str(e)))
+                    continue
+                if reason:
+                    if reason != "empty":
+                        result["skipped"].append((relative, reason))
+                    continue
+                seen.add(relative)
+                changed.append((relative, path, stat))
+            result["files"] = len(seen)
+            removed = [path for path in known if path not in seen]
+            result["changed"], result["removed"] = len(changed), len(removed)
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                free = self._free_rows()
+                with self.conn:
+                    self._drop(removed, free)
+                for start in range(0, len(changed), FILE_GROUP):
+                    if not self._store(changed[start:start + FILE_GROUP], free, pool, result, progress):
+                        # The embedder's vector size changed and the index was emptied: start over
+                        return self.update(progress, concurrency)
+            span.set_attributes({key: value for key, value in result.items() if key != "skipped"})
+        return result
+
+    def search(self, question: str, k: int = DEFAULT_TOP_K) -> List[Dict[str, Any]]:
+        """Return the `k` chunks most similar to a question, best first, with their text."""
+        with self.lock, shared_tracer().span("repo.search", {"k": k}) as span:
+            if self.vectors is None or not len(self.vectors):
+                return []
+            query = self._embed([question])[0]
+            rows = len(self.vectors)
+            scores = np.empty(rows, dtype=np.float32)
+            for start in range(0, rows, SEARCH_BLOCK):
+                scores[start:start + SEARCH_BLOCK] = self.vectors[start:start + SEARCH_BLOCK] @ query
+            # Unused rows hold NaN, which sorts after every real score
+            top = np.argpartition(-scores, k - 1)[:k] if rows > k else np.arange(rows)
+            top = [int(row) for row in top[np.argsort(-scores[top])] if not np.isnan(scores[row])]
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            chunks = {row: (path, start, stop, line) for row, path, start, stop, line in self.conn.execute(
+                f"SELECT row, path, start, stop, line FROM chunks WHERE row IN ({placeholders})", top
+            )}
+            span.set_attribute("rows", rows)
+        hits = []
+        for row in top:
+            if row not in chunks:
+                continue
+            path, start, stop, line = chunks[row]
+            try:
+                with open(self.root / path, "rb") as f:
+                    f.seek(start)
+                    text = f.read(stop - start).decode("utf-8", errors="replace")
+            except OSError:
+                continue
+            hits.append({"path": path, "line": line, "text": text, "score": round(float(scores[row]), 4)})
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        """Return file, chunk and size counts."""
+        with self.lock:
+            files = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            chunks = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            return {
+                "root": str(self.root),
+                "files": files,
+                "chunks": chunks,
+                "dimensions": self.vectors.shape[1] if self.vectors is not None else 0,
+                "index_bytes": sum(p.stat().st_size for p in self.path.iterdir() if p.is_file()),
+                "path": str(self.path),
+            }
+
+    def close(self):
+        """Release the vector map and close the database connection."""
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+            self.vectors = None
+            self.conn.close()
+
+    def _store(self, files: List[Tuple[str, Path, os.stat_result]], free: List[int],
+               pool: ThreadPoolExecutor, result: Dict[str, Any],
+               progress: Optional[Callable[[str], None]]) -> bool:
+        """Chunk and embed changed files and replace their old chunks; False if the index was reset."""
+        chunks: List[Tuple[str, int, int, int, str, str]] = []
+        for relative, path, _ in files:
+            chunks.extend(self._chunk(relative, path))
+        names = [relative for relative, _, _ in files]
+        old: Dict[str, int] = {}
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            old.update((digest, row) for digest, row in self.conn.execute(
+                f"SELECT digest, row FROM chunks WHERE path IN ({placeholders})", batch))
+
+        # Chunks whose content is unchanged keep their vector
+        vectors: Dict[str, Any] = {}
+        if self.vectors is not None:
+            vectors = {chunk[4]: np.array(self.vectors[old[chunk[4]]]) for chunk in chunks if chunk[4] in old}
+        missing: Dict[str, str] = {}
+        for chunk in chunks:
+            if chunk[4] not in vectors:
+                missing.setdefault(chunk[4], chunk[5])
+        result["reused"] += len(chunks) - len(missing)
+
+        digests = list(missing)
+        batches = [digests[i:i + EMBED_BATCH] for i in range(0, len(digests), EMBED_BATCH)]
+        embedded = pool.map(lambda batch: self._embed([missing[d] for d in batch]), batches)
+        for batch, batch_vectors in zip(batches, embedded):
+            vectors.update(zip(batch, batch_vectors))
+            result["embedded"] += len(batch)
+            if progress is not None:
+                progress(f"Embedded {result['embedded']} chunks")
+        if not chunks:
+            return True
+        if not self._open(len(next(iter(vectors.values())))):
+            return False
+
+        with self.conn:
+            self._drop(names, free)
+            rows = self._allocate(len(chunks), free)
+            for row, chunk in zip(rows, chunks):
+                self.vectors[row] = vectors[chunk[4]]
+            self.vectors.flush()  # Rows are written before the database points at them
+            self.conn.executemany(
+                "INSERT INTO chunks (row, path, start, stop, line, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                [(row, *chunk[:5]) for row, chunk in zip(rows, chunks)]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                [(relative, stat.st_mtime_ns, stat.st_size) for relative, _, stat in files]
+            )
+        return True
+
+    def _chunk(self, relative: str, path: Path) -> List[Tuple[str, int, int, int, str, str]]:
+        """Split a file into (path, start, stop, first line, digest, text to embed) chunks."""
+        chunks = []
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            line = 1
+            for start, stop in iter_chunk_spans(mm, self.chunk_bytes):
+                data = mm[start:stop]
+                # The path is embedded with the chunk, so file names count towards similarity
+                text = f"{relative}\n{data.decode('utf-8', errors='replace')}"
+                digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+                chunks.append((relative, start, stop, line, digest, text))
+                line += data.count(b"\n")
+        return chunks
+
+    def _embed(self, texts: List[str]) -> Any:
+        """Return the unit-length embeddings of texts as rows of an array."""
+        vectors = np.asarray(self.embedder(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)  # Dot products of unit vectors are cosine similarities
+
+    def _open(self, dimensions: int) -> bool:
+        """Map the vector file, creating it if needed; return False if existing chunks were dropped."""
+        if self.vectors is not None and self.vectors.shape[1] == dimensions:
+            return True
+        had_vectors = self.vectors is not None
+        self.vectors = np.lib.format.open_memmap(str(self.vectors_path), mode="w+", dtype=np.float32,
+                                                 shape=(0, dimensions))
+        with self.conn:
+            dropped = self.conn.execute("DELETE FROM chunks").rowcount
+            self.conn.execute("DELETE FROM files")
+        return not (had_vectors and dropped)
+
+    def _free_rows(self) -> List[int]:
+        """Return the unused rows of the vector array, highest first (so pop() gives the lowest)."""
+        if self.vectors is None:
+            return []
+        used = {row for row, in self.conn.execute("SELECT row FROM chunks")}
+        return [row for row in range(len(self.vectors) - 1, -1, -1) if row not in used]
+
+    def _drop(self, paths: List[str], free: List[int]):
+        """Delete the chunks and records of files and mark their rows unused; call inside a transaction."""
+        for start in range(0, len(paths), 500):
+            batch = paths[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = [row for row, in self.conn.execute(
+                f"SELECT row FROM chunks WHERE path IN ({placeholders})", batch)]
+            self.conn.execute(f"DELETE FROM chunks WHERE path IN ({placeholders})", batch)
+            self.conn.execute(f"DELETE FROM files WHERE path IN ({placeholders})", batch)
+            if self.vectors is not None:
+                for row in rows:
+                    self.vectors[row] = np.nan
+            free.extend(rows)
+            free.sort(reverse=True)
+
+    def _allocate(self, count: int, free: List[int]) -> List[int]:
+        """Return `count` unused rows, growing the vector array if there are not enough."""
+        rows = [free.pop() for _ in range(min(count, len(free)))]
+        if len(rows) < count:
+            size, dimensions = self.vectors.shape
+            needed = size + count - len(rows)
+            # Grow geometrically, so repeated updates copy the array only a few times
+            grown = max(needed, size + size // 2, 1024)
+            tmp = str(self.vectors_path) + ".tmp"
+            resized = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(grown, dimensions))
+            resized[:size] = self.vectors[:]
+            resized[size:] = np.nan
+            resized.flush()
+            del resized
+            self.vectors = None
+            os.replace(tmp, self.vectors_path)
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            rows.extend(range(size, needed))
+            free.extend(range(grown - 1, needed - 1, -1))
+        return rows
@@ -0,0 +1,244 @@
+"""
+Model routing for AI Bot Agent.
+With the "auto" model, short prompts go to a fast, cheap tier and long or code-heavy
+prompts to a stronger tier. Within a tier the currently fastest healthy model is
+tried first, and timeouts or server errors fall back to the next candidate.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import deque
+from typing import Callable, Awaitable, Optional, Deque, List, Dict, Any, Tuple, TypeVar
+
+from ai_bot_agent.context import count_tokens
+from ai_bot_agent.scheduler import RequestScheduler
+from ai_bot_agent.providers import Provider, PROVIDERS, DEFAULT_PROVIDER
+from ai_bot_agent.tracing import shared_tracer
+
+AUTO_MODEL = "auto"
+# Prompts above this many tokens are routed to the strong tier
+DEFAULT_ESCALATE_TOKENS = 1500
+DEFAULT_WINDOW = 50
+# A model failing more often than this is tried after the healthy ones
+MAX_ERROR_RATE = 0.5
+
+CODE_LINE = re.compile(
+    r"^\s*(def |class |import |from \S+ import |#include|function |public |private |return\b)"
+    r"|[;{}]\s*$"
+)
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+# (provider name, base URL) -> router, so models from one server are never tried on another
+_shared_routers: Dict[Tuple[str, Optional[str]], "ModelRouter"] = {}
+
+
+def is_code_heavy(text: str) -> bool:
+    """Return True if the text contains fenced code or is mostly source lines."""
+    if "```" in text:
+        return True
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 5:
+        return False
+    return sum(1 for line in lines if CODE_LINE.search(line)) / len(lines) > 0.3
+
+
+def should_fall_back(error: Exception) -> bool:
+    """Return True for failures another model may not have (timeouts, overload, server errors)."""
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def is_timeout(error: Exception) -> bool:
+    """Return True if the request timed out; retrying the same model is then not worth it."""
+    import openai
+
+    return isinstance(error, openai.APITimeoutError)
+
+
+class ModelStats:
+    """Rolling latency and error-rate window for one model."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Mean latency of successful requests in the window."""
+        latencies = [latency for latency, ok in self.samples if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+
+class ModelRouter:
+    """Choose models for requests and fall back between them.
+
+    Tiers default to AI_BOT_FAST_MODELS and AI_BOT_STRONG_MODELS (comma-separated,
+    in order of preference), then to the tiers of `provider`'s preset (OpenAI's by
+    default). Servers without a preset tier, such as local ones, only know their
+    own model names, so "auto" uses the first model they serve. The escalation
+    threshold defaults to AI_BOT_ESCALATE_TOKENS.
+    """
+
+    def __init__(self, fast_models: Optional[List[str]] = None, strong_models: Optional[List[str]] = None,
+                 escalate_tokens: Optional[int] = None, window: int = DEFAULT_WINDOW,
+                 provider: Optional[Provider] = None):
+        self.provider = provider
+        preset = PROVIDERS[provider.name if provider is not None else DEFAULT_PROVIDER]
+        self.fast_models = (fast_models or _model_list(os.getenv("AI_BOT_FAST_MODELS", ""))
+                            or _model_list(preset.get("fast_models") or ""))
+        self.strong_models = (strong_models or _model_list(os.getenv("AI_BOT_STRONG_MODELS", ""))
+                              or _model_list(preset.get("strong_models") or ""))
+        self.escalate_tokens = escalate_tokens or int(os.getenv("AI_BOT_ESCALATE_TOKENS",
+                                                                DEFAULT_ESCALATE_TOKENS))
+        self.window = window
+        self.lock = threading.Lock()
+        self.models: Dict[str, ModelStats] = {}
+
+    def tier(self, messages: List[Dict[str, str]]) -> str:
+        """Return "strong" for long or code-heavy requests, otherwise "fast"."""
+        prompt = messages[-1]["content"] if messages else ""
+        if is_code_heavy(prompt):
+            return "strong"
+        if sum(count_tokens(message["content"]) for message in messages) > self.escalate_tokens:
+            return "strong"
+        return "fast"
+
+    def candidates(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> List[str]:
+        """Return the models to try, in order.
+
+        An explicit model is used as is. For "auto", the chosen tier's models come
+        first, healthy before failing and fastest first (untried models count as
+        fastest so they get measured), followed by the other tier as a last resort.
+        """
+        if model and model != AUTO_MODEL:
+            return [model]
+        primary, secondary = self._tiers()
+        if self.tier(messages) == "strong":
+            primary, secondary = secondary, primary
+        return self._rank(primary) + [m for m in secondary if m not in primary]
+
+    def record(self, model: str, latency: float, ok: bool):
+        """Add a request outcome to the model's rolling window."""
+        with self.lock:
+            stats = self.models.get(model)
+            if stats is None:
+                stats = self.models[model] = ModelStats(self.window)
+            stats.record(latency, ok)
+
+    def call(self, scheduler: RequestScheduler, messages: List[Dict[str, str]], request: Callable[[str], T],
+             max_tokens: int, model: Optional[str] = None, retries: Optional[int] = None) -> Tuple[str, T]:
+        """Send `request(model)` through the scheduler, falling back between candidates.
+
+        Returns the model that answered and its response.
+        """
+        candidates = self.candidates(messages, model)
+        tokens = scheduler.estimate_tokens(messages, max_tokens)
+        for position, candidate in enumerate(candidates):
+            last = position == len(candidates) - 1
+            start = time.perf_counter()
+            try:
+                with shared_tracer().span("model.call", {"model": candidate, "fallback": position}):
+                    response = scheduler.call(
+                        lambda: request(candidate), tokens, retries, give_up=None if last else is_timeout
+                    )
+            except Exception as e:
+                self.record(candidate, time.perf_counter() - start, False)
+                if last or not should_fall_back(e):
+                    raise
+                continue
+            self.record(candidate, time.perf_counter() - start, True)
+            self._record_usage(scheduler, tokens, response)
+            return candidate, response
+        raise ValueError("No models to route to")
+
+    async def acall(self, scheduler: RequestScheduler, messages: List[Dict[str, str]],
+                    request: Callable[[str], Awaitable[T]], max_tokens: int,
+                    model: Optional[str] = None, retries: Optional[int] = None) -> Tuple[str, T]:
+        """Async version of `call`."""
+        candidates = self.candidates(messages, model)
+        tokens = scheduler.estimate_tokens(messages, max_tokens)
+        for position, candidate in enumerate(candidates):
+            last = position == len(candidates) - 1
+            start = time.perf_counter()
+            try:
+                with shared_tracer().span("model.call", {"model": candidate, "fallback": position}):
+                    response = await scheduler.acall(
+                        lambda: request(candidate), tokens, retries, give_up=None if last else is_timeout
+                    )
+            except Exception as e:
+                self.record(candidate, time.perf_counter() - start, False)
+                if last or not should_fall_back(e):
+                    raise
+                continue
+            self.record(candidate, time.perf_counter() - start, True)
+            self._record_usage(scheduler, tokens, response)
+            return candidate, response
+        raise ValueError("No models to route to")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the rolling latency and error rate of every model used so far."""
+        with self.lock:
+            return {
+                model: {"requests": len(stats.samples), "latency": stats.latency,
+                        "error_rate": stats.error_rate}
+                for model, stats in self.models.items()
+            }
+
+    def _tiers(self) -> Tuple[List[str], List[str]]:
+        if not self.fast_models and not self.strong_models and self.provider is not None:
+            served = self.provider.served_models()[:1]
+            with self.lock:
+                if served and not self.fast_models:
+                    self.fast_models, self.strong_models = served, list(served)
+        fast = self.fast_models or self.strong_models
+        strong = self.strong_models or self.fast_models
+        if not fast:
+            where = f" ({self.provider.base_url}/models listed none)" if self.provider is not None else ""
+            raise ValueError(f"No model to route 'auto' to{where}; pass --model, "
+                             f"or set AI_BOT_FAST_MODELS and AI_BOT_STRONG_MODELS")
+        return fast, strong
+
+    def _rank(self, models: List[str]) -> List[str]:
+        with self.lock:
+            def score(model: str) -> Tuple[bool, float]:
+                stats = self.models.get(model)
+                if stats is None:
+                    return False, 0.0
+                return stats.error_rate > MAX_ERROR_RATE, stats.latency or 0.0
+            # sorted() is stable, so ties keep the configured order
+            return sorted(models, key=score)
+
+    def _record_usage(self, scheduler: RequestScheduler, tokens: int, response: Any):
+        # Streams report no usage; their token reservation simply stands
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            scheduler.record_usage(tokens, usage.total_tokens)
+
+
+def _model_list(value: str) -> List[str]:
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+def shared_router(provider: Optional[Provider] = None) -> ModelRouter:
+    """Return the process-wide router for a provider (OpenAI's by default), shared by all agents."""
+    key = (provider.name, provider.base_url) if provider is not None else (DEFAULT_PROVIDER, None)
+    with _lock:
+        router = _shared_routers.get(key)
+        if router is None:
+            router = _shared_routers[key] = ModelRouter(provider=provider)
+        return router
@@ -0,0 +1,235 @@
+"""
+Request scheduling for AI Bot Agent.
+Every chat completion goes through a shared scheduler that keeps client-side
+requests-per-minute and tokens-per-minute budgets and retries transient failures
+with exponential backoff, honouring `Retry-After` and the rate-limit headers.
+"""
+
+import os
+import re
+import time
+import random
+import threading
+from typing import Callable, Awaitable, Optional, List, Dict, Any, TypeVar
+
+from ai_bot_agent.context import count_tokens, MESSAGE_OVERHEAD
+from ai_bot_agent.tracing import shared_tracer
+
+DEFAULT_RETRIES = 3
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_shared_scheduler: Optional["RequestScheduler"] = None
+
+
+def retry_delay(error: Exception, attempt: int, base: float = 1.0, cap: float = 60.0) -> Optional[float]:
+    """Return how long to wait before retrying, or None if the error is not retryable."""
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        pass
+    elif isinstance(error, openai.APIStatusError):
+        if error.status_code not in RETRYABLE_STATUS:
+            return None
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), cap)
+            except ValueError:
+                pass
+    else:
+        return None
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_reset(value: str) -> Optional[float]:
+    """Parse a rate-limit reset header such as "20ms", "1s" or "6m0s" into seconds."""
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value or "")
+    if not parts:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously up to one minute's budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` from the bucket and return how long to wait before using it.
+
+        The reservation is made immediately (the bucket may go negative), so
+        concurrent callers queue up behind each other instead of all waking at once.
+        """
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            self.available -= amount
+            return max(0.0, -self.available / self.rate)
+
+    def adjust(self, amount: float):
+        """Return (positive) or take (negative) tokens after the real cost is known."""
+        with self.lock:
+            self.available = min(self.capacity, self.available + amount)
+
+
+class RequestScheduler:
+    """Shared rate limits and retry policy for chat completion requests.
+
+    Limits default to AI_BOT_RPM and AI_BOT_TPM (unset means no client-side limit)
+    and retries to AI_BOT_RETRIES. One scheduler can be shared by threads and
+    coroutines alike.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 retries: Optional[int] = None, base_delay: float = 1.0, max_delay: float = 60.0):
+        requests_per_minute = requests_per_minute or float(os.getenv("AI_BOT_RPM", 0))
+        tokens_per_minute = tokens_per_minute or float(os.getenv("AI_BOT_TPM", 0))
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.retries = retries if retries is not None else int(os.getenv("AI_BOT_RETRIES", DEFAULT_RETRIES))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        # Shared pause after a rate limit so that every caller backs off together
+        self.resume_at = 0.0
+        self.counters = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+        self.waited = 0.0
+
+    def estimate_tokens(self, messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Estimate what a request counts against the tokens-per-minute budget."""
+        if self.tokens is None:
+            return 0
+        prompt = sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages)
+        return prompt + max_tokens
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve budget for one request and return how long to wait before sending it."""
+        delays = [self.resume_at - time.monotonic()]
+        if self.requests is not None:
+            delays.append(self.requests.reserve())
+        if self.tokens is not None and tokens:
+            delays.append(self.tokens.reserve(tokens))
+        delay = max(delays)
+        with self.lock:
+            self.counters["requests"] += 1
+            if delay > 0:
+                self.waited += delay
+        return max(0.0, delay)
+
+    def record_usage(self, estimated: int, actual: Optional[int]):
+        """Correct the tokens-per-minute budget once the response reports real usage."""
+        if self.tokens is not None and estimated and actual is not None:
+            self.tokens.adjust(estimated - actual)
+
+    def backoff(self, error: Exception, attempt: int, retries: Optional[int] = None) -> Optional[float]:
+        """Return the delay before retrying a failed attempt, or None to give up."""
+        retries = self.retries if retries is None else retries
+        delay = retry_delay(error, attempt, self.base_delay, self.max_delay) if attempt < retries else None
+        with self.lock:
+            if delay is None:
+                self.counters["failures"] += 1
+                return None
+            self.counters["retries"] += 1
+            if getattr(error, "status_code", None) == 429:
+                self.counters["rate_limited"] += 1
+                delay = max(delay, self._header_delay(error) or 0.0)
+                self.resume_at = max(self.resume_at, time.monotonic() + delay)
+        return delay
+
+    def call(self, request: Callable[[], T], tokens: int = 0, retries: Optional[int] = None,
+             give_up: Optional[Callable[[Exception], bool]] = None) -> T:
+        """Run a request, waiting for the rate limits and retrying transient failures.
+
+        Errors for which `give_up` returns True are raised without retrying, e.g. so
+        that a caller with a fallback can move on straight away.
+        """
+        tracer = shared_tracer()
+        attempt = 0
+        while True:
+            delay = self.reserve(tokens)
+            if delay:
+                with tracer.span("scheduler.wait", {"reason": "rate_limit", "seconds": delay}):
+                    time.sleep(delay)
+            try:
+                with tracer.span("api.request", {"attempt": attempt}):
+                    return request()
+            except Exception as e:
+                if give_up is not None and give_up(e):
+                    raise
+                delay = self.backoff(e, attempt, retries)
+                if delay is None:
+                    raise
+                with tracer.span("scheduler.wait", {"reason": "backoff", "seconds": delay}):
+                    time.sleep(delay)
+                attempt += 1
+
+    async def acall(self, request: Callable[[], Awaitable[T]], tokens: int = 0,
+                    retries: Optional[int] = None,
+                    give_up: Optional[Callable[[Exception], bool]] = None) -> T:
+        """Async version of `call`."""
+        import asyncio  # Only async callers pay for importing it
+
+        tracer = shared_tracer()
+        attempt = 0
+        while True:
+            delay = self.reserve(tokens)
+            if delay:
+                with tracer.span("scheduler.wait", {"reason": "rate_limit", "seconds": delay}):
+                    await asyncio.sleep(delay)
+            try:
+                with tracer.span("api.request", {"attempt": attempt}):
+                    return await request()
+            except Exception as e:
+                if give_up is not None and give_up(e):
+                    raise
+                delay = self.backoff(e, attempt, retries)
+                if delay is None:
+                    raise
+                with tracer.span("scheduler.wait", {"reason": "backoff", "seconds": delay}):
+                    await asyncio.sleep(delay)
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request, retry and throttling counters."""
+        with self.lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["waited_seconds"] = round(self.waited, 3)
+        return stats
+
+    def _header_delay(self, error: Exception) -> Optional[float]:
+        # x-ratelimit-reset-* say when an exhausted budget is replenished
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+        delays = []
+        for kind in ("requests", "tokens"):
+            if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}", ""))
+                if reset is not None:
+                    delays.append(min(reset, self.max_delay))
+        return max(delays) if delays else None
+
+
+def shared_scheduler() -> RequestScheduler:
+    """Return the process-wide scheduler shared by all agents."""
+    global _shared_scheduler
+    with _lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = RequestScheduler()
+        return _shared_scheduler
@@ -0,0 +1,576 @@
+"""
+Local full-text search for AI Bot Agent.
+`ai-bot index` builds an inverted index over documents on disk and `ai-bot search` ranks
+them with BM25. The index is a set of immutable segment files, each memory-mapped when
+searched: a sorted term table for binary search and array-backed posting lists (document
+ids and term frequencies) that are scored in place. Document paths and change stamps live
+in SQLite, so re-indexing only reads new or changed files; replaced and removed documents
+are marked deleted until segments are merged.
+"""
+
+import os
+import re
+import math
+import mmap
+import heapq
+import sqlite3
+import struct
+import itertools
+import threading
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, List, Dict, Set, Any, Tuple
+
+from ai_bot_agent.cache import cache_dir
+from ai_bot_agent.analysis import expand_targets, sniff
+from ai_bot_agent.tracing import shared_tracer
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+MAX_TERM_CHARS = 64
+MAX_TERM_FREQUENCY = 0xFFFF
+SNIPPET_CHARS = 160
+# Postings buffered in memory before they are written out as a segment
+FLUSH_POSTINGS = 4_000_000
+# Segments are merged into one when there are more, or when this share of documents is deleted
+MAX_SEGMENTS = 8
+MAX_DELETED_SHARE = 0.2
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+MAGIC = b"AIBSEG1\0"
+# magic, first document id, end of the document id range, terms, term table, term text, postings
+HEADER = struct.Struct("<8sQQQQQQ")
+# offset of the term's text, offset of its postings (one extra entry marks the ends)
+ENTRY = struct.Struct("<QQ")
+
+# NumPy, used to score long posting lists when it is installed; False once found missing
+np: Any = None
+
+
+def _numpy() -> Any:
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = False
+    return np
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) <= MAX_TERM_CHARS]
+
+
+def write_segment(path: Path, base: int, end: int, lengths: array,
+                  postings: Iterable[Tuple[bytes, array, array]]) -> int:
+    """Write a segment file covering document ids `base` to `end` and return its term count.
+
+    `lengths` holds each document's token count (0 for deleted ones) and `postings`
+    yields (term, document ids, term frequencies) sorted by term, with ascending ids.
+    """
+    terms: List[bytes] = []
+    offsets = array("Q")
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        lengths.tofile(f)
+        postings_offset = f.tell()
+        for term, ids, frequencies in postings:
+            terms.append(term)
+            offsets.append(f.tell())
+            ids.tofile(f)
+            frequencies.tofile(f)
+        offsets.append(f.tell())
+        blob_offset = f.tell()
+        text_offsets = list(itertools.accumulate((len(term) for term in terms), initial=0))
+        f.write(b"".join(terms))
+        table_offset = f.tell()
+        f.write(b"".join(ENTRY.pack(text, post) for text, post in zip(text_offsets, offsets)))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, base, end, len(terms), table_offset, blob_offset, postings_offset))
+    os.replace(tmp, path)
+    return len(terms)
+
+
+class Segment:
+    """A memory-mapped segment file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.base, self.end, self.terms, self.table, self.blob, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a search index segment")
+        self._lengths: Any = None
+
+    @property
+    def lengths(self) -> Any:
+        """Token counts of the segment's documents, indexed by id minus `base`."""
+        if self._lengths is None:
+            count = self.end - self.base
+            if _numpy():
+                self._lengths = np.frombuffer(self.mm, dtype=np.uint32, count=count, offset=HEADER.size)
+            else:
+                self._lengths = memoryview(self.mm)[HEADER.size:HEADER.size + 4 * count].cast("I")
+        return self._lengths
+
+    def _entry(self, index: int) -> Tuple[int, int]:
+        return ENTRY.unpack_from(self.mm, self.table + index * ENTRY.size)
+
+    def _term(self, index: int) -> bytes:
+        start, _ = self._entry(index)
+        end, _ = self._entry(index + 1)
+        return self.mm[self.blob + start:self.blob + end]
+
+    def _span(self, index: int) -> Tuple[int, int]:
+        """Return where a term's postings start and how many documents they list."""
+        _, start = self._entry(index)
+        _, end = self._entry(index + 1)
+        return start, (end - start) // 6
+
+    def find(self, term: str) -> Optional[Tuple[int, int]]:
+        """Return the (offset, document frequency) of a term's postings, by binary search."""
+        key = term.encode("utf-8")
+        low, high = 0, self.terms
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.terms and self._term(low) == key:
+            return self._span(low)
+        return None
+
+    def postings(self, offset: int, count: int) -> Tuple[Any, Any]:
+        """Return the document ids and term frequencies stored at `offset`, without copying."""
+        if _numpy():
+            ids = np.frombuffer(self.mm, dtype=np.uint32, count=count, offset=offset)
+            frequencies = np.frombuffer(self.mm, dtype=np.uint16, count=count, offset=offset + 4 * count)
+            return ids, frequencies
+        view = memoryview(self.mm)
+        return (view[offset:offset + 4 * count].cast("I"),
+                view[offset + 4 * count:offset + 6 * count].cast("H"))
+
+    def __iter__(self) -> Iterator[Tuple[bytes, bytes, bytes]]:
+        """Yield (term, raw ids, raw frequencies) in term order, e.g. for merging."""
+        for index in range(self.terms):
+            offset, count = self._span(index)
+            yield (self._term(index), self.mm[offset:offset + 4 * count],
+                   self.mm[offset + 4 * count:offset + 6 * count])
+
+    def close(self):
+        self._lengths = None
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # Postings handed out still use the map; it is released with them
+
+
+class _SegmentBuilder:
+    """Accumulate postings for consecutive new documents in memory."""
+
+    def __init__(self, base: int):
+        self.base = base
+        self.lengths = array("I")
+        self.terms: Dict[str, Tuple[array, array]] = {}
+        self.postings = 0
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.lengths)
+
+    def add(self, tokens: List[str]) -> int:
+        """Add a document and return its id."""
+        doc_id = self.end
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, count in counts.items():
+            entry = self.terms.get(term)
+            if entry is None:
+                entry = self.terms[term] = (array("I"), array("H"))
+            entry[0].append(doc_id)
+            entry[1].append(min(count, MAX_TERM_FREQUENCY))
+        self.lengths.append(len(tokens))
+        self.postings += len(counts)
+        return doc_id
+
+    def sorted_postings(self) -> Iterator[Tuple[bytes, array, array]]:
+        for key in sorted(term.encode("utf-8") for term in self.terms):
+            ids, frequencies = self.terms[key.decode("utf-8")]
+            yield key, ids, frequencies
+
+
+class SearchIndex:
+    """On-disk BM25 index of text files, by default under XDG_CACHE_HOME (or AI_BOT_SEARCH_INDEX).
+
+    Only one process should update an index at a time; searching while it is
+    updated is safe, since segments are never modified in place.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or os.getenv("AI_BOT_SEARCH_INDEX") or cache_dir() / "search").expanduser()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path / "docs.sqlite"), check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS live_paths ON docs (path) WHERE deleted = 0;
+            CREATE TABLE IF NOT EXISTS segments (
+                name TEXT PRIMARY KEY,
+                base INTEGER NOT NULL,
+                stop INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+        self._segments: Optional[List[Segment]] = None
+
+    def update(self, targets: List[str], progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Index new and changed files under `targets` and forget removed ones.
+
+        Unchanged files (same mtime and size) are not read again. Files that
+        disappeared from an indexed directory are removed from the index.
+        """
+        result: Dict[str, Any] = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "skipped": []}
+        seen: Set[str] = set()
+        with self.lock, shared_tracer().span("search.index", {"targets": len(targets)}) as span:
+            builder = _SegmentBuilder(self._counter("next_id"))
+            pending: List[Tuple[int, str, int, int, int]] = []
+            replaced: List[int] = []
+            for path in expand_targets(targets):
+                key = str(path.resolve())
+                if key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    stat = path.stat()
+                    row = self.conn.execute(
+                        "SELECT id, mtime_ns, size FROM docs WHERE path = ? AND deleted = 0", (key,)
+                    ).fetchone()
+                    if row is not None and row[1:] == (stat.st_mtime_ns, stat.st_size):
+                        result["unchanged"] += 1
+                        continue
+                    reason = sniff(path)
+                except OSError as e:
+                    result["skipped"].append((str(path), e.strerror or str(e)))
+                    continue
+                if reason:
+                    result["skipped"].append((str(path), reason))
+                    continue
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    tokens = tokenize(f.read())
+                doc_id = builder.add(tokens)
+                pending.append((doc_id, key, stat.st_mtime_ns, stat.st_size, len(tokens)))
+                if row is not None:
+                    replaced.append(row[0])
+                    result["updated"] += 1
+                else:
+                    result["added"] += 1
+                if builder.postings >= FLUSH_POSTINGS:
+                    self._flush(builder, pending, replaced)
+                    builder, pending, replaced = _SegmentBuilder(builder.end), [], []
+                if progress is not None and len(seen) % 1000 == 0:
+                    progress(f"Indexed {len(seen)} files")
+            self._flush(builder, pending, replaced)
+
+            for target in targets:
+                root = Path(target).resolve()
+                if root.is_dir():
+                    result["removed"] += self._remove_missing(root, seen)
+            if self._needs_merge():
+                if progress is not None:
+                    progress("Merging segments")
+                self.optimize()
+            span.set_attributes({key: value for key, value in result.items() if key != "skipped"})
+        return result
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Return up to `limit` documents ranked by BM25, best first, with a matching line each."""
+        terms = tokenize(query)
+        with self.lock, shared_tracer().span("search.query", {"terms": len(terms)}) as span:
+            live = self._counter("live_docs")
+            if not terms or not live:
+                return []
+            average_length = max(self._counter("total_length") / live, 1.0)
+            segments = self.segments()
+            deleted = self._deleted_ids() if self._counter("deleted_docs") else set()
+            query_terms: Dict[str, int] = {}
+            for term in terms:
+                query_terms[term] = query_terms.get(term, 0) + 1
+
+            matches: List[Tuple[float, Segment, Any, Any]] = []
+            for term, repeats in query_terms.items():
+                found = [(segment, segment.find(term)) for segment in segments]
+                found = [(segment, position) for segment, position in found if position is not None]
+                frequency = sum(count for _, (_, count) in found)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (live - frequency + 0.5) / (frequency + 0.5)) * repeats
+                for segment, (offset, count) in found:
+                    matches.append((idf, segment, *segment.postings(offset, count)))
+
+            scorer = _top_numpy if _numpy() else _top_python
+            ranked = scorer(matches, average_length, deleted, limit)
+            span.set_attribute("hits", len(ranked))
+            if not ranked:
+                return []
+            placeholders = ",".join("?" * len(ranked))
+            paths = dict(self.conn.execute(
+                f"SELECT id, path FROM docs WHERE id IN ({placeholders})", [doc for doc, _ in ranked]
+            ).fetchall())
+        hits = []
+        for doc, score in ranked:
+            line, text = matching_line(Path(paths[doc]), set(query_terms))
+            hits.append({"path": paths[doc], "score": round(score, 4), "line": line, "snippet": text})
+        return hits
+
+    def segments(self) -> List[Segment]:
+        """Return the current segments, opening them on first use."""
+        with self.lock:
+            if self._segments is None:
+                rows = self.conn.execute("SELECT name FROM segments ORDER BY base").fetchall()
+                self._segments = [Segment(self.path / name) for name, in rows]
+            return self._segments
+
+    def optimize(self):
+        """Merge all segments into one and drop deleted documents for good."""
+        with self.lock, shared_tracer().span("search.merge") as span:
+            segments = self.segments()
+            if not segments:
+                return
+            deleted = self._deleted_ids()
+            base, end = segments[0].base, max(segment.end for segment in segments)
+            lengths = array("I", bytes(4 * (end - base)))
+            for segment in segments:
+                lengths[segment.base - base:segment.end - base] = array("I", segment.mm[
+                    HEADER.size:HEADER.size + 4 * (segment.end - segment.base)])
+            for doc in deleted:
+                if base <= doc < end:
+                    lengths[doc - base] = 0
+
+            def merged() -> Iterator[Tuple[bytes, array, array]]:
+                # heapq.merge is stable, so each term's postings stay in id order
+                entries = heapq.merge(*segments, key=lambda entry: entry[0])
+                for term, group in itertools.groupby(entries, key=lambda entry: entry[0]):
+                    ids, frequencies = array("I"), array("H")
+                    for _, raw_ids, raw_frequencies in group:
+                        if not deleted:
+                            ids.frombytes(raw_ids)
+                            frequencies.frombytes(raw_frequencies)
+                            continue
+                        segment_ids, segment_frequencies = array("I", raw_ids), array("H", raw_frequencies)
+                        for doc, frequency in zip(segment_ids, segment_frequencies):
+                            if doc not in deleted:
+                                ids.append(doc)
+                                frequencies.append(frequency)
+                    if ids:
+                        yield term, ids, frequencies
+
+            name = f"segment-{base}-{end}.idx"
+            terms = write_segment(self.path / name, base, end, lengths, merged())
+            with self.conn:
+                self.conn.execute("DELETE FROM segments")
+                self.conn.execute("INSERT INTO segments (name, base, stop) VALUES (?, ?, ?)",
+                                  (name, base, end))
+                self.conn.execute("DELETE FROM docs WHERE deleted = 1")
+                self._set_counter("deleted_docs", 0)
+            self._close_segments()
+            for segment in segments:
+                if segment.path.name != name:
+                    segment.path.unlink()
+            span.set_attributes({"segments": len(segments), "terms": terms, "purged": len(deleted)})
+
+    def stats(self) -> Dict[str, Any]:
+        """Return document, segment and size counts."""
+        with self.lock:
+            segments = self.segments()
+            return {
+                "documents": self._counter("live_docs"),
+                "deleted": self._counter("deleted_docs"),
+                "segments": len(segments),
+                "terms": sum(segment.terms for segment in segments),
+                "index_bytes": sum(p.stat().st_size for p in self.path.iterdir() if p.is_file()),
+                "path": str(self.path),
+            }
+
+    def clear(self) -> int:
+        """Remove every document from the index and return how many there were."""
+        with self.lock:
+            removed = self._counter("live_docs")
+            segments = self.segments()
+            with self.conn:
+                self.conn.execute("DELETE FROM docs")
+                self.conn.execute("DELETE FROM segments")
+                self.conn.execute("DELETE FROM counters WHERE name != 'next_id'")
+            self._close_segments()
+            for segment in segments:
+                segment.path.unlink()
+            return removed
+
+    def close(self):
+        """Close the segments and the database connection."""
+        with self.lock:
+            self._close_segments()
+            self.conn.close()
+
+    def _flush(self, builder: _SegmentBuilder, pending: List[Tuple[int, str, int, int, int]],
+               replaced: List[int]):
+        """Write buffered documents as a new segment and record them, replacing older versions."""
+        if not pending:
+            return
+        name = f"segment-{builder.base}-{builder.end}.idx"
+        write_segment(self.path / name, builder.base, builder.end, builder.lengths, builder.sorted_postings())
+        with self.conn:
+            self._delete(replaced)
+            self.conn.executemany(
+                "INSERT INTO docs (id, path, mtime_ns, size, length) VALUES (?, ?, ?, ?, ?)", pending
+            )
+            self.conn.execute("INSERT INTO segments (name, base, stop) VALUES (?, ?, ?)",
+                              (name, builder.base, builder.end))
+            self._add_counter("live_docs", len(pending))
+            self._add_counter("total_length", sum(row[4] for row in pending))
+            self._set_counter("next_id", builder.end)
+        self._close_segments()
+
+    def _remove_missing(self, root: Path, seen: Set[str]) -> int:
+        """Delete documents under a directory that were not found while indexing it."""
+        prefix = str(root).rstrip(os.sep) + os.sep
+        # Every path starting with the prefix sorts between it and the prefix with its last character bumped
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = self.conn.execute(
+            "SELECT id, path FROM docs WHERE deleted = 0 AND path >= ? AND path < ?", (prefix, upper)
+        ).fetchall()
+        missing = [doc for doc, path in rows if path not in seen]
+        with self.conn:
+            self._delete(missing)
+        return len(missing)
+
+    def _delete(self, ids: List[int]):
+        """Mark documents deleted; call inside a transaction."""
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            length = self.conn.execute(
+                f"SELECT COALESCE(SUM(length), 0) FROM docs WHERE id IN ({placeholders})", batch
+            ).fetchone()[0]
+            self.conn.execute(f"UPDATE docs SET deleted = 1 WHERE id IN ({placeholders})", batch)
+            self._add_counter("live_docs", -len(batch))
+            self._add_counter("total_length", -length)
+            self._add_counter("deleted_docs", len(batch))
+
+    def _needs_merge(self) -> bool:
+        segments = self.conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        deleted = self._counter("deleted_docs")
+        return segments > MAX_SEGMENTS or deleted > MAX_DELETED_SHARE * (deleted + self._counter("live_docs"))
+
+    def _deleted_ids(self) -> Set[int]:
+        return {doc for doc, in self.conn.execute("SELECT id FROM docs WHERE deleted = 1")}
+
+    def _counter(self, name: str) -> int:
+        row = self.conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_counter(self, name: str, value: int):
+        self.conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (name, value))
+
+    def _add_counter(self, name: str, delta: int):
+        self.conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, delta)
+        )
+
+    def _close_segments(self):
+        for segment in self._segments or []:
+            segment.close()
+        self._segments = None
+
+
+def _top_python(matches: List[Tuple[float, Segment, Any, Any]], average_length: float,
+                deleted: Set[int], limit: int) -> List[Tuple[int, float]]:
+    scores: Dict[int, float] = {}
+    norm, scale = K1 * (1 - B), K1 * B / average_length
+    for idf, segment, ids, frequencies in matches:
+        lengths, base = segment.lengths, segment.base
+        for doc, frequency in zip(ids, frequencies):
+            score = idf * frequency * (K1 + 1) / (frequency + norm + scale * lengths[doc - base])
+            scores[doc] = scores.get(doc, 0.0) + score
+    # Equal scores are ranked by document id, as in _top_numpy
+    return heapq.nlargest(limit, ((doc, score) for doc, score in scores.items() if doc not in deleted),
+                          key=lambda item: (item[1], -item[0]))
+
+
+def _top_numpy(matches: List[Tuple[float, Segment, Any, Any]], average_length: float,
+               deleted: Set[int], limit: int) -> List[Tuple[int, float]]:
+    if not matches:
+        return []
+    all_ids, all_scores = [], []
+    norm, scale = K1 * (1 - B), K1 * B / average_length
+    for idf, segment, ids, frequencies in matches:
+        frequencies = frequencies.astype(np.float64)
+        lengths = segment.lengths[ids - segment.base]
+        all_ids.append(ids)
+        all_scores.append(idf * frequencies * (K1 + 1) / (frequencies + norm + scale * lengths))
+    ids, scores = np.concatenate(all_ids), np.concatenate(all_scores)
+    if len(matches) > 1:
+        # A document matching several terms has one score per term; add them up
+        ids, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=scores)
+    if deleted:
+        keep = ~np.isin(ids, np.fromiter(deleted, dtype=np.uint32, count=len(deleted)))
+        ids, scores = ids[keep], scores[keep]
+    if len(ids) > limit:
+        # Keep every document tied with the last place, so ties are broken by id below
+        keep = scores >= np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))[:limit]
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def matching_line(path: Path, terms: Set[str]) -> Tuple[int, str]:
+    """Return the number and text of the first line containing the most of `terms`, or (0, "")."""
+    best, best_count = (0, ""), 0
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, 1):
+                count = len(terms.intersection(tokenize(line)))
+                if count > best_count:
+                    best, best_count = (number, line.strip()[:SNIPPET_CHARS]), count
+                    if count == len(terms):
+                        break
+    except OSError:
+        pass
+    return best
+
+
+def excerpt(path: Path, line: int, context: int = 3, max_chars: int = 800) -> str:
+    """Return the lines around `line` (1-based), e.g. to show a search hit to the model."""
+    lines: List[str] = []
+    first = max(1, line - context)
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for text in itertools.islice(f, first - 1, line + context):
+                lines.append(text.rstrip("\n"))
+    except OSError:
+        return ""
+    text = "\n".join(lines)
+    return text if len(text) <= max_chars else text[:max_chars] + "…"
@@ -0,0 +1,323 @@
+"""
+Semantic response cache for AI Bot Agent.
+Questions are embedded and kept in a memory-mapped NumPy index under XDG_CACHE_HOME,
+with their answers in SQLite; a new question close enough (by cosine similarity) to
+an earlier one in the same context is answered from the cache. Requires NumPy
+(pip install 'ai-bot-agent[semantic]').
+"""
+
+import os
+import re
+import time
+import zlib
+import sqlite3
+import importlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, List, Dict, Any, Sequence
+
+from ai_bot_agent.cache import cache_dir, DEFAULT_TTL
+from ai_bot_agent.providers import Provider
+from ai_bot_agent.tracing import shared_tracer
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+HASH_DIMENSIONS = 1024
+# Recent question embeddings, so a miss followed by storing the answer embeds once
+EMBEDDING_MEMO_SIZE = 64
+
+# Turns texts into one embedding each; any callable with this shape can be plugged in
+Embedder = Callable[[List[str]], Sequence[Sequence[float]]]
+
+# NumPy, imported when the first semantic cache is created
+np: Any = None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("The semantic cache needs NumPy (pip install 'ai-bot-agent[semantic]')")
+        np = numpy
+
+
+class OpenAIEmbedder:
+    """Embed with the provider's OpenAI-compatible /embeddings endpoint."""
+
+    def __init__(self, provider: Provider, model: Optional[str] = None):
+        self.provider = provider
+        self.model = model or DEFAULT_EMBEDDING_MODEL
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        from ai_bot_agent.transport import shared_openai_client
+
+        if not self.provider.api_key:
+            raise RuntimeError("OPENAI_API_KEY is needed for OpenAI embeddings")
+        client = shared_openai_client(api_key=self.provider.api_key, base_url=self.provider.base_url)
+        response = client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in response.data]
+
+
+class HashingEmbedder:
+    """Offline embedder hashing words and character trigrams into a fixed-size vector.
+
+    It only sees surface similarity (shared words and spellings), not meaning, but
+    needs no model or network; use it with a lower threshold, e.g. 0.8.
+    """
+
+    def __init__(self, dimensions: int = HASH_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                padded = f" {word} "
+                features = [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+                for feature in features:
+                    digest = zlib.crc32(feature.encode("utf-8"))
+                    vector[digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+            vectors.append(vector)
+        return vectors
+
+
+def embedder_from_spec(spec: str, provider: Provider) -> Embedder:
+    """Build an embedder from "openai", "openai:<model>", "hash" or "<module>:<callable>"."""
+    kind, _, argument = spec.strip().partition(":")
+    if kind in ("", "openai"):
+        return OpenAIEmbedder(provider, argument or None)
+    if kind == "hash" and not argument:
+        return HashingEmbedder()
+    if not argument:
+        raise ValueError(f"Unknown embedder '{spec}'. "
+                         "Use openai, openai:<model>, hash or <module>:<callable>.")
+    try:
+        return getattr(importlib.import_module(kind), argument)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"Cannot load embedder '{spec}': {e}")
+
+
+def default_embedder(provider: Provider) -> Embedder:
+    """Return the embedder chosen by AI_BOT_SEMANTIC_EMBEDDER (the provider's embeddings by default)."""
+    return embedder_from_spec(os.getenv("AI_BOT_SEMANTIC_EMBEDDER", "openai"), provider)
+
+
+class SemanticCache:
+    """Answers indexed by question embedding, with TTL and least-recently-used eviction.
+
+    Vectors live in a fixed-size memory-mapped array (one row per entry, so the
+    index never grows past `max_entries`); SQLite maps rows to their scope,
+    question and answer. Only questions with the same scope, i.e. the same model,
+    system prompt, history and sampling parameters, are compared. Changing the
+    embedder to one with a different vector size empties the index.
+    """
+
+    def __init__(self, embedder: Embedder, path: Optional[Path] = None, threshold: Optional[float] = None,
+                 max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        _load_numpy()
+        self.embedder = embedder
+        self.path = Path(path) if path else cache_dir() / "semantic"
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("AI_BOT_SEMANTIC_THRESHOLD", DEFAULT_THRESHOLD)
+        )
+        self.max_entries = max_entries or int(os.getenv("AI_BOT_SEMANTIC_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.ttl = ttl if ttl is not None else float(os.getenv("AI_BOT_CACHE_TTL", DEFAULT_TTL))
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path / "index.sqlite"), check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                slot INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_scope ON entries (scope);
+            CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+        self.vectors: Optional[Any] = None  # Mapped on first use, once the embedding size is known
+        self._memo: "OrderedDict[str, Any]" = OrderedDict()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / "vectors.npy"
+
+    def get(self, scope: str, prompt: str) -> Optional[str]:
+        """Return the answer to the most similar earlier question in `scope`, if similar enough."""
+        now = time.time()
+        candidates = "SELECT slot, response FROM entries WHERE scope = ? AND created_at >= ?"
+        params = (scope, now - self.ttl)
+        with self.lock:
+            if self.conn.execute(candidates + " LIMIT 1", params).fetchone() is None:
+                self._count("misses")
+                return None  # Nothing to compare with, so skip the embedding
+        query = self._embed(prompt)  # Possibly a network call, so made without holding the lock
+        with self.lock:
+            rows = self.conn.execute(candidates, params).fetchall()
+            if not rows or not self._open(len(query)):
+                self._count("misses")
+                return None
+            slots = np.fromiter((slot for slot, _ in rows), dtype=np.int64, count=len(rows))
+            scores = self.vectors[slots] @ query
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            shared_tracer().current_span().set_attribute("similarity", similarity)
+            if similarity < self.threshold:
+                self._count("misses")
+                return None
+            slot, response = rows[best]
+            with self.conn:
+                self.conn.execute("UPDATE entries SET accessed_at = ? WHERE slot = ?", (now, slot))
+            self._count("hits")
+            return response
+
+    def put(self, scope: str, prompt: str, response: str):
+        """Index a question's answer, replacing the least recently used entry when full."""
+        query = self._embed(prompt)
+        with self.lock:
+            self._open(len(query))
+            now = time.time()
+            with self.conn:
+                row = self.conn.execute(
+                    "SELECT slot FROM entries WHERE scope = ? AND prompt = ?", (scope, prompt)
+                ).fetchone()
+                slot = row[0] if row is not None else self._free_slot()
+                # The vector is in place before the row that makes it visible is committed
+                self.vectors[slot] = query
+                self.vectors.flush()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries (slot, scope, prompt, response, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (slot, scope, prompt, response, now, now),
+                )
+
+    def prune(self) -> int:
+        """Remove expired entries; their rows in the index are reused by later answers."""
+        with self.lock:
+            with self.conn:
+                return self.conn.execute(
+                    "DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+
+    def clear(self) -> int:
+        """Remove every entry."""
+        with self.lock:
+            with self.conn:
+                return self.conn.execute("DELETE FROM entries").rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count, index size, evictions and hit statistics."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            counters = dict(self.conn.execute("SELECT name, value FROM counters"))
+            hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+            return {
+                "path": str(self.path),
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "dimensions": self._stored_shape()[1],
+                "index_bytes": self.vectors_path.stat().st_size if self.vectors_path.exists() else 0,
+                "threshold": self.threshold,
+                "evictions": counters.get("evictions", 0),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+
+    def close(self):
+        """Close the database connection and unmap the index."""
+        self.conn.close()
+        self.vectors = None
+
+    def _embed(self, text: str) -> Any:
+        """Return the unit-length embedding of a text, reusing recent ones."""
+        with self.lock:
+            if text in self._memo:
+                self._memo.move_to_end(text)
+                return self._memo[text]
+        vector = np.asarray(self.embedder([text])[0], dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm  # Dot products of unit vectors are cosine similarities
+        with self.lock:
+            self._memo[text] = vector
+            if len(self._memo) > EMBEDDING_MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return vector
+
+    def _open(self, dimensions: int) -> bool:
+        """Map the vector file, creating it if needed; return False if existing entries were dropped."""
+        shape = (self.max_entries, dimensions)
+        if self.vectors is not None and self.vectors.shape == shape:
+            return True
+        stored = self._stored_shape()
+        if stored == shape:
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            return True
+        if stored[1] == dimensions:
+            # The size limit changed: keep the rows that still fit
+            old = np.load(self.vectors_path, mmap_mode="r")
+            resized = np.lib.format.open_memmap(str(self.vectors_path) + ".tmp", mode="w+",
+                                                dtype=np.float32, shape=shape)
+            kept = min(len(old), self.max_entries)
+            resized[:kept] = old[:kept]
+            resized.flush()
+            del old, resized
+            os.replace(str(self.vectors_path) + ".tmp", self.vectors_path)
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE slot >= ?", (self.max_entries,))
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            return True
+        # New index, or a different embedder whose vectors cannot be compared with the old ones
+        self.vectors = np.lib.format.open_memmap(str(self.vectors_path), mode="w+", dtype=np.float32,
+                                                 shape=shape)
+        with self.conn:
+            dropped = self.conn.execute("DELETE FROM entries").rowcount
+        return dropped == 0
+
+    def _stored_shape(self):
+        """Return (rows, dimensions) of the vector file, or (0, 0) if there is none."""
+        if self.vectors is not None:
+            return self.vectors.shape
+        try:
+            return np.load(self.vectors_path, mmap_mode="r").shape
+        except (OSError, ValueError):
+            return (0, 0)
+
+    def _free_slot(self) -> int:
+        """Return an unused row of the index, evicting the least recently used entry if there is none."""
+        count, highest = self.conn.execute("SELECT COUNT(*), MAX(slot) FROM entries").fetchone()
+        if count < self.max_entries:
+            if highest is None or highest + 1 < self.max_entries:
+                return 0 if highest is None else highest + 1
+            used = {slot for (slot,) in self.conn.execute("SELECT slot FROM entries")}
+            return next(slot for slot in range(self.max_entries) if slot not in used)
+        slot = self.conn.execute("SELECT slot FROM entries ORDER BY accessed_at LIMIT 1").fetchone()[0]
+        self.conn.execute("DELETE FROM entries WHERE slot = ?", (slot,))
+        self.conn.execute(
+            "INSERT INTO counters (name, value) VALUES ('evictions', 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1"
+        )
+        return slot
+
+    def _count(self, name: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,),
+            )
@@ -0,0 +1,84 @@
+"""
+Persistent conversation sessions for AI Bot Agent.
+Each session is an append-only JSONL log with a fixed-width offset index, so the
+most recent messages can be loaded without parsing the whole history.
+"""
+
+import os
+import re
+import json
+import struct
+from pathlib import Path
+from typing import Optional, List, Dict
+
+DEFAULT_TAIL = 50
+
+_OFFSET = struct.Struct("<Q")
+_VALID_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def data_dir() -> Path:
+    """Return the directory used for AI Bot Agent data."""
+    base = os.getenv("XDG_DATA_HOME") or os.path.join(Path.home(), ".local", "share")
+    return Path(base) / "ai-bot"
+
+
+class Session:
+    """A named conversation stored as `<name>.jsonl` plus an offset index `<name>.idx`."""
+
+    def __init__(self, name: str, directory: Path):
+        if not _VALID_NAME.match(name) or name in (".", ".."):
+            raise ValueError(f"Invalid session name '{name}'. Use letters, digits, '.', '_' and '-'.")
+        self.name = name
+        self.log_path = directory / f"{name}.jsonl"
+        self.index_path = directory / f"{name}.idx"
+
+    def __len__(self) -> int:
+        if not self.index_path.exists():
+            return 0
+        return self.index_path.stat().st_size // _OFFSET.size
+
+    def append(self, message: Dict[str, str]):
+        """Append a message to the log and record its offset in the index."""
+        line = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        with open(self.log_path, "ab") as log:
+            offset = log.tell()
+            log.write(line)
+        with open(self.index_path, "ab") as index:
+            index.write(_OFFSET.pack(offset))
+
+    def tail(self, count: int = DEFAULT_TAIL) -> List[Dict[str, str]]:
+        """Return the last `count` messages, reading only that part of the log."""
+        total = len(self)
+        if total == 0 or count <= 0:
+            return []
+        first = max(total - count, 0)
+        with open(self.index_path, "rb") as index:
+            index.seek(first * _OFFSET.size)
+            (offset,) = _OFFSET.unpack(index.read(_OFFSET.size))
+        with open(self.log_path, "rb") as log:
+            log.seek(offset)
+            lines = log.read().splitlines()
+        return [json.loads(line) for line in lines[: total - first]]
+
+    def clear(self):
+        """Remove every message from the session."""
+        for path in (self.log_path, self.index_path):
+            if path.exists():
+                path.unlink()
+
+
+class SessionStore:
+    """Directory of named sessions."""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory) if directory else data_dir() / "sessions"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, name: str) -> Session:
+        """Return the session with the given name, creating it on first append."""
+        return Session(name, self.directory)
+
+    def names(self) -> List[str]:
+        """Return the names of all stored sessions."""
+        return sorted(path.stem for path in self.directory.glob("*.jsonl"))
@@ -0,0 +1,143 @@
+"""
+Request coalescing for AI Bot Agent.
+When several threads make the same request at the same time, only the first one
+(the leader) reaches the API; the others wait for its result, or replay its stream
+as it arrives, instead of paying for and queueing behind duplicate calls.
+"""
+
+import os
+import threading
+from typing import Callable, Hashable, Iterator, Optional, List, Dict, Any, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_shared_singleflight: Optional["SingleFlight"] = None
+
+
+class _Call:
+    """One in-flight request and everything its leader has produced so far."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.items: List[Any] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one request per key at a time and share it with concurrent callers.
+
+    Keys are any hashable values identifying equivalent requests; a request made
+    after the previous one with the same key has finished runs again.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv("AI_BOT_COALESCE", "on").lower() not in ("0", "off", "false", "no")
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, request: Callable[[], T]) -> Tuple[T, bool]:
+        """Return the result of `request`, and whether it was shared from another caller's call."""
+        call, leader = self._join(key)
+        if not leader:
+            with call.condition:
+                call.condition.wait_for(lambda: call.done)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = request()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result, False
+
+    def stream(self, key: Hashable, request: Callable[[], Iterator[T]]) -> Tuple[Iterator[T], bool]:
+        """Return the items of `request()` as they arrive, and whether they are replayed from another caller.
+
+        The leader's iteration drives the request: followers see every item it has
+        received so far, then each new one, and its error if it fails. If the
+        leader stops iterating early, followers get an error instead of the rest.
+        """
+        call, leader = self._join(key)
+        if leader:
+            return self._lead(key, call, request), False
+        return self._follow(call), True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many requests were made and how many callers shared one instead."""
+        with self.lock:
+            total = self.leaders + self.coalesced
+            return {
+                "requests": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self.calls),
+                "coalesced_rate": self.coalesced / total if total else 0.0,
+            }
+
+    def _join(self, key: Hashable) -> Tuple[_Call, bool]:
+        with self.lock:
+            call = self.calls.get(key) if self.enabled else None
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            if self.enabled:
+                self.calls[key] = call
+            self.leaders += 1
+            return call, True
+
+    def _finish(self, key: Hashable, call: _Call):
+        with self.lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+        with call.condition:
+            call.done = True
+            call.condition.notify_all()
+
+    def _lead(self, key: Hashable, call: _Call, request: Callable[[], Iterator[T]]) -> Iterator[T]:
+        try:
+            for item in request():
+                with call.condition:
+                    call.items.append(item)  # Kept for followers that join later
+                    call.condition.notify_all()
+                yield item
+        except GeneratorExit:
+            call.error = RuntimeError("The shared request was abandoned before it finished")
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def _follow(self, call: _Call) -> Iterator[T]:
+        position = 0
+        while True:
+            with call.condition:
+                call.condition.wait_for(lambda: position < len(call.items) or call.done)
+                available = call.items[position:]
+                done = call.done
+            position += len(available)
+            yield from available
+            if done and position >= len(call.items):
+                if call.error is not None:
+                    raise call.error
+                return
+
+
+def shared_singleflight() -> SingleFlight:
+    """Return the process-wide coalescing layer shared by all agents."""
+    global _shared_singleflight
+    with _lock:
+        if _shared_singleflight is None:
+            _shared_singleflight = SingleFlight()
+        return _shared_singleflight
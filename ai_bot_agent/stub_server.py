@@ -0,0 +1,196 @@
+"""
+Deterministic OpenAI-compatible stub server for AI Bot Agent.
+Answers /v1/chat/completions (plain and streamed) with text derived from the prompt,
+after a configurable time to first token and at a configurable token rate, so load
+tests and benchmarks measure the client rather than a remote model.
+"""
+
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, List, Dict, Any
+
+from ai_bot_agent.providers import STUB_PORT
+
+DEFAULT_LATENCY = 0.2
+DEFAULT_TOKENS_PER_SECOND = 100.0
+DEFAULT_RESPONSE_TOKENS = 64
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog while stub models answer every prompt with "
+    "deterministic text so that benchmarks compare like with like across runs and machines"
+).split()
+
+
+def stub_response(messages: List[Dict[str, Any]], tokens: int, choice: int = 0) -> List[str]:
+    """Return the words the stub answers a conversation with; the same input gives the same words."""
+    digest = hashlib.sha256(json.dumps([messages, choice], sort_keys=True).encode("utf-8")).digest()
+    words = []
+    while len(words) < tokens:
+        words.extend(WORDS[byte % len(WORDS)] for byte in digest)
+        digest = hashlib.sha256(digest).digest()
+    return [word if i == 0 else " " + word for i, word in enumerate(words[:tokens])]
+
+
+class StubServer:
+    """OpenAI-compatible HTTP server with simulated latency, token rate and errors.
+
+    `latency` is the time to first token in seconds, `tokens_per_second` the rate at
+    which the rest of the answer is produced, and `error_rate` the fraction of
+    requests answered with a 429 or 500 (drawn from a generator seeded with `seed`).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = STUB_PORT, latency: float = DEFAULT_LATENCY,
+                 tokens_per_second: float = DEFAULT_TOKENS_PER_SECOND,
+                 response_tokens: int = DEFAULT_RESPONSE_TOKENS, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def serve_forever(self):
+        """Serve requests in the current thread until interrupted."""
+        self.httpd.serve_forever()
+
+    def start(self) -> "StubServer":
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def next_failure(self) -> Optional[int]:
+        """Count a request and return the error status to answer it with, if any."""
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.random.choice((429, 500))
+        return None
+
+
+def _handler(server: StubServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; without this, Nagle's algorithm
+        # and delayed ACKs add ~40 ms to every response
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: Any):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/v1/models":
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            model = {"id": "stub", "object": "model", "owned_by": "stub"}
+            self._send_json(200, {"object": "list", "data": [model]})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            try:
+                request = json.loads(body)
+                messages = request["messages"]
+            except (ValueError, KeyError):
+                self._send_json(400, {"error": {"message": "Expected a JSON body with messages"}})
+                return
+
+            status = server.next_failure()
+            if status is not None:
+                headers = {"Retry-After": "0.1"} if status == 429 else {}
+                self._send_json(status, {"error": {"message": "Simulated failure", "type": "stub"}}, headers)
+                return
+
+            tokens = min(server.response_tokens, request.get("max_tokens") or server.response_tokens)
+            choices = [stub_response(messages, tokens, i) for i in range(request.get("n") or 1)]
+            prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 1 for m in messages)
+            completion = {
+                "id": f"chatcmpl-stub-{server.requests}",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+            }
+            time.sleep(server.latency)
+            if request.get("stream"):
+                self._stream(completion, choices)
+                return
+            time.sleep(max(0, tokens - 1) / server.tokens_per_second)
+            completion.update(
+                object="chat.completion",
+                choices=[
+                    {"index": i, "message": {"role": "assistant", "content": "".join(words)},
+                     "finish_reason": "stop"}
+                    for i, words in enumerate(choices)
+                ],
+                usage={
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": tokens * len(choices),
+                    "total_tokens": prompt_tokens + tokens * len(choices),
+                },
+            )
+            self._send_json(200, completion)
+
+        def _stream(self, completion: Dict[str, Any], choices: List[List[str]]):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            completion["object"] = "chat.completion.chunk"
+            for position in range(len(choices[0])):
+                if position:
+                    time.sleep(1 / server.tokens_per_second)
+                deltas = [
+                    {"index": i, "delta": {"content": words[position]}, "finish_reason": None}
+                    for i, words in enumerate(choices)
+                ]
+                self._write_event(dict(completion, choices=deltas))
+            done = [{"index": i, "delta": {}, "finish_reason": "stop"} for i in range(len(choices))]
+            self._write_event(dict(completion, choices=done))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _write_event(self, payload: Dict[str, Any]):
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
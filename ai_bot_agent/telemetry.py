@@ -0,0 +1,303 @@
+"""
+Request telemetry for AI Bot Agent.
+Every request appends one JSON line (model, tokens, latency, retries, cache hit) to a
+size-capped metrics file under XDG_CACHE_HOME; `ai-bot stats` summarizes it per model.
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, List, Dict, Any, Tuple
+
+from ai_bot_agent.cache import cache_dir
+from ai_bot_agent.tracing import shared_tracer
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+# Generous upper bound on one record's line, used to read only the end of the log
+RECORD_BYTES = 512
+QUANTILES = (0.5, 0.95, 0.99)
+
+# USD per million tokens as (prompt, completion); override or extend with AI_BOT_PRICES
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+}
+
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+_lock = threading.Lock()
+_shared_telemetry: Optional["TelemetryLog"] = None
+
+
+def parse_window(value: str) -> Optional[float]:
+    """Parse a time window such as "90s", "30m", "24h" or "7d" into seconds; "all" gives None."""
+    value = value.strip().lower()
+    if value == "all":
+        return None
+    try:
+        amount, unit = float(value[:-1]), WINDOW_UNITS[value[-1]]
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f"Invalid time window '{value}'. Use e.g. 30m, 24h, 7d or all.")
+    return amount * unit
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Return the q-th quantile of sorted values, interpolating between neighbours."""
+    if not ordered:
+        return 0.0
+    position = q * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def model_prices() -> Dict[str, Tuple[float, float]]:
+    """Return per-model prices, with AI_BOT_PRICES (JSON: {"model": [prompt, completion]}) applied."""
+    prices = dict(DEFAULT_PRICES)
+    override = os.getenv("AI_BOT_PRICES")
+    if override:
+        try:
+            prices.update({model: (float(p), float(c)) for model, (p, c) in json.loads(override).items()})
+        except (ValueError, TypeError, AttributeError):
+            raise ValueError('AI_BOT_PRICES must be JSON like {"model": [prompt_usd, completion_usd]} '
+                             'per 1M tokens')
+    return prices
+
+
+def request_cost(model: str, prompt_tokens: int, completion_tokens: int,
+                 prices: Dict[str, Tuple[float, float]]) -> Optional[float]:
+    """Return the cost of a request in USD, or None for models without a known price.
+
+    Dated snapshots ("gpt-4o-2024-08-06") are priced like the longest matching name.
+    """
+    for name in sorted(prices, key=len, reverse=True):
+        if model == name or model.startswith(name + "-"):
+            prompt_price, completion_price = prices[name]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return None
+
+
+class AttemptCounter:
+    """Wrap a per-model request function and count its calls (first try, retries and fallbacks)."""
+
+    def __init__(self, request: Callable[[str], Any]):
+        self.request = request
+        self.count = 0
+
+    def __call__(self, model: str, **options: Any) -> Any:
+        self.count += 1
+        return self.request(model, **options)
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.count - 1)
+
+
+class TelemetryLog:
+    """Append-only JSONL metrics file, rotated to `<name>.1` when it outgrows `max_bytes`.
+
+    The location defaults to AI_BOT_TELEMETRY_FILE and the size cap to
+    AI_BOT_TELEMETRY_MAX_BYTES; AI_BOT_TELEMETRY=off disables recording. Write
+    failures are ignored so telemetry never breaks a request.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        self.path = Path(path or os.getenv("AI_BOT_TELEMETRY_FILE") or cache_dir() / "telemetry.jsonl")
+        self.max_bytes = max_bytes or int(os.getenv("AI_BOT_TELEMETRY_MAX_BYTES", DEFAULT_MAX_BYTES))
+        if enabled is None:
+            enabled = os.getenv("AI_BOT_TELEMETRY", "on").lower() not in ("0", "off", "false", "no")
+        self.enabled = enabled
+        self.lock = threading.Lock()
+
+    @property
+    def backup_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".1")
+
+    def record(self, stats: Dict[str, Any], error: bool = False):
+        """Append one request's stats (as returned by `request_stats`) and attach them to the current span."""
+        span = shared_tracer().current_span()
+        span.set_attributes(stats)
+        if error:
+            span.set_attribute("error", True)
+        if not self.enabled:
+            return
+        entry = {"time": round(time.time(), 3)}
+        for key, value in stats.items():
+            entry[key] = round(value, 4) if isinstance(value, float) else value
+        if error:
+            entry["error"] = True
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    size = f.tell()
+                if size > self.max_bytes:
+                    os.replace(self.path, self.backup_path)
+            except OSError:
+                pass
+
+    def read(self, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Yield recorded requests, oldest first, optionally only those after `since` (epoch seconds)."""
+        for path in (self.backup_path, self.path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # A line cut short by a crash or a concurrent rotation
+                        if since is None or entry.get("time", 0) >= since:
+                            yield entry
+            except FileNotFoundError:
+                continue
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to the last `limit` recorded requests, oldest first, reading only the end of the log."""
+        entries: List[Dict[str, Any]] = []
+        for path in (self.path, self.backup_path):
+            try:
+                with open(path, "rb") as f:
+                    size = f.seek(0, os.SEEK_END)
+                    f.seek(max(0, size - (limit - len(entries)) * RECORD_BYTES))
+                    lines = f.read().splitlines()
+            except FileNotFoundError:
+                continue
+            older = []
+            for line in lines:
+                try:
+                    older.append(json.loads(line))
+                except ValueError:
+                    continue  # The first line may start mid-record
+            entries = older + entries
+            if len(entries) >= limit:
+                break
+        return entries[-limit:] if limit > 0 else []
+
+    def summary(self, window: Optional[float] = None,
+                model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Summarize the requests of the last `window` seconds (all of them for None) per model."""
+        since = time.time() - window if window is not None else None
+        records = (entry for entry in self.read(since) if model is None or entry.get("model") == model)
+        return summarize(records, model_prices())
+
+    def clear(self) -> int:
+        """Delete all recorded requests and return how many there were."""
+        with self.lock:
+            removed = sum(1 for _ in self.read())
+            for path in (self.path, self.backup_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            return removed
+
+
+def summarize(records: Iterable[Dict[str, Any]],
+              prices: Dict[str, Tuple[float, float]]) -> Dict[str, Dict[str, Any]]:
+    """Aggregate telemetry records into per-model request counts, latency quantiles, throughput and cost.
+
+    Latency quantiles and throughput only cover requests that reached the API themselves
+    (not answered from the cache or by another caller's identical call) and succeeded.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in records:
+        groups.setdefault(entry.get("model") or "unknown", []).append(entry)
+
+    summaries = {}
+    for model, entries in sorted(groups.items()):
+        served = [e for e in entries
+                  if not e.get("error") and not e.get("cache_hit") and not e.get("coalesced")]
+        latencies = sorted(e.get("total_time", 0.0) for e in served)
+        first_tokens = sorted(e.get("time_to_first_token", 0.0) for e in served)
+        prompt_tokens = sum(e.get("prompt_tokens", 0) for e in entries)
+        completion_tokens = sum(e.get("completion_tokens", 0) for e in entries)
+        served_time = sum(latencies)
+        cost = request_cost(model, prompt_tokens, completion_tokens, prices)
+        summaries[model] = {
+            "requests": len(entries),
+            "errors": sum(1 for e in entries if e.get("error")),
+            "cache_hits": sum(1 for e in entries if e.get("cache_hit")),
+            "coalesced": sum(1 for e in entries if e.get("coalesced")),
+            "hedged": sum(1 for e in entries if e.get("hedged")),
+            "retries": sum(e.get("retries", 0) for e in entries),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency": {str(q): percentile(latencies, q) for q in QUANTILES},
+            "latency_sum": served_time,
+            "latency_count": len(latencies),
+            "time_to_first_token": {str(q): percentile(first_tokens, q) for q in QUANTILES},
+            "time_to_first_token_sum": sum(first_tokens),
+            "tokens_per_second": sum(e.get("completion_tokens", 0) for e in served) / served_time
+            if served_time > 0 else 0.0,
+            "cost_usd": cost,
+        }
+    return summaries
+
+
+def openmetrics(summaries: Dict[str, Dict[str, Any]]) -> str:
+    """Render summaries in the OpenMetrics text format (e.g. for a node_exporter textfile collector)."""
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str, samples: List[Tuple[str, Dict[str, str], float]]):
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"# HELP {name} {help_text}")
+        for suffix, labels, value in samples:
+            rendered = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+            lines.append(f"{name}{suffix}{{{rendered}}} {value:g}")
+
+    # Every value covers the `--since` window, so it can go down as old requests leave it:
+    # they are gauges, not counters (a drop in a counter would read as a reset)
+    items = summaries.items()
+    family("ai_bot_requests", "gauge", "Requests recorded in the window.",
+           [("", {"model": m}, s["requests"]) for m, s in items])
+    family("ai_bot_request_errors", "gauge", "Failed requests in the window.",
+           [("", {"model": m}, s["errors"]) for m, s in items])
+    family("ai_bot_cache_hits", "gauge", "Requests answered from the response cache in the window.",
+           [("", {"model": m}, s["cache_hits"]) for m, s in items])
+    family("ai_bot_coalesced_requests", "gauge",
+           "Requests that shared an identical in-flight call in the window.",
+           [("", {"model": m}, s["coalesced"]) for m, s in items])
+    family("ai_bot_hedged_requests", "gauge",
+           "Requests duplicated because they were slow to start, in the window.",
+           [("", {"model": m}, s["hedged"]) for m, s in items])
+    family("ai_bot_retries", "gauge", "Retries and fallbacks spent on requests in the window.",
+           [("", {"model": m}, s["retries"]) for m, s in items])
+    family("ai_bot_tokens", "gauge", "Prompt and completion tokens in the window.",
+           [("", {"model": m, "type": kind}, s[f"{kind}_tokens"])
+            for m, s in items for kind in ("prompt", "completion")])
+    family("ai_bot_cost_usd", "gauge", "Estimated cost in US dollars in the window.",
+           [("", {"model": m}, s["cost_usd"]) for m, s in items if s["cost_usd"] is not None])
+    family("ai_bot_request_time_seconds", "gauge", "Total time spent on requests in the window.",
+           [("", {"model": m}, s["latency_sum"]) for m, s in items])
+    family("ai_bot_tokens_per_second", "gauge", "Completion tokens per second of request time.",
+           [("", {"model": m}, s["tokens_per_second"]) for m, s in items])
+    for name, key, help_text in (
+        ("ai_bot_request_latency_seconds", "latency", "Total request latency percentiles in the window."),
+        ("ai_bot_time_to_first_token_seconds", "time_to_first_token",
+         "Time to first token percentiles in the window."),
+    ):
+        family(name, "gauge", help_text,
+               [("", {"model": m, "quantile": q}, value) for m, s in items for q, value in s[key].items()])
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def shared_telemetry() -> TelemetryLog:
+    """Return the process-wide telemetry log shared by all agents."""
+    global _shared_telemetry
+    with _lock:
+        if _shared_telemetry is None:
+            _shared_telemetry = TelemetryLog()
+        return _shared_telemetry
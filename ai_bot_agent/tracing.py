@@ -0,0 +1,382 @@
+"""
+Tracing for AI Bot Agent.
+Opt-in, OpenTelemetry-style spans around CLI commands, agent calls, prompt building,
+file reading, rate-limit waits and API requests, so a slow run shows whether the time
+went to startup, I/O, queueing or the model. Finished spans go to pluggable exporters;
+with none configured, tracing costs next to nothing.
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+import threading
+import contextvars
+from pathlib import Path
+from typing import Callable, Optional, List, Dict, Any, TextIO, TypeVar
+
+from ai_bot_agent.cache import cache_dir
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("ai_bot_span", default=None)
+
+_lock = threading.Lock()
+_shared_tracer: Optional["Tracer"] = None
+
+
+class Span:
+    """A timed operation with attributes, nested under the span that was current when it started."""
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"],
+                 attributes: Optional[Dict[str, Any]] = None, start_time: Optional[float] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        now = time.time()
+        self.start_time = start_time if start_time is not None else now
+        # Durations come from the monotonic clock; epoch times are only for display
+        self._perf_start = time.perf_counter() - (now - self.start_time)
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+        self._token: Optional[contextvars.Token] = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to end (or to now, while the span is open)."""
+        if self.end_time is not None:
+            return self.end_time - self.start_time
+        return time.perf_counter() - self._perf_start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error.type"] = type(error).__name__
+        self.attributes["error.message"] = str(error)
+
+    def end(self):
+        """Finish the span, make its parent current again and hand it to the exporters."""
+        if self.end_time is not None:
+            return
+        self.end_time = self.start_time + (time.perf_counter() - self._perf_start)
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                pass  # Ended from another context, e.g. a generator closed elsewhere
+            self._token = None
+        self.tracer.export(self)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.record_error(exc)
+        self.end()
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is off; every operation does nothing."""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Create spans and send finished ones to exporters.
+
+    An exporter is any object with `export(span)` and `shutdown()`.
+    """
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters: List[Any] = list(exporters or [])
+
+    def __bool__(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: Any):
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter: Any):
+        self.exporters.remove(exporter)
+
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+             start_time: Optional[float] = None):
+        """Start a span and make it current until it ends; use it as a context manager or call `end()`."""
+        if not self.exporters:
+            return NOOP_SPAN
+        span = Span(self, name, _current.get(), attributes, start_time)
+        span._token = _current.set(span)
+        return span
+
+    def current_span(self):
+        """Return the innermost open span, or a no-op span outside any."""
+        span = _current.get()
+        return span if span is not None and self.exporters else NOOP_SPAN
+
+    def wrap(self, function: F) -> F:
+        """Bind a function to the current span, so work it does in another thread nests under it."""
+        if not self.exporters:
+            return function
+        context = contextvars.copy_context()
+
+        @functools.wraps(function)
+        def run(*args, **kwargs):
+            # A context can only be entered by one thread at a time, so each call gets a copy
+            return context.copy().run(function, *args, **kwargs)
+        return run  # type: ignore[return-value]
+
+    def export(self, span: Span):
+        for exporter in list(self.exporters):
+            try:
+                exporter.export(span)
+            except Exception:
+                pass  # A broken exporter must not break the traced work
+
+    def shutdown(self):
+        """Flush and close every exporter."""
+        for exporter in list(self.exporters):
+            try:
+                exporter.shutdown()
+            except Exception:
+                pass
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator running a function, generator, coroutine or async generator in a span.
+
+    Generator spans cover the whole iteration, not just the first call.
+    """
+    def decorate(function: F) -> F:
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def async_gen_wrapper(*args, **kwargs):
+                with shared_tracer().span(name):
+                    async for item in function(*args, **kwargs):
+                        yield item
+            return async_gen_wrapper  # type: ignore[return-value]
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with shared_tracer().span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def gen_wrapper(*args, **kwargs):
+                with shared_tracer().span(name):
+                    return (yield from function(*args, **kwargs))
+            return gen_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with shared_tracer().span(name):
+                return function(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+class CollectingExporter:
+    """Keep finished spans in memory, e.g. for tests or embedding applications."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def named(self, name: str) -> List[Span]:
+        return [span for span in self.spans if span.name == name]
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter:
+    """Append finished spans as JSON lines, by default to traces.jsonl in the cache directory."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else cache_dir() / "traces.jsonl"
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def shutdown(self):
+        pass
+
+
+class _TraceBuffer:
+    """Hold spans until their root span ends, then hand over the whole trace."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.traces: Dict[str, List[Span]] = {}
+
+    def export(self, span: Span):
+        with self.lock:
+            spans = self.traces.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self.traces[span.trace_id]
+        self.export_trace(sorted(spans, key=lambda s: s.start_time))
+
+    def shutdown(self):
+        with self.lock:
+            pending, self.traces = list(self.traces.values()), {}
+        for spans in pending:
+            self.export_trace(sorted(spans, key=lambda s: s.start_time))
+
+    def export_trace(self, spans: List[Span]):
+        raise NotImplementedError
+
+
+class ConsoleSpanExporter(_TraceBuffer):
+    """Print each finished trace as an indented tree of span durations."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        super().__init__()
+        self.stream = stream
+
+    def export_trace(self, spans: List[Span]):
+        stream = self.stream or sys.stderr
+        ids = {span.span_id for span in spans}
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in spans:
+            # Spans whose parent was lost (e.g. flushed at shutdown) are shown at the top level
+            children.setdefault(span.parent_id if span.parent_id in ids else None, []).append(span)
+
+        def render(span: Span, depth: int):
+            attributes = " ".join(f"{key}={_short(value)}" for key, value in span.attributes.items())
+            marker = " !" if span.status == "error" else ""
+            stream.write(f"{'  ' * depth}{span.name:<{max(1, 32 - 2 * depth)}} "
+                         f"{span.duration * 1000:10.1f} ms{marker}  {attributes}".rstrip() + "\n")
+            for child in children.get(span.span_id, []):
+                render(child, depth + 1)
+
+        for root in children.get(None, []):
+            render(root, 0)
+        stream.flush()
+
+
+class OpenTelemetryExporter(_TraceBuffer):
+    """Replay finished traces into OpenTelemetry (requires the opentelemetry-api package).
+
+    Spans keep their timing and nesting, so any exporter configured in the
+    OpenTelemetry SDK (OTLP, Jaeger, Zipkin, ...) receives them.
+    """
+
+    def __init__(self, tracer: Optional[Any] = None):
+        super().__init__()
+        from opentelemetry import trace
+
+        self.trace = trace
+        self.tracer = tracer or trace.get_tracer("ai-bot")
+
+    def export_trace(self, spans: List[Span]):
+        created: Dict[str, Any] = {}
+        for span in spans:
+            parent = created.get(span.parent_id) if span.parent_id else None
+            context = self.trace.set_span_in_context(parent) if parent is not None else None
+            attributes = {key: value if isinstance(value, (str, bool, int, float)) else str(value)
+                          for key, value in span.attributes.items()}
+            created[span.span_id] = self.tracer.start_span(
+                span.name, context=context, attributes=attributes, start_time=int(span.start_time * 1e9)
+            )
+            if span.status == "error":
+                created[span.span_id].set_status(self.trace.Status(self.trace.StatusCode.ERROR))
+        for span in reversed(spans):
+            created[span.span_id].end(end_time=int((span.end_time or span.start_time) * 1e9))
+
+
+def _short(value: Any, limit: int = 60) -> str:
+    text = f"{value:.4g}" if isinstance(value, float) else str(value)
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def exporters_from_spec(spec: str) -> List[Any]:
+    """Build exporters from a comma-separated spec: console, file, file:<path> or otel."""
+    exporters: List[Any] = []
+    for item in (part.strip() for part in spec.split(",")):
+        kind, _, argument = item.partition(":")
+        if not item or kind in ("off", "none"):
+            continue
+        if kind == "console":
+            exporters.append(ConsoleSpanExporter())
+        elif kind == "file":
+            exporters.append(FileSpanExporter(Path(argument) if argument else None))
+        elif kind == "otel":
+            try:
+                exporters.append(OpenTelemetryExporter())
+            except ImportError:
+                raise ValueError("The otel exporter needs the opentelemetry-api package "
+                                 "(pip install opentelemetry-sdk)")
+        else:
+            raise ValueError(f"Unknown trace exporter '{item}'. Use console, file, file:<path> or otel.")
+    return exporters
+
+
+def shared_tracer() -> Tracer:
+    """Return the process-wide tracer, with exporters from AI_BOT_TRACE (tracing is off when unset)."""
+    global _shared_tracer
+    if _shared_tracer is not None:
+        return _shared_tracer  # Decorated hot paths call this on every request
+    with _lock:
+        if _shared_tracer is None:
+            try:
+                exporters = exporters_from_spec(os.getenv("AI_BOT_TRACE", ""))
+            except ValueError:
+                exporters = []
+            _shared_tracer = Tracer(exporters)
+        return _shared_tracer
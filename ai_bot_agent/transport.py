@@ -0,0 +1,159 @@
+"""
+Shared HTTP transport for AI Bot Agent.
+All agents in a process reuse one pooled httpx client (keep-alive, HTTP/2 when the
+`h2` package is installed), so connections and TLS sessions are not rebuilt per agent.
+The client comes from whichever httpx-compatible library the OpenAI SDK is built on.
+"""
+
+import os
+import weakref
+import threading
+import importlib.util
+from typing import Optional, Dict, Tuple, Any
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+_lock = threading.Lock()
+_openai_clients: Dict[Tuple[Optional[str], Optional[str]], Any] = {}
+# Event loop -> {(api_key, base_url): AsyncOpenAI}; entries go away with their loop
+_async_openai_clients: "weakref.WeakKeyDictionary[Any, Dict[Tuple[Optional[str], Optional[str]], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def http2_available() -> bool:
+    """Return True if httpx can negotiate HTTP/2 (requires the `h2` package)."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def http_library() -> Any:
+    """Return the HTTP library the installed OpenAI SDK is built on (httpx or httpx2), or None.
+
+    Its `Limits` and `Timeout` must be the ones the SDK's client classes accept, so
+    the library is found from the SDK rather than imported by name.
+    """
+    import openai
+
+    for cls in openai.DefaultHttpxClient.__mro__:
+        root = cls.__module__.split(".")[0]
+        if root in ("openai", "builtins"):
+            continue
+        try:
+            module = importlib.import_module(root)
+        except ImportError:
+            return None
+        return module if hasattr(module, "Limits") and hasattr(module, "Timeout") else None
+    return None
+
+
+def _timeout(timeout: Optional[float]) -> float:
+    return timeout or float(os.getenv("AI_BOT_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def _client_options(max_connections: Optional[int], max_keepalive: Optional[int],
+                    keepalive_expiry: Optional[float], timeout: Optional[float],
+                    connect_timeout: Optional[float], http2: Optional[bool]) -> Optional[Dict[str, Any]]:
+    httpx = http_library()
+    if httpx is None:
+        return None
+    if http2 is None:
+        http2 = os.getenv("AI_BOT_HTTP2", "auto").lower() not in ("0", "false", "no") and http2_available()
+    max_connections = max_connections or int(os.getenv("AI_BOT_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+    max_keepalive = max_keepalive or int(os.getenv("AI_BOT_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE))
+    keepalive_expiry = keepalive_expiry or float(os.getenv("AI_BOT_KEEPALIVE_EXPIRY",
+                                                           DEFAULT_KEEPALIVE_EXPIRY))
+    return {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(
+            _timeout(timeout),
+            connect=connect_timeout or float(os.getenv("AI_BOT_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+        ),
+        "http2": http2,
+    }
+
+
+def create_http_client(max_connections: Optional[int] = None, max_keepalive: Optional[int] = None,
+                       keepalive_expiry: Optional[float] = None, timeout: Optional[float] = None,
+                       connect_timeout: Optional[float] = None, http2: Optional[bool] = None):
+    """Create a pooled synchronous httpx client suitable for `openai.OpenAI(http_client=...)`.
+
+    Unset options come from AI_BOT_MAX_CONNECTIONS, AI_BOT_MAX_KEEPALIVE,
+    AI_BOT_KEEPALIVE_EXPIRY, AI_BOT_TIMEOUT, AI_BOT_CONNECT_TIMEOUT and AI_BOT_HTTP2.
+    Returns None if the SDK's HTTP library cannot be found; the SDK's own default
+    client is then used.
+    """
+    import openai
+
+    options = _client_options(max_connections, max_keepalive, keepalive_expiry, timeout, connect_timeout,
+                              http2)
+    return openai.DefaultHttpxClient(**options) if options is not None else None
+
+
+def create_async_http_client(max_connections: Optional[int] = None, max_keepalive: Optional[int] = None,
+                             keepalive_expiry: Optional[float] = None, timeout: Optional[float] = None,
+                             connect_timeout: Optional[float] = None, http2: Optional[bool] = None):
+    """Create a pooled async httpx client suitable for `openai.AsyncOpenAI(http_client=...)`, or None."""
+    import openai
+
+    options = _client_options(max_connections, max_keepalive, keepalive_expiry, timeout, connect_timeout,
+                              http2)
+    return openai.DefaultAsyncHttpxClient(**options) if options is not None else None
+
+
+def sdk_options(http_client: Any) -> Dict[str, Any]:
+    """Pass our pooled client to the SDK, or at least our timeout if there is none."""
+    if http_client is None:
+        return {"timeout": _timeout(None)}
+    return {"http_client": http_client}
+
+
+def shared_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """Return the process-wide OpenAI client for an API key and base URL, creating it once."""
+    import openai
+
+    key = (api_key, base_url)
+    with _lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            # Retries are handled by the request scheduler, which also honours rate limits
+            client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                   **sdk_options(create_http_client()))
+            _openai_clients[key] = client
+        return client
+
+
+def shared_async_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """Return the AsyncOpenAI client shared within the running event loop.
+
+    Async connection pools belong to one event loop, so each loop gets its own client.
+    """
+    import asyncio
+    import openai
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_openai_clients.setdefault(loop, {})
+        client = clients.get((api_key, base_url))
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                        **sdk_options(create_async_http_client()))
+            clients[(api_key, base_url)] = client
+        return client
+
+
+def close_shared_clients():
+    """Close every shared client and its connection pool."""
+    with _lock:
+        for client in _openai_clients.values():
+            client.close()
+        _openai_clients.clear()
+        # Async clients are closed by their event loop; just drop the references
+        _async_openai_clients.clear()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for AI Bot Agent.
+Measures CLI cold start (with and without the daemon), agent overhead, history growth, file analysis throughput and
+batch concurrency scaling against in-process fakes and the bundled stub server, and
+writes the results to JSON so runs can be compared between releases.
+
+    python benchmark.py                       # full run, writes benchmark-results.json
+    python benchmark.py --quick -o quick.json
+    python benchmark.py --compare old.json    # print changes against an earlier run
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import types
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Callable, List, Dict, Any
+
+from ai_bot_agent.agent import AIBotAgent
+from ai_bot_agent.batch import BatchRunner
+from ai_bot_agent.providers import resolve_provider
+from ai_bot_agent.scheduler import RequestScheduler
+from ai_bot_agent.stub_server import StubServer
+
+CLI_COMMANDS = [["--help"], ["help"], ["sessions"], ["cache", "stats"]]
+
+
+class FakeClient:
+    """In-process stand-in for the OpenAI client, so timings exclude the network."""
+
+    def __init__(self, response: str = "A short canned answer."):
+        usage = types.SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        message = types.SimpleNamespace(content=response)
+        self.completion = types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        return self.completion
+
+
+def timed(function: Callable[[], Any], repeat: int) -> List[float]:
+    """Return the wall time of each of `repeat` calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    ordered = sorted(times)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+    }
+
+
+def offline_agent(**kwargs: Any) -> AIBotAgent:
+    """Agent with a fake client, no rate limits and a fixed model."""
+    return AIBotAgent(client=FakeClient(), scheduler=RequestScheduler(), model="bench", **kwargs)
+
+
+def bench_cli_cold_start(repeat: int) -> Dict[str, Any]:
+    """Time `python -m ai_bot_agent.main <command>` from process start to exit."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=tmp, XDG_DATA_HOME=tmp)
+        for command in CLI_COMMANDS:
+            def run():
+                subprocess.run([sys.executable, "-m", "ai_bot_agent.main"] + command, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            run()  # Warm the OS file cache and bytecode
+            results[" ".join(command)] = summarize(timed(run, repeat))
+    return results
+
+
+def bench_daemon_start(repeat: int) -> Dict[str, Any]:
+    """Time `ai-bot` commands served by a running daemon against running them in-process."""
+    from ai_bot_agent.daemon import status
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=tmp, XDG_DATA_HOME=tmp, AI_BOT_SOCKET=str(Path(tmp) / "bench.sock"))
+        env.pop("AI_BOT_DAEMON", None)
+        server = subprocess.Popen([sys.executable, "-m", "ai_bot_agent.main", "daemon", "--workers", "1"], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while status(env["AI_BOT_SOCKET"]) is None:
+                if server.poll() is not None:
+                    raise RuntimeError("The daemon failed to start")
+                time.sleep(0.05)
+            for mode, overrides in (("daemon", {}), ("in_process", {"AI_BOT_DAEMON": "off"})):
+                def run():
+                    subprocess.run([sys.executable, "-m", "ai_bot_agent.launcher", "cache", "stats"],
+                                   env=dict(env, **overrides), stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, check=True)
+                run()
+                results[mode] = summarize(timed(run, repeat))
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def bench_chat_overhead(repeat: int) -> Dict[str, Any]:
+    """Time `AIBotAgent.chat` with an in-process client, i.e. everything but the network."""
+    agent = offline_agent()
+    agent.chat("warm up")
+    stats = summarize(timed(lambda: agent.chat("What is Python?"), repeat))
+    stats["calls"] = repeat
+    return stats
+
+
+def bench_history_growth(turns: int) -> Dict[str, Any]:
+    """Time each turn of a long conversation to see how cost grows with history."""
+    agent = offline_agent()
+    times = [timed(lambda: agent.chat(f"Question number {turn} " + "detail " * 40), 1)[0] for turn in range(turns)]
+    window = max(1, turns // 10)
+    first, last = statistics.median(times[:window]), statistics.median(times[-window:])
+    return {
+        "turns": turns,
+        "first_turns_median_ms": round(first * 1000, 3),
+        "last_turns_median_ms": round(last * 1000, 3),
+        "growth_ratio": round(last / first, 2),
+        "history_messages": len(agent.conversation_history),
+    }
+
+
+def bench_analyze_throughput(base_url: str, sizes: List[int]) -> Dict[str, Any]:
+    """Analyze generated files of several sizes against the stub server."""
+    agent = AIBotAgent(provider=resolve_provider("stub", base_url), scheduler=RequestScheduler(),
+                       model="bench")
+    agent.complete("warm up")  # Connect and import the client outside the timings
+    line = b"def handler(event, context):  # process one event and return a response\n"
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = Path(tmp) / f"input_{size}.py"
+            path.write_bytes(line * (size // len(line) + 1))
+            start = time.perf_counter()
+            if size > 12000:
+                result = agent.analyze_paths([str(path)], concurrency=8)
+                chunks = result["analyzed_chunks"]
+            else:
+                agent.analyze_file(str(path))
+                chunks = 1
+            elapsed = time.perf_counter() - start
+            results[f"{size // 1024}KiB"] = {
+                "seconds": round(elapsed, 3),
+                "mib_per_second": round(size / elapsed / 1024 / 1024, 3),
+                "chunks": chunks,
+            }
+    return results
+
+
+def bench_batch_scaling(base_url: str, prompts: int, levels: List[int]) -> Dict[str, Any]:
+    """Run the same batch at increasing concurrency against the stub server."""
+    import asyncio
+    import openai
+
+    async def run(concurrency: int) -> float:
+        async with openai.AsyncOpenAI(api_key="bench", base_url=base_url, max_retries=0) as client:
+            runner = BatchRunner(client, "You are a benchmark.", model="bench", concurrency=concurrency,
+                                 scheduler=RequestScheduler())
+            start = time.perf_counter()
+            await runner.run(({"prompt": f"Prompt {i}"} for i in range(prompts)), io.StringIO())
+            if runner.failed:
+                raise RuntimeError(f"{runner.failed} batch prompts failed")
+            return time.perf_counter() - start
+
+    results = {}
+    for concurrency in levels:
+        elapsed = asyncio.run(run(concurrency))
+        results[str(concurrency)] = {
+            "seconds": round(elapsed, 3),
+            "prompts_per_second": round(prompts / elapsed, 1),
+        }
+    return results
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any], prefix: str = ""):
+    """Print the relative change of every numeric result present in both runs."""
+    for key, value in current.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and isinstance(previous.get(key), dict):
+            compare(previous[key], value, name + ".")
+        elif isinstance(value, (int, float)) and isinstance(previous.get(key), (int, float)) and previous[key]:
+            change = (value - previous[key]) / previous[key] * 100
+            print(f"{name:60} {previous[key]:>12} -> {value:>12} ({change:+.1f}%)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark AI Bot Agent hot paths.")
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="Where to write the results")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads for a fast smoke run")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    quick = args.quick
+    results: Dict[str, Any] = {}
+    # Telemetry stays on so its cost is measured, but out of the user's own metrics
+    telemetry_dir = tempfile.TemporaryDirectory()
+    os.environ["AI_BOT_TELEMETRY_FILE"] = str(Path(telemetry_dir.name) / "telemetry.jsonl")
+    print("🏁 Benchmarking AI Bot Agent...")
+
+    print("  CLI cold start")
+    results["cli_cold_start"] = bench_cli_cold_start(repeat=3 if quick else 10)
+    print("  Daemon start")
+    results["daemon_start"] = bench_daemon_start(repeat=3 if quick else 10)
+    print("  Chat overhead")
+    results["chat_overhead"] = bench_chat_overhead(repeat=200 if quick else 2000)
+    print("  History growth")
+    results["history_growth"] = bench_history_growth(turns=100 if quick else 1000)
+
+    # Fast, error-free stub so the client side dominates
+    with StubServer(port=0, latency=0.0, tokens_per_second=10000, response_tokens=32) as server:
+        print("  Analyze throughput")
+        sizes = [4 * 1024, 64 * 1024] if quick else [4 * 1024, 64 * 1024, 1024 * 1024, 8 * 1024 * 1024]
+        results["analyze_throughput"] = bench_analyze_throughput(server.base_url, sizes)
+
+    # Fixed per-request latency so concurrency is what the numbers show
+    with StubServer(port=0, latency=0.05, tokens_per_second=10000, response_tokens=16) as server:
+        print("  Batch scaling")
+        results["batch_scaling"] = bench_batch_scaling(
+            server.base_url, prompts=64 if quick else 512, levels=[1, 4, 16] if quick else [1, 4, 16, 64]
+        )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+    telemetry_dir.cleanup()
+    Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        print(f"\nChanges since {args.compare}:")
+        compare(previous["results"], results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
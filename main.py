@@ -4,28 +4,30 @@ AI Bot Agent - Command Line Interface
 A powerful AI assistant that runs from the command line with various capabilities.
 """
 
-import os
 import sys
-import json
-import asyncio
-import subprocess
-import webbrowser
-from typing import Optional, List, Dict, Any
+import time
+
+# Start of the "cli.startup" span: everything below is import and setup time
+_started = time.time()
+
+from typing import Optional, List, Dict, Any, Iterator, Callable
 from pathlib import Path
 import typer
 from rich.console import Console
-from rich.prompt import Prompt, Confirm
+from rich.prompt import Prompt
 from rich.panel import Panel
-from rich.text import Text
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.live import Live
-from rich.layout import Layout
-import openai
 from dotenv import load_dotenv
-import requests
-import time
-import datetime
+from ai_bot_agent.cache import ResponseCache, cache_dir
+from ai_bot_agent.sessions import Session, SessionStore
+from ai_bot_agent.analysis import DEFAULT_CHUNK_BYTES
+from ai_bot_agent.agent import AIBotAgent
+from ai_bot_agent.events import JsonLinesSink
+from ai_bot_agent.router import AUTO_MODEL
+from ai_bot_agent.providers import Provider, resolve_provider
+from ai_bot_agent.tracing import shared_tracer, exporters_from_spec
+
+# Heavier dependencies (openai, webbrowser, rich.live, rich.markdown) are imported
+# inside the functions that use them so that commands such as `help` start fast.
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +35,12 @@ load_dotenv()
 # Initialize Rich console
 console = Console()
 
+# Output mode selected by the global --quiet and --json options
+output_mode = {"quiet": False, "json": False}
+
+# Backend selected by the global --provider and --base-url options
+provider_options: Dict[str, Optional[str]] = {"name": None, "base_url": None}
+
 # Initialize Typer app
 app = typer.Typer(
     name="ai-bot",
@@ -40,128 +48,293 @@ app = typer.Typer(
     add_completion=False
 )
 
-class AIBotAgent:
-    def __init__(self):
-        self.client = None
-        self.conversation_history = []
-        self.system_prompt = """You are an intelligent AI assistant running from the command line. 
-        You can help with:
-        - Answering questions and providing information
-        - Writing and analyzing code
-        - File operations and system tasks
-        - Web searches and research
-        - Creative writing and brainstorming
-        - Problem solving and analysis
-        
-        Be helpful, accurate, and concise in your responses."""
-        
-        self.initialize_openai()
-    
-    def initialize_openai(self):
-        """Initialize OpenAI client with API key."""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            console.print("[red]Warning: OPENAI_API_KEY not found in environment variables.[/red]")
-            console.print("Please set your OpenAI API key in a .env file or environment variable.")
-            return
-        
-        try:
-            self.client = openai.OpenAI(api_key=api_key)
-            console.print("[green]✓ OpenAI client initialized successfully[/green]")
-        except Exception as e:
-            console.print(f"[red]Error initializing OpenAI client: {e}[/red]")
+@app.callback()
+def main_callback(
+    ctx: typer.Context,
+    startup_profile: bool = typer.Option(
+        False, "--startup-profile", help="Show an import time breakdown for the command"
+    ),
+    quiet: bool = typer.Option(False, "--quiet", "-q",
+                               help="Print only the response, without banners or spinners"),
+    json_output: bool = typer.Option(False, "--json",
+                                     help="Print agent events as JSON lines instead of rendering them"),
+    provider: Optional[str] = typer.Option(
+        None, "--provider", help="Backend: openai, vllm, llamacpp, ollama or stub (default: AI_BOT_PROVIDER)"
+    ),
+    base_url: Optional[str] = typer.Option(
+        None, "--base-url", help="OpenAI-compatible API URL, overriding the provider's default"
+    ),
+    trace: Optional[str] = typer.Option(
+        None, "--trace", envvar="AI_BOT_TRACE",
+        help="Record spans to exporters: console, file, file:<path> or otel (comma-separated)"
+    )
+):
+    """AI Bot Agent - Your intelligent command line assistant"""
+    output_mode["quiet"] = quiet
+    output_mode["json"] = json_output
+    provider_options["name"] = provider
+    provider_options["base_url"] = base_url
+    if startup_profile:
+        run_startup_profile([arg for arg in sys.argv[1:] if arg != "--startup-profile"])
+        raise typer.Exit()
+    if trace:
+        start_tracing(ctx, trace)
+
+def start_tracing(ctx: typer.Context, spec: str):
+    """Trace the command, from process start-up until it exits."""
+    try:
+        exporters = exporters_from_spec(spec)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+    tracer = shared_tracer()
+    previous, tracer.exporters = tracer.exporters, exporters
+    command = tracer.span(f"cli.{ctx.invoked_subcommand}", {"argv": " ".join(sys.argv[1:])},
+                          start_time=_started)
+    tracer.span("cli.startup", start_time=_started).end()
     
-    def chat(self, message: str, model: str = "gpt-3.5-turbo") -> str:
-        """Send a message to the AI and get a response."""
-        if not self.client:
-            return "Error: OpenAI client not initialized. Please check your API key."
-        
-        try:
-            # Add user message to conversation history
-            self.conversation_history.append({"role": "user", "content": message})
-            
-            # Prepare messages for API call
-            messages = [{"role": "system", "content": self.system_prompt}] + self.conversation_history
-            
-            with console.status("[bold green]Thinking...", spinner="dots"):
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    max_tokens=1000,
-                    temperature=0.7
-                )
-            
-            ai_response = response.choices[0].message.content
-            
-            # Add AI response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
-            
-            return ai_response
-            
-        except Exception as e:
-            return f"Error: {str(e)}"
+    def finish():
+        command.end()
+        tracer.shutdown()
+        tracer.exporters = previous  # A daemon worker serves the next command untraced
     
-    def search_web(self, query: str) -> str:
-        """Perform a web search (placeholder - would need actual search API)."""
-        return f"Web search for '{query}' would be implemented here. Consider using DuckDuckGo API or similar."
+    ctx.call_on_close(finish)
+
+def run_startup_profile(args: List[str], limit: int = 20):
+    """Re-run the CLI under `python -X importtime` and summarize the slowest imports."""
+    import subprocess
+    from rich.table import Table
     
-    def analyze_file(self, file_path: str) -> str:
-        """Analyze a file and provide insights."""
-        try:
-            path = Path(file_path)
-            if not path.exists():
-                return f"Error: File '{file_path}' not found."
-            
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Analyze file content
-            analysis_prompt = f"""Analyze this file and provide insights:
-            
-            File: {file_path}
-            Size: {len(content)} characters
-            Content:
-            {content[:2000]}...
-            
-            Please provide:
-            1. File type and purpose
-            2. Key components or functions
-            3. Potential issues or improvements
-            4. Summary
-            """
-            
-            return self.chat(analysis_prompt)
-            
-        except Exception as e:
-            return f"Error analyzing file: {str(e)}"
-    
-    def generate_code(self, description: str, language: str = "python") -> str:
-        """Generate code based on description."""
-        code_prompt = f"""Generate {language} code for the following description:
-        
-        {description}
-        
-        Please provide:
-        1. Complete, working code
-        2. Brief explanation of the code
-        3. Usage examples if applicable
-        """
-        
-        return self.chat(code_prompt)
-    
-    def clear_history(self):
-        """Clear conversation history."""
-        self.conversation_history = []
-        console.print("[green]Conversation history cleared.[/green]")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "ai_bot_agent.main"] + args,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    wall_time = time.perf_counter() - start
+    
+    imports = []
+    other_stderr = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            other_stderr.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        # Nesting depth is encoded as indentation after the single separator space
+        imports.append((int(fields[0]), int(fields[1]), fields[2][1:].rstrip()))
+    
+    if other_stderr:
+        console.print("\n".join(other_stderr), markup=False, highlight=False)
+    
+    top_level_total = sum(cumulative for _, cumulative, name in imports if not name.startswith(" "))
+    table = Table(title=f"Startup profile: ai-bot {' '.join(args)}".rstrip())
+    table.add_column("Module")
+    table.add_column("Self (ms)", justify="right")
+    table.add_column("Cumulative (ms)", justify="right")
+    for self_us, cumulative_us, name in sorted(imports, key=lambda i: i[1], reverse=True)[:limit]:
+        table.add_row(name, f"{self_us / 1000:.1f}", f"{cumulative_us / 1000:.1f}")
+    console.print(table)
+    console.print(
+        f"[bold]Imports:[/bold] {top_level_total / 1000:.1f} ms across {len(imports)} modules · "
+        f"[bold]Wall time:[/bold] {wall_time * 1000:.0f} ms"
+    )
+
+class RichEventSink:
+    """Render agent events on a Rich console."""
+    
+    def __init__(self, target: Console, quiet: bool = False):
+        self.console = target
+        self.quiet = quiet
+        self.status = None
+    
+    def __call__(self, event: Dict[str, Any]):
+        kind = event["type"]
+        if kind == "warning":
+            from rich.markup import escape
+            self.console.print(f"[red]{escape(event['message'])}[/red]")
+        elif self.quiet:
+            return
+        elif kind == "started" and not event["stream"]:
+            self.status = self.console.status("[bold green]Thinking...", spinner="dots")
+            self.status.start()
+        elif kind in ("finished", "error") and self.status is not None:
+            self.status.stop()
+            self.status = None
+        elif kind == "client_ready":
+            self.console.print("[green]✓ OpenAI client initialized successfully[/green]")
+        elif kind == "history_cleared":
+            self.console.print("[green]Conversation history cleared.[/green]")
+        elif kind == "validating" and self.status is not None:
+            self.status.update(f"[bold green]Checking {event['candidates']} candidates...")
+        elif kind == "retrieved":
+            files = len({chunk["path"] for chunk in event["chunks"]})
+            self.console.print(f"[dim]Using {len(event['chunks'])} excerpts from {files} files[/dim]")
+
+def headless() -> bool:
+    """Return True when output is for scripts rather than a terminal user."""
+    return output_mode["quiet"] or output_mode["json"]
+
+def current_provider() -> Provider:
+    """Resolve the backend chosen on the command line, exiting on an unknown provider."""
+    try:
+        return resolve_provider(provider_options["name"], provider_options["base_url"])
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+
+def create_agent(**kwargs: Any) -> AIBotAgent:
+    """Create an agent whose events are rendered according to the output mode."""
+    if output_mode["json"]:
+        sinks = [JsonLinesSink()]
+    elif output_mode["quiet"]:
+        sinks = [RichEventSink(Console(stderr=True), quiet=True)]
+    else:
+        sinks = [RichEventSink(console)]
+    return AIBotAgent(sinks=sinks, provider=current_provider(), **kwargs)
+
+def hedge_policy(enabled: bool) -> Any:
+    """Return the shared hedge policy when hedging is enabled, else None."""
+    if not enabled:
+        return None
+    from ai_bot_agent.hedging import shared_hedge_policy
+    return shared_hedge_policy()
+
+def open_semantic_cache() -> Any:
+    """Open the semantic cache with the configured embedder, exiting if it cannot be used."""
+    from ai_bot_agent.semantic_cache import SemanticCache, default_embedder
+    
+    try:
+        return SemanticCache(default_embedder(current_provider()))
+    except (ImportError, ValueError) as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+
+def open_repo_index(path: str) -> Any:
+    """Open the vector index of a repository and bring it up to date, exiting if it cannot be used."""
+    from ai_bot_agent.repo import RepoIndex, repo_embedder
+    
+    try:
+        index = RepoIndex(Path(path), repo_embedder(current_provider()))
+        if headless():
+            result = index.update()
+        else:
+            with console.status("[bold green]Indexing repository...", spinner="dots") as status:
+                result = index.update(progress=lambda message: status.update(f"[bold green]{message}..."))
+    except (ImportError, ValueError, FileNotFoundError) as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+    except Exception as e:
+        console.print(f"[red]Error embedding the repository: {e}[/red]")
+        raise typer.Exit(1)
+    if not headless() and (result["changed"] or result["removed"]):
+        console.print(f"[dim]Repository index updated: {result['embedded']} chunks embedded, "
+                      f"{result['reused']} unchanged, {result['removed']} files removed[/dim]")
+    return index
+
+def open_session(name: Optional[str]) -> Optional[Session]:
+    """Open a named session for a command, exiting on an invalid name."""
+    if not name:
+        return None
+    try:
+        return SessionStore().get(name)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
 
 def display_banner():
     """Display the AI Bot banner."""
+    if headless():
+        return
     banner = """
     🤖 AI Bot Agent v1.0
     Your intelligent command line assistant
     """
     console.print(Panel(banner, style="bold blue"))
 
+def render_stream(chunks: Iterator[str], title: str) -> str:
+    """Render streamed response chunks as incremental Markdown."""
+    from rich.live import Live
+    from rich.markdown import Markdown
+    
+    console.print(f"\n[bold green]{title}[/bold green]")
+    text = ""
+    last_render = 0.0
+    with Live(Markdown(""), console=console, refresh_per_second=15, vertical_overflow="visible") as live:
+        for delta in chunks:
+            text += delta
+            # Re-parsing Markdown on every token is wasteful; throttle to the refresh rate
+            now = time.perf_counter()
+            if now - last_render >= 1 / 15:
+                live.update(Markdown(text))
+                last_render = now
+        live.update(Markdown(text))
+    return text
+
+def display_heading(text: str):
+    """Display a heading such as the question being asked, unless output is headless."""
+    if not headless():
+        console.print(text)
+
+def report_error(error: Exception):
+    """Report a failed request in red, on stderr when output is for scripts."""
+    from rich.markup import escape
+    target = Console(stderr=True) if headless() else console
+    target.print(f"[red]Error: {escape(str(error))}[/red]")
+
+def display_response(bot: AIBotAgent, title: str, streaming: bool, stream: Callable[[], Iterator[str]],
+                     call: Callable[[], str], separator: str = " "):
+    """Produce a response and display it according to the output mode.
+    
+    A failed request is reported as an error and exits with status 1.
+    """
+    try:
+        show_response(bot, title, streaming, stream, call, separator)
+    except Exception as e:
+        report_error(e)
+        raise typer.Exit(1)
+
+def show_response(bot: AIBotAgent, title: str, streaming: bool, stream: Callable[[], Iterator[str]],
+                  call: Callable[[], str], separator: str):
+    if output_mode["json"]:
+        call()  # The finished event carries the response
+        return
+    if output_mode["quiet"]:
+        if not streaming:
+            print(call())
+            return
+        for delta in stream():
+            sys.stdout.write(delta)
+            sys.stdout.flush()
+        sys.stdout.write("\n")
+        return
+    if streaming:
+        render_stream(stream(), title)
+        display_request_stats(bot)
+        return
+    console.print(f"\n[bold green]{title}[/bold green]{separator}{call()}")
+
+def display_request_stats(bot: AIBotAgent):
+    """Display timing information for the last request."""
+    stats = bot.last_request_stats
+    if not stats:
+        return
+    if stats.get("cache_hit"):
+        console.print("[dim]Answered from cache[/dim]")
+        return
+    if stats.get("coalesced"):
+        console.print("[dim]Shared an identical request already in flight · "
+                      f"Total: {stats['total_time']:.2f}s[/dim]")
+        return
+    console.print(
+        f"[dim]{stats['model']} · "
+        f"First token: {stats['time_to_first_token']:.2f}s · "
+        f"Total: {stats['total_time']:.2f}s · "
+        f"{stats['tokens_per_second']:.1f} tokens/s"
+        f"{' · hedged' if stats.get('hedged') else ''}[/dim]"
+    )
+
 def display_help():
     """Display help information."""
     help_text = """
@@ -171,9 +344,16 @@ def display_help():
     [green]chat[/green] - Start interactive chat mode
     [green]ask[/green] - Ask a single question
     [green]code[/green] - Generate code from description
-    [green]analyze[/green] - Analyze a file
-    [green]search[/green] - Search the web
+    [green]analyze[/green] - Analyze files, directories or globs
+    [green]index[/green] - Index documents for search
+    [green]search[/green] - Search indexed documents
+    [green]batch[/green] - Run many prompts from a JSONL/CSV file or stdin
+    [green]stub-server[/green] - Run a local OpenAI-compatible stub server
+    [green]daemon[/green] - Keep the agent warm so commands start instantly
     [green]clear[/green] - Clear conversation history
+    [green]cache[/green] - Show cache stats or prune the response cache
+    [green]sessions[/green] - List saved conversation sessions
+    [green]stats[/green] - Show latency, throughput and cost per model
     [green]help[/green] - Show this help message
     [green]exit[/green] - Exit the bot
     
@@ -181,8 +361,20 @@ def display_help():
     ai-bot setup
     ai-bot chat
     ai-bot ask "What is Python?"
+    ai-bot ask "And its creator?" --session python
     ai-bot code "Create a simple web scraper"
+    ai-bot code "Parse ISO dates" --candidates 4 --test "pytest -q tests/test_dates.py"
+    ai-bot ask "Explain monads" --model gpt-4o
     ai-bot analyze main.py
+    ai-bot analyze src/ "logs/*.log"
+    ai-bot ask "Where are retries configured?" --repo .
+    ai-bot index ~/notes
+    ai-bot search "connection pooling" --summarize
+    ai-bot --json ask "What is Python?"
+    ai-bot --provider ollama ask "What is Python?" --model llama3
+    ai-bot --quiet code "Reverse a string" > snippet.py
+    ai-bot stats --since 7d
+    ai-bot daemon &
     """
     console.print(Panel(help_text, title="Help", style="green"))
 
@@ -204,6 +396,7 @@ def setup_openai_key():
     console.print("Opening OpenAI API key page in your browser...")
     
     try:
+        import webbrowser
         webbrowser.open("https://platform.openai.com/api-keys")
         console.print("[green]✓ Browser opened successfully[/green]")
     except Exception as e:
@@ -237,6 +430,7 @@ def setup_openai_key():
     # Test the API key
     console.print("\n[bold blue]Step 3: Testing your API key[/bold blue]")
     try:
+        import openai
         test_client = openai.OpenAI(api_key=api_key)
         # Try a simple API call to test the key
         response = test_client.models.list()
@@ -273,13 +467,28 @@ def setup():
     setup_openai_key()
 
 @app.command()
-def chat():
+def chat(
+    stream: bool = typer.Option(True, "--stream/--no-stream", help="Stream the response as it is generated"),
+    session: Optional[str] = typer.Option(None, "--session", "-s",
+                                          help="Named session to load and save history"),
+    context_tokens: Optional[int] = typer.Option(None, "--context-tokens",
+                                                 help="Token budget for conversation history"),
+    summarize: bool = typer.Option(False, "--summarize",
+                                   help="Summarize turns that no longer fit the budget"),
+    model: str = typer.Option(AUTO_MODEL, "--model", "-m", help="Model to use, or 'auto' to route by prompt"),
+    hedge: bool = typer.Option(
+        False, "--hedge", envvar="AI_BOT_HEDGE",
+        help="Send a second request when the first is unusually slow to start, "
+             "and use whichever answers first"
+    ),
+):
     """Start interactive chat mode."""
-    bot = AIBotAgent()
+    bot = create_agent(session=open_session(session), context_tokens=context_tokens, summarize=summarize,
+                       model=model, hedge=hedge_policy(hedge))
     display_banner()
     
-    console.print("\n[bold green]Interactive Chat Mode[/bold green]")
-    console.print("Type 'exit' to quit, 'clear' to clear history, 'help' for help\n")
+    display_heading("\n[bold green]Interactive Chat Mode[/bold green]")
+    display_heading("Type 'exit' to quit, 'clear' to clear history, 'help' for help\n")
     
     while True:
         try:
@@ -297,77 +506,586 @@ def chat():
             elif not user_input.strip():
                 continue
             
-            # Get AI response
-            response = bot.chat(user_input)
-            
-            # Display response
-            console.print(f"\n[bold green]AI Bot[/bold green]: {response}")
+            # Get AI response and display it
+            display_response(
+                bot, "AI Bot", stream,
+                lambda: bot.chat_stream(user_input),
+                lambda: bot.chat(user_input),
+                separator=": "
+            )
             
         except KeyboardInterrupt:
             console.print("\n[yellow]Goodbye! 👋[/yellow]")
             break
+        except typer.Exit:
+            continue  # The failed request was reported; keep chatting
         except Exception as e:
             console.print(f"[red]Error: {e}[/red]")
 
 @app.command()
 def ask(
-    question: str = typer.Argument(..., help="The question to ask the AI")
+    question: str = typer.Argument(..., help="The question to ask the AI"),
+    stream: bool = typer.Option(True, "--stream/--no-stream", help="Stream the response as it is generated"),
+    no_cache: bool = typer.Option(False, "--no-cache",
+                                  help="Always query the API instead of the response cache"),
+    semantic: bool = typer.Option(
+        False, "--semantic", envvar="AI_BOT_SEMANTIC_CACHE",
+        help="Also answer from the cache when a similar question was asked before"
+    ),
+    session: Optional[str] = typer.Option(None, "--session", "-s",
+                                          help="Named session to load and save history"),
+    context_tokens: Optional[int] = typer.Option(None, "--context-tokens",
+                                                 help="Token budget for conversation history"),
+    summarize: bool = typer.Option(False, "--summarize",
+                                   help="Summarize turns that no longer fit the budget"),
+    model: str = typer.Option(AUTO_MODEL, "--model", "-m", help="Model to use, or 'auto' to route by prompt"),
+    hedge: bool = typer.Option(
+        False, "--hedge", envvar="AI_BOT_HEDGE",
+        help="Send a second request when the first is unusually slow to start, "
+             "and use whichever answers first"
+    ),
+    repo: Optional[str] = typer.Option(
+        None, "--repo", help="Answer from the parts of this repository most relevant to the question"
+    ),
+    top_k: int = typer.Option(8, "--top-k", "-k", min=1, help="Repository excerpts sent with the question"),
 ):
     """Ask a single question to the AI."""
-    bot = AIBotAgent()
+    bot = create_agent(
+        cache=None if no_cache else ResponseCache(),
+        semantic_cache=open_semantic_cache() if semantic and not no_cache else None,
+        session=open_session(session),
+        context_tokens=context_tokens,
+        summarize=summarize,
+        model=model,
+        hedge=hedge_policy(hedge)
+    )
     display_banner()
     
-    console.print(f"\n[bold blue]Question:[/bold blue] {question}")
+    display_heading(f"\n[bold blue]Question:[/bold blue] {question}")
     
-    response = bot.chat(question)
-    console.print(f"\n[bold green]Answer:[/bold green] {response}")
+    if repo:
+        index = open_repo_index(repo)
+        display_response(bot, "Answer:", stream, lambda: bot.ask_repo_stream(question, index, top_k),
+                         lambda: bot.ask_repo(question, index, top_k))
+        return
+    display_response(bot, "Answer:", stream, lambda: bot.chat_stream(question), lambda: bot.chat(question))
 
 @app.command()
 def code(
     description: str = typer.Argument(..., help="Description of the code to generate"),
-    language: str = typer.Option("python", "--lang", "-l", help="Programming language")
+    language: str = typer.Option("python", "--lang", "-l", help="Programming language"),
+    stream: Optional[bool] = typer.Option(
+        None, "--stream/--no-stream",
+        help="Stream the response as it is generated (the default, except with --candidates or --test)"
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache",
+                                  help="Always query the API instead of the response cache"),
+    model: str = typer.Option(AUTO_MODEL, "--model", "-m", help="Model to use, or 'auto' to route by prompt"),
+    candidates: int = typer.Option(1, "--candidates", "-n", min=1, max=16,
+                                   help="Generate this many solutions in one request and keep the best"),
+    test: Optional[str] = typer.Option(
+        None, "--test", "-t",
+        help="Command that must pass for a candidate, e.g. 'pytest -q tests/' ({file}, {dir})"
+    ),
+    timeout: float = typer.Option(10.0, "--timeout", min=0.1,
+                                  help="Seconds allowed for each candidate's checks")
 ):
     """Generate code from a description."""
-    bot = AIBotAgent()
+    if (candidates > 1 or test) and stream:
+        console.print("[red]Error: --stream cannot be used with --candidates or --test; "
+                      "candidates are checked before one is shown[/red]")
+        raise typer.Exit(1)
+    bot = create_agent(cache=None if no_cache else ResponseCache(), model=model)
     display_banner()
     
-    console.print(f"\n[bold blue]Generating {language} code for:[/bold blue] {description}")
+    display_heading(f"\n[bold blue]Generating {language} code for:[/bold blue] {description}")
     
-    response = bot.generate_code(description, language)
-    console.print(f"\n[bold green]Generated Code:[/bold green]\n{response}")
+    if candidates > 1 or test:
+        generate_candidates(bot, description, language, candidates, test, timeout)
+        return
+    
+    display_response(
+        bot, "Generated Code:", stream is not False,
+        lambda: bot.generate_code_stream(description, language),
+        lambda: bot.generate_code(description, language),
+        separator="\n"
+    )
+
+def generate_candidates(bot: AIBotAgent, description: str, language: str, n: int, test: Optional[str],
+                        timeout: float):
+    """Generate and validate code candidates, show how each fared and display the best."""
+    import json
+    from rich.markup import escape
+    from rich.table import Table
+    
+    try:
+        result = bot.generate_code_candidates(description, language, n, test, timeout)
+    except Exception as e:
+        if not output_mode["json"]:
+            console.print(f"[red]Error: {escape(str(e))}[/red]")
+        raise typer.Exit(1)
+    
+    if output_mode["json"]:
+        print(json.dumps(result, ensure_ascii=False))
+    elif output_mode["quiet"]:
+        print(result["response"])
+    else:
+        table = Table(title=f"{len(result['candidates'])} candidates")
+        for column in ("#", "Syntax", "Lint", "Test", "Time", "Problem"):
+            table.add_column(column)
+        for candidate in result["candidates"]:
+            table.add_row(
+                str(candidate["index"] + 1),
+                candidate["syntax"],
+                "-" if candidate["lint"] is None else str(candidate["lint"]),
+                candidate["test"] or "-",
+                f"{candidate['seconds']:.2f}s",
+                escape((candidate["error"] or "").splitlines()[-1] if candidate["error"] else "")
+            )
+        console.print(table)
+        display_request_stats(bot)
+        if not result["passed"]:
+            console.print("[yellow]No candidate passed its checks; showing the closest one.[/yellow]")
+        number = result["candidates"][0]["index"] + 1
+        console.print(f"\n[bold green]Generated Code:[/bold green] [dim](candidate {number})[/dim]\n"
+                      f"{result['response']}")
+    if not result["passed"]:
+        raise typer.Exit(1)
 
 @app.command()
 def analyze(
-    file_path: str = typer.Argument(..., help="Path to the file to analyze")
+    paths: List[str] = typer.Argument(..., help="Files, directories or glob patterns to analyze"),
+    stream: bool = typer.Option(True, "--stream/--no-stream", help="Stream the response as it is generated"),
+    no_cache: bool = typer.Option(False, "--no-cache",
+                                  help="Always query the API instead of the response cache"),
+    concurrency: int = typer.Option(4, "--concurrency", "-c", min=1, help="Maximum chunk analyses in flight"),
+    incremental: bool = typer.Option(False, "--incremental", "-i",
+                                     help="Re-analyze only new or changed files"),
+    model: str = typer.Option(AUTO_MODEL, "--model", "-m", help="Model to use, or 'auto' to route by prompt")
 ):
-    """Analyze a file and provide insights."""
-    bot = AIBotAgent()
+    """Analyze files and provide insights."""
+    bot = create_agent(cache=None if no_cache else ResponseCache(), model=model)
     display_banner()
     
-    console.print(f"\n[bold blue]Analyzing file:[/bold blue] {file_path}")
+    display_heading(f"\n[bold blue]Analyzing:[/bold blue] {' '.join(paths)}")
+    
+    single = Path(paths[0])
+    small_file = single.is_file() and single.stat().st_size <= DEFAULT_CHUNK_BYTES
+    if not incremental and len(paths) == 1 and small_file:
+        display_response(
+            bot, "Analysis:", stream,
+            lambda: bot.analyze_file_stream(paths[0]),
+            lambda: bot.analyze_file(paths[0]),
+            separator="\n"
+        )
+        return
+    
+    try:
+        if headless():
+            result = bot.analyze_paths(paths, concurrency=concurrency, incremental=incremental)
+        else:
+            with console.status("[bold green]Analyzing...", spinner="dots") as status:
+                def progress(message: str):
+                    status.update(f"[bold green]{message}...")
+                
+                result = bot.analyze_paths(paths, concurrency=concurrency, incremental=incremental,
+                                           progress=progress)
+    except Exception as e:
+        # A missing file, a missing API key or a failed request
+        from rich.markup import escape
+        console.print(f"[red]Error: {escape(str(e))}[/red]")
+        raise typer.Exit(1)
+    
+    if output_mode["json"]:
+        import json
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    if output_mode["quiet"]:
+        print(result["report"])
+        return
     
-    response = bot.analyze_file(file_path)
-    console.print(f"\n[bold green]Analysis:[/bold green]\n{response}")
+    for path, reason in result["skipped"]:
+        console.print(f"[yellow]Skipped {path} ({reason})[/yellow]")
+    if incremental:
+        console.print(
+            f"[dim]{result['reused_files']} unchanged files reused, "
+            f"{len(result['files']) - result['reused_files']} analyzed[/dim]"
+        )
+    
+    from rich.markdown import Markdown
+    console.print("\n[bold green]Analysis:[/bold green]")
+    console.print(Markdown(result["report"]))
+
+@app.command()
+def batch(
+    input_file: Optional[str] = typer.Argument(None, help="JSONL or CSV file of prompts (default: stdin)"),
+    output: Optional[str] = typer.Option(None, "--output", "-o",
+                                         help="Write JSONL results to this file instead of stdout"),
+    concurrency: int = typer.Option(8, "--concurrency", "-c", min=1, help="Maximum requests in flight"),
+    model: str = typer.Option(AUTO_MODEL, "--model", "-m",
+                              help="Model for prompts that do not set one, or 'auto' to route"),
+    ordered: bool = typer.Option(True, "--ordered/--unordered",
+                                 help="Write results in input order or as they complete"),
+    retries: int = typer.Option(5, "--retries", min=0,
+                                help="Retries per prompt for rate limits and server errors"),
+    rpm: Optional[float] = typer.Option(
+        None, "--rpm", help="Client-side limit on requests per minute (default: AI_BOT_RPM)"
+    ),
+    tpm: Optional[float] = typer.Option(None, "--tpm",
+                                        help="Client-side limit on tokens per minute (default: AI_BOT_TPM)"),
+    no_cache: bool = typer.Option(False, "--no-cache",
+                                  help="Always query the API instead of the response cache")
+):
+    """Run many prompts concurrently from a file or stdin."""
+    from ai_bot_agent.batch import read_prompts, run_batch
+    from ai_bot_agent.prompts import SYSTEM_PROMPT
+    
+    err_console = Console(stderr=True)
+    provider = current_provider()
+    if not provider.api_key:
+        err_console.print("[red]Error: OPENAI_API_KEY not found in environment variables.[/red]")
+        raise typer.Exit(1)
+    
+    source = open(input_file, newline="", encoding="utf-8") if input_file and input_file != "-" else sys.stdin
+    sink = open(output, "w", encoding="utf-8") if output else sys.stdout
+    start = time.perf_counter()
+    try:
+        records = read_prompts(source, csv_format=bool(input_file and input_file.endswith(".csv")))
+        runner = run_batch(
+            records,
+            sink,
+            SYSTEM_PROMPT,
+            model=model,
+            concurrency=concurrency,
+            retries=retries,
+            ordered=ordered,
+            cache=None if no_cache else ResponseCache(),
+            requests_per_minute=rpm,
+            tokens_per_minute=tpm,
+            provider=provider
+        )
+    except ValueError as e:
+        err_console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    
+    summary = (
+        f"[green]Completed {runner.completed} prompts[/green]"
+        + (f", [red]{runner.failed} failed[/red]" if runner.failed else "")
+        + f" in {time.perf_counter() - start:.1f}s"
+    )
+    scheduler_stats = runner.scheduler.stats()
+    if scheduler_stats["retries"] or scheduler_stats["waited_seconds"]:
+        summary += (f" ({scheduler_stats['retries']} retries, "
+                    f"{scheduler_stats['waited_seconds']:.1f}s throttled)")
+    err_console.print(summary)
+    if runner.failed:
+        raise typer.Exit(1)
+
+@app.command("stub-server")
+def stub_server(
+    host: str = typer.Option("127.0.0.1", "--host", help="Address to listen on"),
+    port: int = typer.Option(8089, "--port", "-p", help="Port to listen on"),
+    latency: float = typer.Option(0.2, "--latency", min=0, help="Seconds before the first token"),
+    tokens_per_second: float = typer.Option(100.0, "--tokens-per-second", min=0.001,
+                                            help="Rate of the remaining tokens"),
+    response_tokens: int = typer.Option(64, "--response-tokens", min=1,
+                                        help="Tokens per answer (capped by max_tokens)"),
+    error_rate: float = typer.Option(0.0, "--error-rate", min=0, max=1,
+                                     help="Fraction of requests answered with 429 or 500"),
+    seed: int = typer.Option(0, "--seed", help="Seed for simulated errors")
+):
+    """Run a deterministic OpenAI-compatible stub server for load tests."""
+    from ai_bot_agent.stub_server import StubServer
+    
+    server = StubServer(host, port, latency=latency, tokens_per_second=tokens_per_second,
+                        response_tokens=response_tokens, error_rate=error_rate, seed=seed)
+    console.print(f"[green]Stub server listening on {server.base_url}[/green] (use --provider stub)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("\n[yellow]Stopped.[/yellow]")
+
+@app.command()
+def daemon(
+    workers: int = typer.Option(4, "--workers", "-w", min=1, help="Commands served at the same time"),
+    socket: Optional[str] = typer.Option(None, "--socket",
+                                         help="Unix socket to listen on (default: AI_BOT_SOCKET)"),
+    status: bool = typer.Option(False, "--status", help="Show whether a daemon is running and exit"),
+    stop: bool = typer.Option(False, "--stop", help="Stop the running daemon and exit")
+):
+    """Keep the agent warm in the background so other commands start instantly."""
+    import json
+    from ai_bot_agent import daemon as daemon_mode
+    
+    path = socket or daemon_mode.socket_path()
+    if stop:
+        if not daemon_mode.stop(path):
+            console.print(f"[yellow]No daemon is running on {path}.[/yellow]")
+            raise typer.Exit(1)
+        console.print("[green]Daemon stopped.[/green]")
+        return
+    if status:
+        info = daemon_mode.status(path)
+        if info is None:
+            console.print(f"[yellow]No daemon is running on {path}.[/yellow]")
+            raise typer.Exit(1)
+        if output_mode["json"]:
+            print(json.dumps(info))
+            return
+        console.print(f"[green]Daemon running[/green] (pid {info['pid']}, {info['workers']} workers, "
+                      f"up {info['uptime']:.0f}s) on {info['socket']}")
+        return
+    
+    def ready(server):
+        console.print(f"[green]Daemon listening on {server.path}[/green] with {server.workers} workers "
+                      "(stop with Ctrl-C or `ai-bot daemon --stop`)")
+    
+    try:
+        daemon_mode.Daemon(path, workers).serve_forever(ready)
+    except RuntimeError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+    console.print("\n[yellow]Stopped.[/yellow]")
+
+@app.command("index")
+def index_documents(
+    paths: Optional[List[str]] = typer.Argument(None, help="Files, directories or glob patterns to index"),
+    index_path: Optional[str] = typer.Option(None, "--index", envvar="AI_BOT_SEARCH_INDEX",
+                                             help="Index directory"),
+    optimize: bool = typer.Option(False, "--optimize", help="Merge the index into one segment"),
+    clear_index: bool = typer.Option(False, "--clear", help="Remove every document from the index")
+):
+    """Build or update the local search index used by `search`."""
+    import json
+    from ai_bot_agent.search import SearchIndex
+    
+    search_index = SearchIndex(Path(index_path) if index_path else None)
+    if clear_index:
+        console.print(f"[green]Removed {search_index.clear()} documents from the index.[/green]")
+        return
+    result: Dict[str, Any] = {}
+    start = time.perf_counter()
+    try:
+        if paths:
+            if headless():
+                result = search_index.update(paths)
+            else:
+                with console.status("[bold green]Indexing...", spinner="dots") as status:
+                    result = search_index.update(paths, progress=lambda message: status.update(
+                        f"[bold green]{message}..."))
+        if optimize:
+            search_index.optimize()
+    except FileNotFoundError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+    stats = search_index.stats()
+    
+    if output_mode["json"]:
+        print(json.dumps({**result, "index": stats}))
+        return
+    for path, reason in result.get("skipped", []):
+        if not output_mode["quiet"]:
+            console.print(f"[yellow]Skipped {path} ({reason})[/yellow]")
+    if result:
+        console.print(
+            f"[green]Indexed {result['added']} new and {result['updated']} changed files[/green], "
+            f"{result['unchanged']} unchanged, {result['removed']} removed "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+    console.print(
+        f"[dim]{stats['documents']} documents · {stats['terms']} terms in {stats['segments']} segments · "
+        f"{stats['index_bytes'] / 1024 / 1024:.1f} MB · {stats['path']}[/dim]"
+    )
 
 @app.command()
 def search(
-    query: str = typer.Argument(..., help="Search query")
+    query: str = typer.Argument(..., help="Search query"),
+    limit: int = typer.Option(10, "--limit", "-n", min=1, help="Number of results"),
+    summarize: bool = typer.Option(False, "--summarize", help="Have the AI summarize the top results"),
+    stream: bool = typer.Option(True, "--stream/--no-stream", help="Stream the summary as it is generated"),
+    index_path: Optional[str] = typer.Option(None, "--index", envvar="AI_BOT_SEARCH_INDEX",
+                                             help="Index directory"),
+    model: str = typer.Option(AUTO_MODEL, "--model", "-m",
+                              help="Model for the summary, or 'auto' to route by prompt")
 ):
-    """Search the web for information."""
-    bot = AIBotAgent()
+    """Search documents indexed with `index`."""
+    import json
+    from rich.markup import escape
+    from ai_bot_agent.search import SearchIndex
+    
+    bot = create_agent(model=model)
     display_banner()
     
-    console.print(f"\n[bold blue]Searching for:[/bold blue] {query}")
+    display_heading(f"\n[bold blue]Searching for:[/bold blue] {query}")
     
-    response = bot.search_web(query)
-    console.print(f"\n[bold green]Search Results:[/bold green]\n{response}")
+    start = time.perf_counter()
+    search_index = SearchIndex(Path(index_path) if index_path else None)
+    hits = bot.search(query, limit, search_index)
+    elapsed = time.perf_counter() - start
+    
+    if output_mode["json"]:
+        print(json.dumps(hits, ensure_ascii=False))
+    elif output_mode["quiet"]:
+        for hit in hits:
+            print(f"{hit['path']}:{hit['line']}: {hit['snippet']}")
+    elif not hits:
+        empty = ""
+        if not search_index.stats()["documents"]:
+            empty = " The index is empty; add documents with `ai-bot index <dir>`."
+        console.print(f"\n[yellow]No results.{empty}[/yellow]")
+    else:
+        console.print(f"\n[bold green]Search Results:[/bold green] "
+                      f"[dim]{len(hits)} in {elapsed * 1000:.1f} ms[/dim]")
+        for number, hit in enumerate(hits, 1):
+            console.print(f"{number:>3}. [cyan]{hit['path']}[/cyan]:{hit['line']} "
+                          f"[dim]({hit['score']:.2f})[/dim]")
+            if hit["snippet"]:
+                console.print(f"     {escape(hit['snippet'])}")
+    
+    if summarize and hits:
+        display_response(
+            bot, "Summary:", stream,
+            lambda: bot.summarize_search_stream(query, hits),
+            lambda: bot.summarize_search(query, hits),
+            separator="\n"
+        )
 
 @app.command()
-def clear():
+def clear(
+    session: Optional[str] = typer.Option(None, "--session", "-s", help="Named session to clear")
+):
     """Clear conversation history."""
-    bot = AIBotAgent()
+    bot = create_agent(session=open_session(session))
     bot.clear_history()
 
+@app.command()
+def sessions():
+    """List saved conversation sessions."""
+    store = SessionStore()
+    names = store.names()
+    if not names:
+        console.print("[yellow]No saved sessions.[/yellow]")
+        return
+    for name in names:
+        console.print(f"[green]{name}[/green] - {len(store.get(name))} messages")
+
+@app.command()
+def stats(
+    since: str = typer.Option("24h", "--since", help="Time window to report, e.g. 30m, 24h, 7d or all"),
+    model: Optional[str] = typer.Option(None, "--model", "-m", help="Only report this model"),
+    openmetrics_output: bool = typer.Option(False, "--openmetrics",
+                                            help="Print the report in OpenMetrics text format"),
+    clear_log: bool = typer.Option(False, "--clear", help="Delete all recorded requests")
+):
+    """Show latency, throughput and cost of recent requests per model."""
+    import json
+    from rich.table import Table
+    from ai_bot_agent.telemetry import TelemetryLog, parse_window, openmetrics
+    
+    log = TelemetryLog()
+    if clear_log:
+        console.print(f"[green]Removed {log.clear()} recorded requests.[/green]")
+        return
+    try:
+        summaries = log.summary(parse_window(since), model)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    
+    if openmetrics_output:
+        sys.stdout.write(openmetrics(summaries))
+        return
+    if output_mode["json"]:
+        print(json.dumps(summaries))
+        return
+    if not summaries:
+        console.print(f"[yellow]No requests recorded in the last {since}.[/yellow] ({log.path})")
+        return
+    
+    table = Table(title=f"Requests in the last {since}" if since != "all" else "All recorded requests")
+    for column in ("Model", "Requests", "Errors", "Cached", "Retries", "p50", "p95", "p99",
+                   "TTFT p50", "tok/s", "Tokens in / out", "Cost"):
+        table.add_column(column, justify="left" if column == "Model" else "right")
+    for name, summary in summaries.items():
+        latency = summary["latency"]
+        cost = summary["cost_usd"]
+        table.add_row(
+            name,
+            str(summary["requests"]),
+            str(summary["errors"]),
+            str(summary["cache_hits"]),
+            str(summary["retries"]),
+            f"{latency['0.5']:.2f}s",
+            f"{latency['0.95']:.2f}s",
+            f"{latency['0.99']:.2f}s",
+            f"{summary['time_to_first_token']['0.5']:.2f}s",
+            f"{summary['tokens_per_second']:.1f}",
+            f"{summary['prompt_tokens']} / {summary['completion_tokens']}",
+            f"${cost:.4f}" if cost is not None else "-"
+        )
+    console.print(table)
+    total_cost = sum(s["cost_usd"] for s in summaries.values() if s["cost_usd"] is not None)
+    coalesced = sum(s["coalesced"] for s in summaries.values())
+    shared = f" · {coalesced} requests shared an identical call in flight" if coalesced else ""
+    hedged = sum(s["hedged"] for s in summaries.values())
+    hedges = f" · {hedged} requests hedged (the losing duplicates are not priced)" if hedged else ""
+    console.print(f"[dim]Estimated cost: ${total_cost:.4f}{shared}{hedges} · {log.path}[/dim]")
+
+cache_app = typer.Typer(help="Inspect and maintain the response cache")
+app.add_typer(cache_app, name="cache")
+
+@cache_app.command("stats")
+def cache_stats():
+    """Show response cache statistics."""
+    from rich.table import Table
+    
+    stats = ResponseCache().stats()
+    table = Table(title="Response Cache", show_header=False)
+    table.add_row("Location", stats["path"])
+    table.add_row("Entries", str(stats["entries"]))
+    size = f"{stats['size_bytes'] / 1024:.1f} KiB of {stats['max_bytes'] / 1024 / 1024:.0f} MiB"
+    table.add_row("Size", size)
+    table.add_row("TTL", f"{stats['ttl_seconds'] / 3600:.1f} hours")
+    table.add_row("Hits / misses", f"{stats['hits']} / {stats['misses']} ({stats['hit_rate']:.0%})")
+    semantic = existing_semantic_cache()
+    if semantic is not None:
+        stats = semantic.stats()
+        table.add_section()
+        table.add_row("Semantic index", stats["path"])
+        table.add_row("Entries", f"{stats['entries']} of {stats['max_entries']} "
+                      f"({stats['index_bytes'] / 1024 / 1024:.1f} MiB, {stats['evictions']} evicted)")
+        table.add_row("Threshold", f"{stats['threshold']:.2f} cosine similarity")
+        table.add_row("Hits / misses", f"{stats['hits']} / {stats['misses']} ({stats['hit_rate']:.0%})")
+    console.print(table)
+
+def existing_semantic_cache() -> Any:
+    """Return the semantic cache if one has been created and can be opened, else None."""
+    from ai_bot_agent.semantic_cache import SemanticCache, default_embedder
+    
+    if not (cache_dir() / "semantic").exists():
+        return None
+    try:
+        return SemanticCache(default_embedder(current_provider()))
+    except (ImportError, ValueError):
+        return None
+
+@cache_app.command("prune")
+def cache_prune(
+    all_entries: bool = typer.Option(False, "--all", help="Remove every cached response")
+):
+    """Remove expired and least recently used cache entries."""
+    cache = ResponseCache()
+    removed = cache.clear() if all_entries else cache.prune()
+    semantic = existing_semantic_cache()
+    if semantic is not None:
+        removed += semantic.clear() if all_entries else semantic.prune()
+    console.print(f"[green]Removed {removed} cached responses.[/green]")
+
 @app.command()
 def help():
     """Show help information."""
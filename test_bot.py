@@ -110,6 +110,1518 @@ def test_help_command():
         print(f"❌ Help command test failed: {e}")
         return False
 
+def test_lazy_imports():
+    """Test that the help command does not import the OpenAI SDK or other heavy modules."""
+    print("\nTesting lazy imports...")
+    
+    try:
+        import subprocess
+        code = ("import sys, main; main.display_help(); "
+                "print([m for m in ('openai', 'asyncio', 'multiprocessing') if m in sys.modules])")
+        result = subprocess.run([sys.executable, "-c", code],
+                              capture_output=True, text=True, timeout=10)
+        
+        if result.returncode == 0 and result.stdout.strip().endswith("[]"):
+            print("✓ help does not import openai, asyncio or multiprocessing")
+            return True
+        else:
+            print(f"❌ Heavy modules were imported for help: {result.stdout.strip()[-200:]} {result.stderr}")
+            return False
+    except Exception as e:
+        print(f"❌ Lazy import test failed: {e}")
+        return False
+
+def test_shared_transport():
+    """Test that agents share pooled OpenAI clients built on the SDK's own HTTP library."""
+    print("\nTesting shared transport...")
+    
+    try:
+        import os
+        import subprocess
+        code = """
+import sys
+sys.modules["httpx"] = None  # Only the OpenAI SDK and the HTTP library it ships with
+import asyncio
+from ai_bot_agent import transport
+first = transport.shared_openai_client("key", "http://127.0.0.1:9/v1")
+again = transport.shared_openai_client("key", "http://127.0.0.1:9/v1")
+other = transport.shared_openai_client("key", "http://127.0.0.1:8/v1")
+pool = getattr(getattr(first._client, "_transport", None), "_pool", None)
+print(first is again, first is not other, getattr(pool, "_max_connections", 3))
+async def pair():
+    return transport.shared_async_openai_client("key") is transport.shared_async_openai_client("key")
+print(asyncio.run(pair()))
+transport.http_library = lambda: None
+print(transport.shared_openai_client("key", "http://127.0.0.1:7/v1").timeout)
+transport.close_shared_clients()
+"""
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.resolve()), AI_BOT_MAX_CONNECTIONS="3",
+                   AI_BOT_TIMEOUT="42")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=30,
+                                env=env)
+        if result.returncode != 0:
+            print(f"❌ Creating the shared client failed: {result.stderr.strip()[-500:]}")
+            return False
+        lines = result.stdout.split()
+        if lines[:4] != ["True", "True", "3", "True"]:
+            print(f"❌ Clients are not shared per key and event loop, or ignore the pool limits: {lines}")
+            return False
+        print("✓ Clients are pooled and shared without the httpx package")
+        
+        if float(lines[4]) != 42.0:
+            print(f"❌ The timeout was lost without a pooled client: {lines[4]}")
+            return False
+        print("✓ Without the SDK's HTTP library, the default client keeps the configured timeout")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Shared transport test failed: {e}")
+        return False
+
+def test_response_cache():
+    """Test response cache round trips and LRU eviction."""
+    print("\nTesting response cache...")
+    
+    try:
+        import tempfile
+        from ai_bot_agent.cache import ResponseCache, request_key
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(Path(tmp) / "responses.sqlite", ttl=60, max_bytes=10)
+            key = request_key("gpt-3.5-turbo", "system", [{"role": "user", "content": "hi"}], 0.7, 1000)
+            cache.put(key, "hello")
+            if cache.get(key) != "hello":
+                print("❌ Cached response not returned")
+                return False
+            print("✓ Cached response returned")
+            
+            cache.put("other", "a longer response")
+            if cache.get(key) is not None or cache.stats()["entries"] != 0:
+                print("❌ Cache was not kept under its size limit")
+                return False
+            print("✓ Least recently used entries evicted")
+            cache.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Response cache test failed: {e}")
+        return False
+
+def test_semantic_cache():
+    """Test that similar questions are answered from the semantic cache."""
+    print("\nTesting semantic cache...")
+    
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("✓ Skipped (NumPy not installed)")
+        return True
+    
+    try:
+        import types
+        import tempfile
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        from ai_bot_agent.semantic_cache import SemanticCache, HashingEmbedder
+        
+        calls = []
+        
+        def create(model, messages, **kwargs):
+            calls.append(messages[-1]["content"])
+            message = types.SimpleNamespace(content=f"Answer {len(calls)}")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SemanticCache(HashingEmbedder(), Path(tmp) / "semantic", threshold=0.8, max_entries=2)
+            
+            def ask(question, model="gpt-4o"):
+                bot = AIBotAgent(client=client, semantic_cache=cache, scheduler=RequestScheduler(),
+                                 model=model,
+                                 telemetry=TelemetryLog(Path(tmp) / "telemetry.jsonl", enabled=False))
+                return bot.chat(question)
+            
+            first = ask("What is the Python programming language?")
+            if ask("what is the python programming language") != first or len(calls) != 1:
+                print(f"❌ A paraphrase was not answered from the cache: {calls}")
+                return False
+            print("✓ Similar questions share an answer")
+            
+            ask("How do I bake sourdough bread?")
+            ask("What is the Python programming language?", model="gpt-4o-mini")
+            if len(calls) != 3:
+                print(f"❌ Unrelated questions or other models were answered from the cache: {calls}")
+                return False
+            print("✓ Different questions and models are not matched")
+            
+            stats = cache.stats()
+            if stats["entries"] != 2 or stats["evictions"] != 1 or stats["hits"] != 1 or stats["misses"] != 3:
+                print(f"❌ Unexpected semantic cache stats {stats}")
+                return False
+            if ask("What is the Python programming language?") == first:
+                print("❌ The least recently used entry was not evicted")
+                return False
+            print("✓ The index stays bounded, evicting the least recently used entry")
+            cache.close()
+            
+            cache = SemanticCache(HashingEmbedder(), Path(tmp) / "semantic", threshold=0.8, max_entries=2)
+            answered = len(calls)
+            ask("What is the Python programming language")
+            if len(calls) != answered:
+                print("❌ The index did not persist")
+                return False
+            print("✓ The index persists between runs")
+            cache.close()
+            
+            resized = SemanticCache(HashingEmbedder(dimensions=64), Path(tmp) / "semantic", threshold=0.8)
+            resized.put("scope", "question", "answer")
+            if resized.stats()["entries"] != 1 or resized.get("scope", "question?") != "answer":
+                print("❌ Changing the embedder did not reset the index")
+                return False
+            print("✓ Switching embedders rebuilds the index")
+            resized.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Semantic cache test failed: {e}")
+        return False
+
+def test_repo_retrieval():
+    """Test that a repository is embedded incrementally and searched by similarity."""
+    print("\nTesting repository retrieval...")
+    
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("✓ Skipped (NumPy not installed)")
+        return True
+    
+    try:
+        import os
+        import tempfile
+        from ai_bot_agent.repo import RepoIndex
+        from ai_bot_agent.semantic_cache import HashingEmbedder
+        from ai_bot_agent.prompts import build_repo_prompt
+        
+        embedded = []
+        hashing = HashingEmbedder(256)
+        
+        def embedder(texts):
+            embedded.extend(texts)
+            return hashing(texts)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = Path(tmp) / "repo"
+            (repo / "src").mkdir(parents=True)
+            retry = repo / "src" / "retry.py"
+            retry.write_text("def retry_with_backoff(attempts):\n    return attempts * 2\n")
+            (repo / "src" / "parser.py").write_text("def parse_config(text):\n    return text.split()\n")
+            (repo / "README.md").write_text("# Demo\n" + "Unrelated documentation line.\n" * 300)
+            index = RepoIndex(repo, embedder, path=Path(tmp) / "index", chunk_bytes=512)
+            
+            result = index.update()
+            chunks = index.search("how does retry backoff work", k=1)
+            if (result["files"] != 3 or not chunks
+                    or chunks[0]["path"] != "src/retry.py" or chunks[0]["line"] != 1):
+                print(f"❌ Unexpected retrieval: {result} {chunks}")
+                return False
+            prompt = build_repo_prompt("how does retry backoff work", chunks)
+            if "retry_with_backoff" not in prompt or "Unrelated" in prompt:
+                print("❌ The prompt should only carry the retrieved chunks")
+                return False
+            print("✓ The most relevant chunk is retrieved and sent alone")
+            
+            first_run = len(embedded)
+            embedded.clear()
+            with open(repo / "README.md", "a") as f:
+                f.write("A new closing line.\n")
+            os.remove(repo / "src" / "parser.py")
+            result = index.update()
+            if result["changed"] != 1 or result["removed"] != 1 or not 0 < len(embedded) < first_run - 1:
+                print(f"❌ Expected only the changed chunk to be embedded again: {result}, "
+                      f"{len(embedded)} of {first_run}")
+                return False
+            found = [c["path"] for c in index.search("parse config", k=5)]
+            if index.stats()["files"] != 2 or "src/parser.py" in found:
+                print("❌ A removed file is still searchable")
+                return False
+            print("✓ Only changed chunks are embedded again and removed files are dropped")
+            
+            embedded.clear()
+            index.embedder = HashingEmbedder(128)
+            retry.write_text("def retry_with_backoff(attempts):\n    return attempts * 3\n")
+            result = index.update()
+            stats = index.stats()
+            if result["reused"] + result["embedded"] != stats["chunks"] or stats["dimensions"] != 128:
+                print(f"❌ Changing the embedder did not re-embed the repository: {result}")
+                return False
+            print("✓ A new embedder re-embeds the repository")
+            index.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Repository retrieval test failed: {e}")
+        return False
+
+def test_session_store():
+    """Test that sessions persist messages and load only the tail."""
+    print("\nTesting session store...")
+    
+    try:
+        import tempfile
+        from ai_bot_agent.sessions import SessionStore
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            session = SessionStore(Path(tmp)).get("project")
+            for i in range(100):
+                session.append({"role": "user", "content": f"message {i}"})
+            
+            tail = session.tail(3)
+            if [m["content"] for m in tail] != ["message 97", "message 98", "message 99"]:
+                print(f"❌ Unexpected session tail: {tail}")
+                return False
+            print("✓ Session tail loaded")
+            
+            session.clear()
+            if len(session) != 0 or session.tail(3):
+                print("❌ Session not cleared")
+                return False
+            print("✓ Session cleared")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Session store test failed: {e}")
+        return False
+
+def test_context_window():
+    """Test that the context window stays within its token budget."""
+    print("\nTesting context window...")
+    
+    try:
+        from ai_bot_agent.context import ContextWindow
+        
+        summaries = []
+        def summarizer(summary, messages):
+            summaries.append(len(messages))
+            return "summary"
+        
+        window = ContextWindow(max_tokens=100, summarizer=summarizer, counter=lambda text: len(text.split()))
+        for i in range(50):
+            window.append({"role": "user", "content": "word " * 10})
+        
+        if window.total_tokens > 100:
+            print(f"❌ Context window over budget: {window.total_tokens} tokens")
+            return False
+        print("✓ Context window within budget")
+        
+        messages = window.render("system", "hello")
+        if messages[1]["role"] != "system" or "summary" not in messages[1]["content"] or not summaries:
+            print("❌ Dropped turns were not summarized")
+            return False
+        print("✓ Dropped turns summarized")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Context window test failed: {e}")
+        return False
+
+def test_chunked_analysis():
+    """Test file chunking, binary sniffing and map-reduce analysis."""
+    print("\nTesting chunked analysis...")
+    
+    try:
+        import tempfile
+        from ai_bot_agent.analysis import FileAnalyzer, iter_chunks
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            text_file = Path(tmp) / "app.log"
+            text_file.write_text("".join(f"line {i}\n" for i in range(1000)))
+            (Path(tmp) / "image.bin").write_bytes(b"\x89PNG\0\0data")
+            (Path(tmp) / "missing.txt").symlink_to(Path(tmp) / "deleted.txt")
+            
+            chunks = list(iter_chunks(text_file, chunk_bytes=500))
+            if "".join(chunks) != text_file.read_text() or max(len(c) for c in chunks) > 500:
+                print("❌ Chunks do not cover the file within the size limit")
+                return False
+            print(f"✓ File split into {len(chunks)} chunks")
+            
+            prompts = []
+            def complete(prompt):
+                prompts.append(prompt)
+                return "notes"
+            
+            result = FileAnalyzer(complete, chunk_bytes=500).analyze([tmp])
+            if result["skipped"] != [(str(Path(tmp) / "image.bin"), "binary"),
+                                     (str(Path(tmp) / "missing.txt"), "No such file or directory")]:
+                print(f"❌ Binary file or broken symlink not skipped: {result['skipped']}")
+                return False
+            print("✓ Binary file and broken symlink skipped")
+            
+            if result["report"] != "notes" or len(prompts) != len(chunks) + 1:
+                print("❌ Chunk analyses were not merged into one report")
+                return False
+            print("✓ Chunk analyses merged")
+            
+            class NoteCache(dict):
+                put = dict.__setitem__
+            
+            notes = NoteCache()
+            FileAnalyzer(complete, chunk_bytes=500, note_cache=notes).analyze([str(text_file)])
+            text_file.write_text("inserted\n" + text_file.read_text())
+            result = FileAnalyzer(complete, chunk_bytes=500, note_cache=notes).analyze([str(text_file)])
+            if result["analyzed_chunks"] > 2 or result["reused_chunks"] < len(chunks) - 2:
+                print(f"❌ Unchanged chunks were re-analyzed: {result['analyzed_chunks']} analyzed")
+                return False
+            print("✓ Only changed chunks re-analyzed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Chunked analysis test failed: {e}")
+        return False
+
+def test_analysis_index():
+    """Test that incremental analysis only re-queries changed files."""
+    print("\nTesting analysis index...")
+    
+    try:
+        import tempfile
+        from ai_bot_agent.analysis import FileAnalyzer
+        from ai_bot_agent.index import AnalysisIndex
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("a.py", "b.py", "c.py"):
+                (Path(tmp) / name).write_text(f"# {name}\n")
+            index = AnalysisIndex(Path(tmp) / "index" / "analysis.sqlite")
+            
+            prompts = []
+            def complete(prompt):
+                prompts.append(prompt)
+                return f"report {len(prompts)}"
+            
+            FileAnalyzer(complete, index=index).analyze([str(Path(tmp) / "*.py")])
+            (Path(tmp) / "b.py").write_text("# changed\n")
+            prompts.clear()
+            result = FileAnalyzer(complete, index=index).analyze([str(Path(tmp) / "*.py")])
+            
+            if result["reused_files"] != 2 or len(prompts) != 2 or len(result["files"]) != 3:
+                print(f"❌ Expected one file and the summary to be re-analyzed, got {len(prompts)} requests")
+                return False
+            print("✓ Only the changed file was re-analyzed")
+            index.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Analysis index test failed: {e}")
+        return False
+
+def test_search_index():
+    """Test BM25 search over an incrementally updated index."""
+    print("\nTesting search index...")
+    
+    try:
+        import os
+        import tempfile
+        from ai_bot_agent.search import SearchIndex
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            docs = Path(tmp) / "docs"
+            docs.mkdir()
+            (docs / "pool.md").write_text("Connection pooling\nReuse HTTP connections across requests.\n")
+            (docs / "cache.md").write_text("The response cache stores answers.\nCache entries expire.\n")
+            (docs / "notes.txt").write_text("Unrelated notes about gardening.\n")
+            (docs / "blob.bin").write_bytes(b"\0binary")
+            index = SearchIndex(Path(tmp) / "index")
+            
+            result = index.update([str(docs)])
+            hits = index.search("cache entries", limit=5)
+            names = [Path(h["path"]).name for h in hits]
+            if result["added"] != 3 or len(result["skipped"]) != 1 or names != ["cache.md"]:
+                print(f"❌ Unexpected indexing or ranking: {result} {hits}")
+                return False
+            if hits[0]["line"] != 2 or hits[0]["snippet"] != "Cache entries expire.":
+                print(f"❌ Unexpected snippet {hits[0]}")
+                return False
+            print("✓ Documents are indexed and ranked with a matching line")
+            
+            (docs / "notes.txt").write_text("Notes on the connection cache.\n")
+            os.remove(docs / "pool.md")
+            result = index.update([str(docs)])
+            hits = [Path(h["path"]).name for h in index.search("connection")]
+            counts = (result["updated"], result["unchanged"], result["removed"])
+            if counts != (1, 1, 1) or hits != ["notes.txt"]:
+                print(f"❌ Incremental update went wrong: {result} {hits}")
+                return False
+            print("✓ Only changed files are re-read and removed files are dropped")
+            
+            index.optimize()
+            stats = index.stats()
+            hits = [Path(h["path"]).name for h in index.search("cache")]
+            if (stats["segments"] != 1 or stats["documents"] != 2 or stats["deleted"]
+                    or sorted(hits) != ["cache.md", "notes.txt"]):
+                print(f"❌ Merging segments changed the results: {stats} {hits}")
+                return False
+            print("✓ Segments merge without losing documents")
+            index.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Search index test failed: {e}")
+        return False
+
+def test_batch_runner():
+    """Test that batches keep their order, survive bad records and respect the concurrency limit."""
+    print("\nTesting batch runner...")
+    
+    try:
+        import io
+        import json
+        import types
+        import asyncio
+        from ai_bot_agent.batch import BatchRunner
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        
+        state = {"active": 0, "peak": 0, "slow_done": False, "ahead": 0}
+        
+        async def create(model, messages, **kwargs):
+            prompt = messages[-1]["content"]
+            if not state["slow_done"]:
+                state["ahead"] = max(state["ahead"], int(prompt))
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            try:
+                await asyncio.sleep(0.3 if prompt == "0" else 0.01)
+                message = types.SimpleNamespace(content=f"answer {prompt}")
+                return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+            finally:
+                state["active"] -= 1
+                state["slow_done"] = state["slow_done"] or prompt == "0"
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        records = [{"prompt": str(i)} for i in range(20)]
+        records[5] = {"id": "broken"}  # No prompt
+        runner = BatchRunner(client, "system", model="gpt-4o", concurrency=3, retries=0,
+                             scheduler=RequestScheduler(), telemetry=TelemetryLog(enabled=False), window=6)
+        output = io.StringIO()
+        asyncio.run(asyncio.wait_for(runner.run(iter(records), output), timeout=10))
+        
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        if [row["index"] for row in rows] != list(range(20)):
+            print(f"❌ Results are missing or out of order: {[row['index'] for row in rows]}")
+            return False
+        print("✓ Results are written in input order")
+        
+        if (rows[5].get("id") != "broken" or "KeyError" not in rows[5].get("error", "")
+                or runner.completed != 19):
+            print(f"❌ A bad record was not reported as an error row: {rows[5]}")
+            return False
+        print("✓ A bad record becomes an error row without stopping the batch")
+        
+        if state["peak"] > 3 or state["ahead"] >= 6:
+            print(f"❌ Concurrency or reorder window exceeded: peak {state['peak']}, "
+                  f"started {state['ahead']}")
+            return False
+        print("✓ At most 3 requests run at once, and a slow prompt holds back the rest")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Batch runner test failed: {e}")
+        return False
+
+def test_agent_events():
+    """Test that the agent reports progress as events instead of printing."""
+    print("\nTesting agent events...")
+    
+    try:
+        import io
+        import types
+        from contextlib import redirect_stdout
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.events import CollectingSink
+        from ai_bot_agent.telemetry import TelemetryLog
+        
+        def create(model, messages, stream=False, **kwargs):
+            if stream:
+                return iter([types.SimpleNamespace(choices=[types.SimpleNamespace(
+                    delta=types.SimpleNamespace(content=word))]) for word in ("Hello", " there")])
+            usage = types.SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7)
+            message = types.SimpleNamespace(content="Hello there")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        events = CollectingSink()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            bot = AIBotAgent(client=client, sinks=[events], telemetry=TelemetryLog(enabled=False))
+            bot.chat("Hi")
+            "".join(bot.chat_stream("Hi again"))
+            bot.clear_history()
+        
+        types_seen = [event["type"] for event in events.events]
+        expected = ["started", "usage", "finished", "started", "token", "token", "finished",
+                    "history_cleared"]
+        if types_seen != expected or output.getvalue():
+            print(f"❌ Unexpected events {types_seen} or output {output.getvalue()!r}")
+            return False
+        print("✓ Events emitted without printing")
+        
+        def broken(model, messages, **kwargs):
+            raise ValueError("service unavailable")
+        
+        client.chat.completions.create = broken
+        events.events.clear()
+        for run in (lambda: bot.chat("Hi"), lambda: list(bot.chat_stream("Hi"))):
+            try:
+                answer = run()
+                print(f"❌ A failed request was returned as an answer: {answer!r}")
+                return False
+            except ValueError:
+                pass
+        if [event["type"] for event in events.events] != ["started", "error", "started", "error"]:
+            print(f"❌ Failures were not reported as error events: {events.events}")
+            return False
+        print("✓ Failed requests raise instead of answering")
+        
+        import subprocess
+        env = dict(os.environ, AI_BOT_RETRIES="0", AI_BOT_TELEMETRY="off", AI_BOT_DAEMON="off")
+        command = ["--provider", "stub", "--base-url", "http://127.0.0.1:9/v1",
+                   "ask", "Hi", "--model", "stub"]
+        result = subprocess.run([sys.executable, "-m", "ai_bot_agent.main"] + command + ["--no-cache"],
+                                env=env, capture_output=True, text=True, timeout=60)
+        if result.returncode != 1 or "Error:" not in result.stdout:
+            print(f"❌ A failed ask should report an error and exit 1: {result.returncode} {result.stdout}")
+            return False
+        print("✓ The CLI reports a failed request and exits with status 1")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Agent events test failed: {e}")
+        return False
+
+def test_async_agent():
+    """Test the async agent against a fake client, with cache and telemetry writes off the event loop."""
+    print("\nTesting async agent...")
+    
+    try:
+        import types
+        import asyncio
+        import tempfile
+        import threading
+        from pathlib import Path
+        from ai_bot_agent.async_agent import AsyncAIBotAgent
+        from ai_bot_agent.cache import ResponseCache
+        from ai_bot_agent.events import CollectingSink
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        
+        calls = []
+        
+        async def chunks():
+            for word in ("Hello", " there"):
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(
+                    delta=types.SimpleNamespace(content=word))])
+        
+        async def create(model, messages, stream=False, **kwargs):
+            calls.append(stream)
+            if stream:
+                return chunks()
+            usage = types.SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7)
+            message = types.SimpleNamespace(content="Hello there")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        
+        threads = []
+        
+        class ThreadRecordingCache(ResponseCache):
+            def get(self, key):
+                threads.append(("cache.get", threading.get_ident()))
+                return super().get(key)
+            
+            def put(self, key, response):
+                threads.append(("cache.put", threading.get_ident()))
+                super().put(key, response)
+        
+        class ThreadRecordingTelemetry(TelemetryLog):
+            def record(self, stats, error=False):
+                threads.append(("telemetry.record", threading.get_ident()))
+                super().record(stats, error)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        events = CollectingSink()
+        
+        async def run():
+            bot = AsyncAIBotAgent(client=client, cache=cache, sinks=[events], model="gpt-4o",
+                                  scheduler=RequestScheduler(), telemetry=telemetry)
+            answers = [await bot.chat("Hi")]
+            answers.append("".join([delta async for delta in bot.chat_stream("Hi again")]))
+            answers.append(await bot.complete("Standalone"))
+            answers.append(await bot.complete("Standalone"))
+            return answers, threading.get_ident(), len(bot.conversation_history)
+        
+        with tempfile.TemporaryDirectory() as temp:
+            cache = ThreadRecordingCache(Path(temp) / "responses.sqlite")
+            telemetry = ThreadRecordingTelemetry(Path(temp) / "requests.jsonl", enabled=True)
+            answers, loop_thread, history = asyncio.run(run())
+            cache.conn.close()
+            recorded = list(telemetry.read())
+        
+        if answers != ["Hello there"] * 4 or calls != [False, True, False] or history != 4:
+            print(f"❌ Unexpected answers {answers}, requests {calls} or history length {history}")
+            return False
+        types_seen = [event["type"] for event in events.events]
+        if types_seen != ["started", "usage", "finished", "started", "token", "token", "finished"]:
+            print(f"❌ Unexpected events {types_seen}")
+            return False
+        print("✓ Chat, streaming and cached completions work with an async client")
+        
+        if len(recorded) != 4 or not recorded[-1].get("cache_hit"):
+            print(f"❌ Expected three requests and a cache hit in telemetry, got {recorded}")
+            return False
+        blocking = [name for name, thread in threads if thread == loop_thread]
+        if not threads or blocking:
+            print(f"❌ Blocking I/O ran on the event loop: {blocking}")
+            return False
+        print("✓ Cache and telemetry I/O run off the event loop")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Async agent test failed: {e}")
+        return False
+
+def test_streaming_output():
+    """Test that streamed answers are rendered as Markdown as they arrive, with timing stats."""
+    print("\nTesting streaming output...")
+    
+    try:
+        import io
+        import time
+        import types
+        from contextlib import redirect_stdout
+        from rich.console import Console
+        import ai_bot_agent.main as cli
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        
+        words = ["Use **", "bold", "** text"]
+        
+        def chunks():
+            for word in words:
+                time.sleep(0.02)
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(
+                    delta=types.SimpleNamespace(content=word))])
+        
+        def create(model, messages, stream=False, **kwargs):
+            if stream:
+                return chunks()
+            message = types.SimpleNamespace(content="".join(words))
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        bot = AIBotAgent(client=client, scheduler=RequestScheduler(), model="gpt-4o",
+                         telemetry=TelemetryLog(enabled=False))
+        
+        received = []
+        
+        def stream():
+            for delta in bot.chat_stream("Hi"):
+                received.append(delta)
+                yield delta
+        
+        screen = io.StringIO()
+        console = cli.console
+        cli.console = Console(file=screen, width=80)
+        try:
+            cli.display_response(bot, "AI:", True, stream, lambda: bot.chat("Hi"))
+        finally:
+            cli.console = console
+        
+        output = screen.getvalue()
+        if received != words or "Use bold text" not in output or "**" in output:
+            print(f"❌ The stream was not rendered as Markdown: {output!r}")
+            return False
+        print("✓ Streamed deltas are rendered as Markdown")
+        
+        stats = bot.last_request_stats
+        if not 0 < stats["time_to_first_token"] < stats["total_time"] or stats["completion_tokens"] != 3:
+            print(f"❌ Unexpected streaming stats {stats}")
+            return False
+        if "First token:" not in output or "tokens/s" not in output:
+            print(f"❌ Timing stats were not shown: {output!r}")
+            return False
+        print("✓ Time to first token and tokens per second are reported")
+        
+        raw = io.StringIO()
+        cli.output_mode["quiet"] = True
+        try:
+            with redirect_stdout(raw):
+                cli.display_response(bot, "AI:", True, stream, lambda: bot.chat("Hi"))
+        finally:
+            cli.output_mode["quiet"] = False
+        if raw.getvalue() != "".join(words) + "\n":
+            print(f"❌ Quiet streaming should write the raw deltas: {raw.getvalue()!r}")
+            return False
+        print("✓ Quiet mode streams the raw text")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Streaming output test failed: {e}")
+        return False
+
+def test_request_scheduler():
+    """Test rate-limit retries and the requests-per-minute budget."""
+    print("\nTesting request scheduler...")
+    
+    try:
+        import types
+        import openai
+        from ai_bot_agent.scheduler import RequestScheduler, TokenBucket, parse_reset
+        
+        response = types.SimpleNamespace(status_code=429, headers={"retry-after": "0.01"}, request=None)
+        calls = []
+        def request():
+            calls.append(1)
+            if len(calls) < 3:
+                raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+            return "ok"
+        
+        scheduler = RequestScheduler(retries=3)
+        if scheduler.call(request) != "ok" or scheduler.stats()["rate_limited"] != 2:
+            print(f"❌ Expected two rate-limited retries, got {scheduler.stats()}")
+            return False
+        print("✓ Rate-limited requests are retried")
+        
+        bucket = TokenBucket(60)
+        waits = [bucket.reserve() for _ in range(62)]
+        if waits[59] != 0 or not 0.9 < waits[60] <= 1.0 or not 1.9 < waits[61] <= 2.0:
+            print(f"❌ Unexpected token bucket waits {waits[59:]}")
+            return False
+        print("✓ Requests beyond the per-minute budget are spaced out")
+        
+        if parse_reset("6m0s") != 360 or parse_reset("20ms") != 0.02:
+            print("❌ Rate-limit reset headers parsed incorrectly")
+            return False
+        print("✓ Rate-limit reset headers parsed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Request scheduler test failed: {e}")
+        return False
+
+def test_model_router():
+    """Test model tiers and fallback on timeouts."""
+    print("\nTesting model router...")
+    
+    try:
+        import openai
+        from ai_bot_agent.router import ModelRouter
+        from ai_bot_agent.scheduler import RequestScheduler
+        
+        router = ModelRouter(fast_models=["fast-a", "fast-b"], strong_models=["strong"], escalate_tokens=100)
+        if router.candidates([{"role": "user", "content": "Hi"}])[0] != "fast-a":
+            print("❌ Short prompts should use the fast tier")
+            return False
+        if router.candidates([{"role": "user", "content": "```\nx = 1\n```"}])[0] != "strong":
+            print("❌ Code-heavy prompts should use the strong tier")
+            return False
+        if router.candidates([{"role": "user", "content": "Hi"}], "chosen") != ["chosen"]:
+            print("❌ An explicit model should be used as is")
+            return False
+        print("✓ Prompts routed to the right tier")
+        
+        def request(model):
+            if model == "fast-a":
+                raise openai.APITimeoutError(request=None)
+            return f"answer from {model}"
+        
+        messages = [{"role": "user", "content": "Hi"}]
+        model, response = router.call(RequestScheduler(retries=3), messages, request, 10)
+        if model != "fast-b" or router.stats()["fast-a"]["error_rate"] != 1.0:
+            print(f"❌ Expected a fallback to fast-b, got {model}")
+            return False
+        if router.candidates([{"role": "user", "content": "Hi"}])[0] != "fast-b":
+            print("❌ The failing model should be tried last")
+            return False
+        print("✓ Timeouts fall back to the next model")
+        
+        from ai_bot_agent.providers import resolve_provider
+        from ai_bot_agent.stub_server import StubServer
+        
+        hi = [{"role": "user", "content": "Hi"}]
+        if ModelRouter(provider=resolve_provider("openai")).candidates(hi)[0] != "gpt-3.5-turbo":
+            print("❌ OpenAI should route between its preset tiers")
+            return False
+        with StubServer(port=0, latency=0.0) as server:
+            local = ModelRouter(provider=resolve_provider("vllm", server.base_url))
+            if local.candidates(hi) != ["stub"] or local.candidates(hi * 2000) != ["stub"]:
+                print(f"❌ A local server should route to the model it serves: {local.candidates(hi)}")
+                return False
+        try:
+            ModelRouter(provider=resolve_provider("ollama", "http://127.0.0.1:9/v1")).candidates(hi)
+            print("❌ A server that lists no models should not be routed to OpenAI models")
+            return False
+        except ValueError:
+            pass
+        print("✓ 'auto' uses the models the provider actually serves")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Model router test failed: {e}")
+        return False
+
+def test_stub_server():
+    """Test the deterministic OpenAI-compatible stub server."""
+    print("\nTesting stub server...")
+    
+    try:
+        import json
+        import urllib.request
+        from ai_bot_agent.stub_server import StubServer
+        from ai_bot_agent.providers import resolve_provider
+        
+        def post(url, payload):
+            request = urllib.request.Request(url + "/chat/completions", data=json.dumps(payload).encode(),
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request) as response:
+                return response.read().decode()
+        
+        messages = [{"role": "user", "content": "Hi"}]
+        with StubServer(port=0, latency=0.01, tokens_per_second=1000, response_tokens=8) as server:
+            first = json.loads(post(server.base_url, {"model": "stub", "messages": messages}))
+            second = json.loads(post(server.base_url, {"model": "stub", "messages": messages}))
+            streamed = post(server.base_url, {"model": "stub", "messages": messages, "stream": True})
+        
+        content = first["choices"][0]["message"]["content"]
+        if content != second["choices"][0]["message"]["content"] or first["usage"]["completion_tokens"] != 8:
+            print(f"❌ Expected the same 8-token answer twice, got {content!r}")
+            return False
+        print("✓ Answers are deterministic")
+        
+        deltas = [json.loads(line[6:])["choices"][0]["delta"].get("content", "")
+                  for line in streamed.splitlines() if line.startswith("data: {")]
+        if "".join(deltas) != content or not streamed.rstrip().endswith("data: [DONE]"):
+            print("❌ Streamed answer differs from the plain one")
+            return False
+        print("✓ Streaming matches the plain answer")
+        
+        provider = resolve_provider("stub", server.base_url)
+        if provider.base_url != server.base_url or provider.requires_key or not provider.api_key:
+            print(f"❌ Unexpected stub provider {provider}")
+            return False
+        print("✓ Stub provider needs no API key")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Stub server test failed: {e}")
+        return False
+
+def test_telemetry():
+    """Test request telemetry recording, rotation and summaries."""
+    print("\nTesting telemetry...")
+    
+    try:
+        import types
+        import tempfile
+        from pathlib import Path
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.cache import ResponseCache
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog, DEFAULT_PRICES, summarize, openmetrics, parse_window
+        
+        calls = []
+        
+        def create(model, messages, **kwargs):
+            calls.append(model)
+            if len(calls) == 2:
+                raise ValueError("boom")
+            usage = types.SimpleNamespace(prompt_tokens=1000, completion_tokens=500, total_tokens=1500)
+            message = types.SimpleNamespace(content="Answer")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        with tempfile.TemporaryDirectory() as tmp:
+            log = TelemetryLog(Path(tmp) / "telemetry.jsonl", enabled=True)
+            bot = AIBotAgent(client=client, cache=ResponseCache(Path(tmp) / "cache.sqlite"), telemetry=log,
+                             scheduler=RequestScheduler(retries=0), model="gpt-4o")
+            bot.complete("first")
+            try:
+                bot.complete("second")
+            except ValueError:
+                pass
+            bot.complete("first")
+            records = list(log.read())
+            
+            outcomes = [(r.get("error", False), r["cache_hit"]) for r in records]
+            if outcomes != [(False, False), (True, False), (False, True)]:
+                print(f"❌ Unexpected telemetry records {records}")
+                return False
+            print("✓ Successes, failures and cache hits are recorded")
+            
+            summary = log.summary(parse_window("1h"))["gpt-4o"]
+            if summary["requests"] != 3 or summary["errors"] != 1 or abs(summary["cost_usd"] - 0.0075) > 1e-9:
+                print(f"❌ Unexpected summary {summary}")
+                return False
+            print("✓ Summary counts requests, errors and cost")
+            
+            small = TelemetryLog(Path(tmp) / "small.jsonl", max_bytes=300, enabled=True)
+            for _ in range(10):
+                small.record({"model": "m", "total_time": 0.1})
+            if (not small.backup_path.exists() or small.path.stat().st_size > 300
+                    or len(list(small.read())) != 10):
+                print("❌ Telemetry file was not rotated")
+                return False
+            print("✓ Metrics file rotates at its size cap")
+        
+        records = [{"model": "m", "total_time": t / 100, "time_to_first_token": 0.0, "completion_tokens": 1}
+                   for t in range(1, 101)]
+        latency = summarize(records, DEFAULT_PRICES)["m"]["latency"]
+        text = openmetrics(summarize(records, DEFAULT_PRICES))
+        if (abs(latency["0.5"] - 0.505) > 1e-9 or abs(latency["0.99"] - 0.9901) > 1e-9
+                or not text.endswith("# EOF\n")):
+            print(f"❌ Unexpected percentiles {latency}")
+            return False
+        if 'ai_bot_request_latency_seconds{model="m",quantile="0.95"}' not in text:
+            print("❌ OpenMetrics export is missing latency quantiles")
+            return False
+        if "counter" in text or "_total{" in text:
+            print("❌ Values over a sliding window must not be exported as counters")
+            return False
+        print("✓ Percentiles and OpenMetrics export")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Telemetry test failed: {e}")
+        return False
+
+def test_tracing():
+    """Test span nesting, attributes and exporters."""
+    print("\nTesting tracing...")
+    
+    try:
+        import io
+        import types
+        from concurrent.futures import ThreadPoolExecutor
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        from ai_bot_agent.tracing import (Tracer, CollectingExporter, ConsoleSpanExporter, NOOP_SPAN,
+                                          shared_tracer, exporters_from_spec)
+        
+        if Tracer().span("idle") is not NOOP_SPAN:
+            print("❌ A tracer without exporters should hand out the no-op span")
+            return False
+        print("✓ Tracing is a no-op without exporters")
+        
+        def create(model, messages, **kwargs):
+            usage = types.SimpleNamespace(prompt_tokens=12, completion_tokens=3, total_tokens=15)
+            message = types.SimpleNamespace(content="Traced")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        collector = CollectingExporter()
+        tracer = shared_tracer()
+        tracer.add_exporter(collector)
+        try:
+            bot = AIBotAgent(client=client, scheduler=RequestScheduler(), model="gpt-4o",
+                             telemetry=TelemetryLog(enabled=False))
+            bot.chat("Hi")
+            with tracer.span("parent") as parent:
+                with ThreadPoolExecutor(2) as pool:
+                    list(pool.map(tracer.wrap(lambda n: tracer.span("child").end()), range(2)))
+        finally:
+            tracer.remove_exporter(collector)
+        
+        by_name = {span.name: span for span in collector.spans}
+        chat = by_name["agent.chat"]
+        nested = (by_name["prompt.build"].parent_id == chat.span_id
+                  and by_name["model.call"].parent_id == chat.span_id
+                  and by_name["api.request"].parent_id == by_name["model.call"].span_id)
+        if (not nested or chat.attributes.get("prompt_tokens") != 12
+                or chat.attributes.get("model") != "gpt-4o"):
+            print(f"❌ Unexpected spans {[span.to_dict() for span in collector.spans]}")
+            return False
+        print("✓ Agent spans nest and carry model and token counts")
+        
+        if [span.parent_id for span in collector.named("child")] != [parent.span_id] * 2:
+            print("❌ Spans in worker threads lost their parent")
+            return False
+        print("✓ Wrapped functions keep their parent span across threads")
+        
+        output = io.StringIO()
+        console_tracer = Tracer([ConsoleSpanExporter(output)])
+        with console_tracer.span("root"):
+            console_tracer.span("inner", {"bytes": 10}).end()
+        lines = output.getvalue().splitlines()
+        if len(lines) != 2 or not lines[0].startswith("root") or not lines[1].startswith("  inner") \
+                or "bytes=10" not in lines[1]:
+            print(f"❌ Unexpected console trace {lines}")
+            return False
+        try:
+            exporters_from_spec("bogus")
+            print("❌ Unknown exporters should be rejected")
+            return False
+        except ValueError:
+            pass
+        print("✓ Console exporter prints the span tree")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Tracing test failed: {e}")
+        return False
+
+def test_daemon():
+    """Test that commands are forwarded to a running daemon and fall back without one."""
+    print("\nTesting daemon mode...")
+    
+    try:
+        import time
+        import tempfile
+        import subprocess
+        import io
+        from contextlib import redirect_stderr
+        from ai_bot_agent.daemon import forward, status, connect, socket_path, request_environment
+        
+        runtime_dir = os.environ.pop("XDG_RUNTIME_DIR", None)
+        try:
+            fallback = socket_path() if not os.getenv("AI_BOT_SOCKET") else None
+        finally:
+            if runtime_dir is not None:
+                os.environ["XDG_RUNTIME_DIR"] = runtime_dir
+        if fallback is not None and os.path.dirname(fallback) != f"/tmp/ai-bot-{os.getuid()}":
+            print(f"❌ The fallback socket should be in a per-user directory: {fallback}")
+            return False
+        forwarded = request_environment({"OPENAI_API_KEY": "sk-secret", "AI_BOT_TRACE": "stderr",
+                                         "TERM": "xterm", "GITHUB_TOKEN": "ghp-secret"})
+        if (set(forwarded) != {"OPENAI_API_KEY", "AI_BOT_TRACE", "TERM"}
+                or "sk-secret" in forwarded["OPENAI_API_KEY"]):
+            print(f"❌ Only the needed environment should be forwarded, without keys: {forwarded}")
+            return False
+        print("✓ The fallback socket is private and API keys are never sent to the daemon")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "daemon.sock")
+            if forward(["help"], path) is not None:
+                print("❌ Forwarding without a daemon should fall back to in-process")
+                return False
+            print("✓ Commands run in-process without a daemon")
+            
+            env = dict(os.environ, AI_BOT_SOCKET=path, XDG_CACHE_HOME=tmp, XDG_DATA_HOME=tmp,
+                       AI_BOT_TELEMETRY="off", OPENAI_API_KEY="sk-test")
+            env.pop("AI_BOT_DAEMON", None)
+            server = subprocess.Popen([sys.executable, "-m", "ai_bot_agent.main", "daemon", "--workers", "1"],
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                deadline = time.time() + 30
+                while status(path) is None and time.time() < deadline:
+                    time.sleep(0.1)
+                
+                def launch(*args, **overrides):
+                    return subprocess.run([sys.executable, "-m", "ai_bot_agent.launcher"] + list(args),
+                                          env=dict(env, **overrides), capture_output=True, text=True,
+                                          timeout=30)
+                
+                result = launch("cache", "stats")
+                if result.returncode != 0 or "Response Cache" not in result.stdout:
+                    print(f"❌ Forwarded command failed: {result.stdout} {result.stderr}")
+                    return False
+                if launch("stats", "--since", "bogus").returncode != 1:
+                    print("❌ Exit codes should be passed back from the daemon")
+                    return False
+                if (status(path) or {}).get("served_by_worker") != 2:
+                    print(f"❌ Commands did not reach the daemon: {status(path)}")
+                    return False
+                print("✓ Commands are served by the daemon with their output and exit code")
+                
+                result = launch("cache", "stats", OPENAI_API_KEY="sk-other")
+                if result.returncode != 0 or status(path).get("served_by_worker") != 2:
+                    print("❌ A different configuration should run in-process")
+                    return False
+                print("✓ Commands with a different configuration run in-process")
+                
+                getuid = os.getuid
+                os.getuid = lambda: getuid() + 1  # As if the daemon belonged to another user
+                warnings = io.StringIO()
+                try:
+                    with redirect_stderr(warnings):
+                        other = connect(path)
+                        forwarded = forward(["help"], path)
+                finally:
+                    os.getuid = getuid
+                if (other is not None or forwarded is not None
+                        or "not served by your user" not in warnings.getvalue()):
+                    print("❌ A daemon run by another user should not be used")
+                    return False
+                print("✓ A daemon run by another user is ignored")
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            if os.path.exists(path):
+                print("❌ The daemon left its socket behind")
+                return False
+            print("✓ The daemon removes its socket on shutdown")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Daemon test failed: {e}")
+        return False
+
+def test_request_coalescing():
+    """Test that identical concurrent requests share one API call."""
+    print("\nTesting request coalescing...")
+    
+    try:
+        import time
+        import types
+        import threading
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        from ai_bot_agent.singleflight import SingleFlight
+        
+        calls = []
+        
+        def create(model, messages, stream=False, **kwargs):
+            calls.append(messages[-1]["content"])
+            time.sleep(0.2)  # Long enough for every caller to arrive while it is in flight
+            if messages[-1]["content"] == "fail":
+                raise ValueError("boom")
+            if stream:
+                return iter([types.SimpleNamespace(choices=[types.SimpleNamespace(
+                    delta=types.SimpleNamespace(content=word))]) for word in ("Hello", " there")])
+            usage = types.SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7)
+            message = types.SimpleNamespace(content="Hello there")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        inflight = SingleFlight(enabled=True)
+        telemetry = TelemetryLog(enabled=False)
+        
+        def concurrently(run, callers=6):
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(run(AIBotAgent(
+                client=client, scheduler=RequestScheduler(retries=0), model="gpt-4o", inflight=inflight,
+                telemetry=telemetry)))) for _ in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+        
+        results = concurrently(lambda bot: bot.chat("What is Python?"))
+        if results != ["Hello there"] * 6 or len(calls) != 1:
+            print(f"❌ Concurrent requests were not coalesced: {calls} {results}")
+            return False
+        print("✓ Identical requests share one call and its result")
+        
+        results = concurrently(lambda bot: "".join(bot.chat_stream("Stream it")))
+        if results != ["Hello there"] * 6 or len(calls) != 2:
+            print(f"❌ Concurrent streams were not coalesced: {calls} {results}")
+            return False
+        print("✓ Identical streams are replayed to every caller")
+        
+        def fail(bot):
+            try:
+                return bot.chat("fail")
+            except ValueError as e:
+                return f"raised {e}"
+        
+        results = concurrently(fail)
+        if results != ["raised boom"] * 6 or len(calls) != 3:
+            print(f"❌ A shared failure was not passed to every caller: {results}")
+            return False
+        concurrently(lambda bot: bot.chat("What is Python?"), callers=1)
+        stats = inflight.stats()
+        if len(calls) != 4 or stats["coalesced"] != 15 or stats["requests"] != 4 or stats["in_flight"] != 0:
+            print(f"❌ Unexpected coalescing stats {stats}")
+            return False
+        print("✓ Failures are shared, finished requests run again and shared calls are counted")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Request coalescing test failed: {e}")
+        return False
+
+def test_hedged_requests():
+    """Test that slow requests are hedged and the first response wins."""
+    print("\nTesting hedged requests...")
+    
+    try:
+        import time
+        import types
+        import tempfile
+        import threading
+        from pathlib import Path
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        from ai_bot_agent.metrics import request_stats
+        from ai_bot_agent.singleflight import SingleFlight
+        from ai_bot_agent.hedging import HedgePolicy
+        
+        delays = []
+        closed = []
+        finished = []
+        
+        class Stream:
+            """Like the SDK's stream: closing it ends a pending read at once."""
+            
+            def __init__(self, answer, delay):
+                self.answer = answer
+                self.delay = delay
+                self.closing = threading.Event()
+            
+            def __iter__(self):
+                if self.closing.wait(self.delay):
+                    return  # Closed while waiting for the first token
+                for word in (self.answer, " answer"):
+                    yield types.SimpleNamespace(choices=[types.SimpleNamespace(
+                        delta=types.SimpleNamespace(content=word))])
+                finished.append(self.answer)
+            
+            def close(self):
+                closed.append(self.answer)
+                self.closing.set()
+        
+        def create(model, messages, stream=False, **kwargs):
+            delay = delays.pop(0) if delays else 0.0
+            answer = "slow" if delay else "fast"
+            if stream:
+                return Stream(answer, delay)
+            time.sleep(delay)
+            usage = types.SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7)
+            message = types.SimpleNamespace(content=answer + " answer")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        
+        def agent(policy):
+            return AIBotAgent(client=client, scheduler=RequestScheduler(retries=0), model="gpt-4o",
+                              inflight=SingleFlight(enabled=False), telemetry=TelemetryLog(enabled=False),
+                              hedge=policy)
+        
+        policy = HedgePolicy(quantile=0.9, max_rate=0.5)
+        bot = agent(policy)
+        if policy.delay("gpt-4o") is not None:
+            print("❌ A model without history should not be hedged")
+            return False
+        for _ in range(10):
+            bot.chat("Warm up")
+        if policy.delay("gpt-4o") is None or policy.delay("gpt-4o") > 0.05:
+            print(f"❌ The hedge delay did not follow observed latency: {policy.delay('gpt-4o')}")
+            return False
+        print("✓ The hedge delay adapts to observed time to first token")
+        
+        delays[:] = [1.0]
+        closed.clear()
+        finished.clear()
+        start = time.perf_counter()
+        answer = bot.chat("Slow question")
+        elapsed = time.perf_counter() - start
+        if answer != "fast answer" or elapsed > 0.5 or not bot.last_request_stats["hedged"]:
+            print(f"❌ A slow request was not hedged: {answer!r} in {elapsed:.2f}s")
+            return False
+        print("✓ A slow request is hedged and the faster answer wins")
+        
+        if closed != ["slow"]:
+            print(f"❌ The losing request was not closed when the other won: {closed}")
+            return False
+        time.sleep(1.1)
+        if finished != ["fast"]:
+            print(f"❌ The losing request ran to completion: {finished}")
+            return False
+        print("✓ The losing request is closed before it answers instead of running to completion")
+        
+        for _ in range(10):
+            "".join(bot.chat_stream("Warm up"))
+        delays[:] = [0.5]
+        closed.clear()
+        answer = "".join(bot.chat_stream("Slow stream"))
+        if answer != "fast answer" or closed != ["slow"] or not bot.last_request_stats["hedged"]:
+            print(f"❌ A slow stream was not hedged or its loser not closed: {answer!r} {closed}")
+            return False
+        print("✓ A slow stream is hedged and the losing stream is closed")
+        
+        capped = agent(HedgePolicy(delay=0.05, max_rate=0.0))
+        delays[:] = [0.3]
+        answer = capped.chat("Slow question")
+        if answer != "slow answer" or capped.last_request_stats["hedged"] or capped.hedge.stats()["hedges"]:
+            print(f"❌ The hedge budget was not respected: {answer!r}")
+            return False
+        stats = policy.stats()
+        if stats["hedges"] != 2 or stats["hedge_wins"] != 2 or stats["requests"] != 22:
+            print(f"❌ Unexpected hedge stats {stats}")
+            return False
+        print("✓ Hedges stay within the budget and are counted")
+        
+        concurrent = HedgePolicy(delay=0.05, max_rate=0.1)
+        for _ in range(10):
+            concurrent.observe("gpt-4o", 0.01, False)
+        if [concurrent.allow() for _ in range(5)] != [True, False, False, False, False]:
+            print("❌ Concurrent requests should share the hedge budget before they finish")
+            return False
+        concurrent.observe("gpt-4o", 0.01, True)
+        if concurrent.stats()["in_flight"] != 0 or concurrent.allow():
+            print(f"❌ A finished hedge should be settled against the budget: {concurrent.stats()}")
+            return False
+        print("✓ Hedges in flight count against the budget")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            telemetry = TelemetryLog(Path(tmp) / "telemetry.jsonl", enabled=True)
+            for _ in range(10):
+                telemetry.record(request_stats("gpt-4o", 5.0, 5.0, 10))
+            if HedgePolicy(telemetry=telemetry).delay("gpt-4o") is not None:
+                print("❌ Non-streamed completion times were used as times to first token")
+                return False
+            for _ in range(10):
+                telemetry.record(request_stats("gpt-4o", 0.2, 5.0, 10, streamed=True))
+            if HedgePolicy(telemetry=telemetry).delay("gpt-4o") != 0.2:
+                print("❌ The hedge delay was not seeded from streamed requests")
+                return False
+        print("✓ Only real times to first token seed the hedge delay")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Hedged requests test failed: {e}")
+        return False
+
+def test_code_candidates():
+    """Test that code candidates come from one request and are validated to pick the best."""
+    print("\nTesting code candidates...")
+    
+    try:
+        import sys
+        import shlex
+        import types
+        from ai_bot_agent.agent import AIBotAgent
+        from ai_bot_agent.scheduler import RequestScheduler
+        from ai_bot_agent.telemetry import TelemetryLog
+        from ai_bot_agent.candidates import extract_code
+        
+        answers = [
+            "```python\ndef add(a, b)\n    return a + b\n```",
+            "```python\ndef add(a, b):\n    return a - b\n```",
+            "```python\nwhile True:\n    pass\n```",
+            "Here you go:\n```python\nimport os\n\ndef add(a, b):\n    return a + b\n```\nDone.",
+            "```python\ndef add(a, b):\n    return a + b\n```",
+        ]
+        calls = []
+        
+        def create(model, messages, n=1, **kwargs):
+            calls.append(n)
+            choices = [types.SimpleNamespace(message=types.SimpleNamespace(content=a)) for a in answers[:n]]
+            return types.SimpleNamespace(choices=choices, usage=None)
+        
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=create)))
+        bot = AIBotAgent(client=client, scheduler=RequestScheduler(), model="gpt-4o",
+                         telemetry=TelemetryLog(enabled=False))
+        
+        if extract_code(answers[3]) != "import os\n\ndef add(a, b):\n    return a + b\n":
+            print(f"❌ Unexpected code extracted: {extract_code(answers[3])!r}")
+            return False
+        
+        test = f"{shlex.quote(sys.executable)} -c 'import candidate, sys; sys.exit(candidate.add(2, 3) != 5)'"
+        result = bot.generate_code_candidates("add two numbers", "python", n=5, test_command=test, timeout=2)
+        if calls != [5] or len(result["candidates"]) != 5:
+            print(f"❌ Expected one request for all candidates: {calls}")
+            return False
+        print("✓ All candidates come from a single request")
+        
+        by_index = {c["index"]: c for c in result["candidates"]}
+        outcomes = [(by_index[i]["syntax"], by_index[i]["test"]) for i in range(5)]
+        if (outcomes[:3] != [("error", None), ("ok", "failed"), ("ok", "timeout")]
+                or not by_index[4]["passed"]):
+            print(f"❌ Unexpected validation results: {outcomes}")
+            return False
+        print("✓ Syntax errors, failing tests and timeouts are detected")
+        
+        try:
+            import pyflakes  # noqa: F401
+            expected = 4
+        except ImportError:
+            expected = 3
+        if (not result["passed"] or result["candidates"][0]["index"] != expected
+                or "return a + b" not in result["code"]):
+            print(f"❌ The wrong candidate was chosen: {result['candidates'][0]}")
+            return False
+        if bot.conversation_history[-1]["content"] != answers[expected]:
+            print("❌ The chosen response was not added to the history")
+            return False
+        print("✓ The best passing candidate is returned")
+        
+        import os
+        import tempfile
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as project:
+            os.makedirs(os.path.join(project, "tests"))
+            with open(os.path.join(project, "tests", "check_add.py"), "w") as f:
+                f.write("import candidate, sys\nsys.exit(candidate.add(2, 3) != 5)\n")
+            os.chdir(project)
+            try:
+                test = f"{shlex.quote(sys.executable)} tests/check_add.py"
+                result = bot.generate_code_candidates("add two numbers", "python", n=5, test_command=test,
+                                                      timeout=2)
+            finally:
+                os.chdir(cwd)
+        by_index = {c["index"]: c for c in result["candidates"]}
+        if not result["passed"] or by_index[1]["test"] != "failed":
+            print(f"❌ A relative test path was not resolved: {result['candidates'][0]}")
+            return False
+        print("✓ Relative paths in the test command are resolved against the current directory")
+        
+        answers.clear()
+        try:
+            bot.generate_code_candidates("add two numbers", "python", n=2)
+            print("❌ A response without choices did not raise")
+            return False
+        except RuntimeError as e:
+            if "no choices" not in str(e):
+                print(f"❌ Unclear error for a response without choices: {e}")
+                return False
+        print("✓ A response without choices raises a clear error")
+        
+        import os
+        import tempfile
+        import subprocess
+        from pathlib import Path
+        from ai_bot_agent.cache import ResponseCache
+        
+        answers[:] = ["```python\ndef add(a, b):\n    return a + b\n```"] * 2
+        calls.clear()
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(Path(tmp) / "cache.sqlite")
+            results = [AIBotAgent(client=client, scheduler=RequestScheduler(), model="gpt-4o", cache=cache,
+                                  telemetry=TelemetryLog(enabled=False))
+                       .generate_code_candidates("add two numbers", "python", n=n) for n in (2, 2, 1)]
+            first, second = results[:2]
+        if calls != [2, 1] or (second["code"], second["passed"]) != (first["code"], first["passed"]):
+            print(f"❌ Cached candidates were not reused per n: {calls}")
+            return False
+        print("✓ Candidates are cached per count and checked again")
+        
+        env = dict(os.environ, AI_BOT_TELEMETRY="off", AI_BOT_DAEMON="off")
+        command = ["code", "add", "--candidates", "2", "--stream"]
+        result = subprocess.run([sys.executable, "-m", "ai_bot_agent.main"] + command, env=env,
+                                capture_output=True, text=True, timeout=60)
+        if result.returncode != 1 or "--stream cannot be used" not in result.stdout:
+            print(f"❌ --stream with --candidates was not rejected: {result.returncode} {result.stdout}")
+            return False
+        print("✓ --stream is rejected with --candidates")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Code candidates test failed: {e}")
+        return False
+
 def main():
     """Run all tests."""
     print("🧪 Testing AI Bot Agent...\n")
@@ -118,7 +1630,30 @@ def main():
         ("Import Test", test_imports),
         ("File Structure Test", test_file_structure),
         ("Main Script Test", test_main_script),
-        ("Help Command Test", test_help_command)
+        ("Help Command Test", test_help_command),
+        ("Lazy Import Test", test_lazy_imports),
+        ("Shared Transport Test", test_shared_transport),
+        ("Response Cache Test", test_response_cache),
+        ("Semantic Cache Test", test_semantic_cache),
+        ("Repository Retrieval Test", test_repo_retrieval),
+        ("Session Store Test", test_session_store),
+        ("Context Window Test", test_context_window),
+        ("Chunked Analysis Test", test_chunked_analysis),
+        ("Analysis Index Test", test_analysis_index),
+        ("Search Index Test", test_search_index),
+        ("Batch Runner Test", test_batch_runner),
+        ("Agent Events Test", test_agent_events),
+        ("Async Agent Test", test_async_agent),
+        ("Streaming Output Test", test_streaming_output),
+        ("Request Scheduler Test", test_request_scheduler),
+        ("Model Router Test", test_model_router),
+        ("Stub Server Test", test_stub_server),
+        ("Telemetry Test", test_telemetry),
+        ("Tracing Test", test_tracing),
+        ("Daemon Test", test_daemon),
+        ("Request Coalescing Test", test_request_coalescing),
+        ("Hedged Requests Test", test_hedged_requests),
+        ("Code Candidates Test", test_code_candidates)
     ]
     
     passed = 0